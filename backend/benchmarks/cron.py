@@ -0,0 +1,39 @@
+import datetime
+import timeit
+
+from croniter import croniter
+
+from backend.lib.util import get_next_run_timestamp, compile_cron, next_run_timestamps
+
+#  per call cost of computing a next run, parsing every time (how get_next_run_timestamp used to work)
+#  vs the compiled cron cache. run with: python -m backend.benchmarks.cron
+
+patterns = ['0 8 * * *', '0 * * * *', '30 9 1-7 * 1', '*/15 * * * *']
+calls = 5000
+base_time = int(datetime.datetime(2025, 10, 10, 10, 30, tzinfo=datetime.timezone.utc).timestamp())
+
+
+def parse_every_time(cron_expression: str, base: int) -> int:
+    iterator = croniter(cron_expression, datetime.datetime.fromtimestamp(base, datetime.timezone.utc))
+    return int(iterator.get_next(datetime.datetime).timestamp())
+
+
+def per_call_micros(run) -> float:
+    return timeit.timeit(run, number=calls) / calls * 1_000_000
+
+
+if __name__ == '__main__':
+    print(f'{"pattern":<16}{"parse (us)":>12}{"compiled (us)":>16}{"same base (us)":>16}')
+    for pattern in patterns:
+        counter = iter(range(10 ** 9))
+        before = per_call_micros(lambda: parse_every_time(pattern, base_time + next(counter)))
+
+        compile_cron.cache_clear()
+        next_run_timestamps.cache_clear()
+        counter = iter(range(10 ** 9))
+        compiled = per_call_micros(lambda: get_next_run_timestamp(pattern, base_time + next(counter)))
+
+        #  a generator chunk: many schedules with one pattern and one base time
+        same_base = per_call_micros(lambda: get_next_run_timestamp(pattern, base_time))
+
+        print(f'{pattern:<16}{before:>12.1f}{compiled:>16.1f}{same_base:>16.1f}')
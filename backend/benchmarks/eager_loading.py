@@ -0,0 +1,95 @@
+import timeit
+
+from sqlalchemy import event, insert, select
+from sqlalchemy.orm import joinedload, selectinload
+
+from shared import constants
+from backend.lib.db import Data, Metric, Tag, metric_tags_association, engine_registry
+from backend.tests.integration.base import baseSetUp, baseTearDown, begin_session, get_utc_timestamp, Trigger, \
+    legit_user_id
+
+#  rows the database returns and time per page of /data: the joined eager load it used to do (metric -> tags and
+#  schedule joined into the paged query) vs paging data alone and selectin loading the rest, for metrics with
+#  more and more tags. runs against the integration test database from .env and recreates its tables.
+#  run with: python -m backend.benchmarks.eager_loading
+
+tag_counts = [0, 5, 20, 50]
+metrics = 20
+data_per_metric = 50
+page_size = 100
+repeats = 20
+
+
+def joined_query():
+    return (select(Data).where(Data.user_id == legit_user_id)
+            .order_by(Data.time.desc(), Data.id.desc()).limit(page_size)
+            .options(joinedload(Data.metric).joinedload(Metric.tags), joinedload(Data.metric).joinedload(Metric.schedule)))
+
+
+def selectin_query():
+    return (select(Data).where(Data.user_id == legit_user_id)
+            .order_by(Data.time.desc(), Data.id.desc()).limit(page_size)
+            .options(selectinload(Data.metric).selectinload(Metric.tags),
+                     selectinload(Data.metric).selectinload(Metric.schedule)))
+
+
+def load_page(query_supplier):
+    session = begin_session()
+    try:
+        return session.scalars(query_supplier()).unique().all()
+    finally:
+        session.close()
+
+
+def rows_returned(query_supplier) -> int:
+    statements = []
+
+    def capture(_, __, statement, parameters, ___, ____):
+        statements.append((statement, parameters))
+
+    engine = engine_registry.get()
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        load_page(query_supplier)
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+
+    with engine.connect() as connection:
+        return sum(len(connection.exec_driver_sql(statement, parameters).all()) for statement, parameters in statements)
+
+
+def seed(tags_per_metric: int):
+    session = begin_session()
+    try:
+        now = get_utc_timestamp()
+        tags = [Tag(user_id=legit_user_id, name=f'tag{i}', display_name=f'tag {i}') for i in range(tags_per_metric)]
+        owned = [Metric(user_id=legit_user_id, name=f'metric{i}', display_name=f'metric {i}') for i in range(metrics)]
+        session.add_all(tags + owned)
+        session.flush()
+        if tags:
+            session.execute(insert(metric_tags_association), [{constants.metric_id: metric.id, constants.tag_id: tag.id}
+                                                              for metric in owned for tag in tags])
+        session.execute(insert(Data), [{constants.metric_id: metric.id, constants.user_id: legit_user_id,
+                                        constants.value: i, constants.time: now - i * 60 - metric.id}
+                                       for metric in owned for i in range(data_per_metric)])
+        session.commit()
+    finally:
+        session.close()
+
+
+if __name__ == '__main__':
+    print(f'{"tags":>6}{"joined rows":>14}{"selectin rows":>16}{"joined (ms)":>14}{"selectin (ms)":>16}')
+    for tags_per_metric in tag_counts:
+        baseSetUp(Trigger.http)
+        try:
+            seed(tags_per_metric)
+            assert [dp.id for dp in load_page(joined_query)] == [dp.id for dp in load_page(selectin_query)]
+
+            joined_rows = rows_returned(joined_query)
+            selectin_rows = rows_returned(selectin_query)
+            joined = timeit.timeit(lambda: load_page(joined_query), number=repeats) / repeats * 1000
+            selectin = timeit.timeit(lambda: load_page(selectin_query), number=repeats) / repeats * 1000
+
+            print(f'{tags_per_metric:>6}{joined_rows:>14}{selectin_rows:>16}{joined:>14.1f}{selectin:>16.1f}')
+        finally:
+            baseTearDown()
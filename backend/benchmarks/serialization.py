@@ -0,0 +1,56 @@
+import json
+import timeit
+from decimal import Decimal
+
+from backend.lib.func import http
+from backend.lib.func.http import serialize, encode_default
+
+#  time to turn a 1000 row /data page into a response body: stdlib json after converting values to float per row
+#  (how data/index.py used to do it) vs the handler_factory serializer, with and without orjson.
+#  run with: python -m backend.benchmarks.serialization
+
+rows = 1000
+repeats = 50
+
+
+def prepare_page():
+    schedule = {'id': 1, 'minute': '0', 'hour': '8', 'day_of_month': '*', 'month': '*', 'day_of_week': '*',
+                'target_value': Decimal('10000.00'), 'units': 'steps', 'next_run': 1760000000, 'period_seconds': None}
+    return [{
+        'id': i,
+        'note_id': i // 3,
+        'value': Decimal(f'{i}.25'),
+        'units': 'steps',
+        'time': 1760000000 - i * 60,
+        'metric': {'id': i % 20, 'name': f'metric {i % 20}', 'tagged': True,
+                   'tags': ['health', 'activity', 'daily'], 'schedule': schedule},
+    } for i in range(rows)]
+
+
+def stdlib_with_float_conversion(page):
+    converted = [item | {'value': float(item['value']),
+                         'metric': item['metric'] | {'schedule': item['metric']['schedule'] | {
+                             'target_value': float(item['metric']['schedule']['target_value'])}}}
+                 for item in page]
+    return json.dumps(converted)
+
+
+def per_page_millis(run) -> float:
+    return timeit.timeit(run, number=repeats) / repeats * 1000
+
+
+if __name__ == '__main__':
+    page = prepare_page()
+    assert json.loads(stdlib_with_float_conversion(page)) == json.loads(serialize(page))
+
+    results = [('stdlib + float()', per_page_millis(lambda: stdlib_with_float_conversion(page))),
+               ('stdlib default', per_page_millis(lambda: json.dumps(page, default=encode_default)))]
+    if http.orjson:
+        results.append(('orjson', per_page_millis(lambda: serialize(page))))
+    else:
+        print('orjson is not installed, serialize falls back to stdlib json')
+
+    baseline = results[0][1]
+    print(f'{"encoder":<20}{"ms per page":>14}{"speedup":>10}')
+    for name, millis in results:
+        print(f'{name:<20}{millis:>14.2f}{baseline / millis:>9.1f}x')
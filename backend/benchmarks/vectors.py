@@ -0,0 +1,51 @@
+import time
+
+import numpy as np
+
+from backend.lib.vectors import LocalStore, normalize
+
+#  knn latency and recall@k of the local store for one user's partition: brute force vs ivf after training.
+#  a baseline to hold against the opensearch script_score query for the same k.
+#  run with: python -m backend.benchmarks.vectors
+
+dimension = 1024
+k = 10
+queries = 50
+topics = 200
+sizes = [1000, 10000, 50000]
+
+
+def fill(store: LocalStore, vectors: np.ndarray) -> LocalStore:
+    store.index_many([(1, note_id, vector) for note_id, vector in enumerate(vectors)])
+    return store
+
+
+def per_query_millis(store: LocalStore, query_vectors: np.ndarray) -> float:
+    started = time.perf_counter()
+    for query in query_vectors:
+        store.query(1, query, k)
+    return (time.perf_counter() - started) / len(query_vectors) * 1000
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    print(f'{"rows":>8}{"brute ms":>12}{"ivf ms":>10}{"train s":>10}{"recall@" + str(k):>12}')
+    for size in sizes:
+        #  notes cluster around topics, uniformly random vectors have no structure for any index to exploit
+        centers = normalize(rng.standard_normal((topics, dimension)))
+        vectors = normalize(centers[rng.integers(topics, size=size)] + normalize(
+            rng.standard_normal((size, dimension))))
+        #  queries close to stored vectors, like a note searched by its own words
+        query_vectors = normalize(vectors[rng.choice(size, queries)] + 0.5 * normalize(
+            rng.standard_normal((queries, dimension))))
+
+        brute = fill(LocalStore(directory=None, ivf_min_size=size + 1), vectors)
+        ivf = fill(LocalStore(directory=None, ivf_min_size=1), vectors)
+        started = time.perf_counter()
+        ivf.train(1)
+        train_seconds = time.perf_counter() - started
+
+        hits = sum(len({id for id, _ in brute.query(1, query, k)} & {id for id, _ in ivf.query(1, query, k)})
+                   for query in query_vectors)
+        print(f'{size:>8}{per_query_millis(brute, query_vectors):>12.2f}{per_query_millis(ivf, query_vectors):>10.2f}'
+              f'{train_seconds:>10.1f}{hits / (k * queries):>12.2f}')
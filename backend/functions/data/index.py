@@ -2,16 +2,48 @@ from typing import Dict, Any, List, Tuple
 
 from sqlalchemy import select, update, and_, delete as sql_delete, inspect
 from sqlalchemy.dialects.mysql import match
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session
 
 from shared import constants
-from backend.lib.db import Data, Metric, Note, Tag
-from backend.lib.func.http import handler_factory, RequestContext, delete_factory, patch_factory, get_offset_and_limit, \
-    get_ts_start_and_end
+from backend.lib.db import Data, Metric, Note, Tag, DataSchedule, metric_tags_association
+from backend.lib.func.http import handler_factory, RequestContext, delete_factory, patch_factory, paginate, \
+    get_ts_start_and_end, next_cursor_headers, select_fields, to_dict, get_requested_fields, project, wants, \
+    owners_by_id, OwnerSpec
 from backend.lib.util import HttpMethod
 
 updatable_fileds = {constants.value, constants.units, constants.time}
 
+data_fields = {
+    constants.id: Data.id,
+    constants.note_id: Data.note_id,
+    constants.value: Data.value,
+    constants.units: Data.units,
+    constants.time: Data.time,
+}
+
+metric_fields = {
+    constants.id: Metric.id,
+    constants.name: Metric.display_name,
+    constants.tagged: Metric.tagged,
+}
+
+schedule_fields = {
+    constants.id: DataSchedule.id,
+    constants.minute: DataSchedule.minute,
+    constants.hour: DataSchedule.hour,
+    constants.day_of_month: DataSchedule.day_of_month,
+    constants.month: DataSchedule.month,
+    constants.day_of_week: DataSchedule.day_of_week,
+    constants.target_value: DataSchedule.target_value,
+    constants.units: DataSchedule.units,
+    constants.next_run: DataSchedule.next_run,
+    constants.period_seconds: DataSchedule.period_seconds,
+}
+
+metric_spec = OwnerSpec(key=constants.metric, fields=metric_fields, id=Metric.id, association=metric_tags_association,
+                        association_column=constants.metric_id, schedule_fields=schedule_fields,
+                        schedule_owner_id=DataSchedule.metric_id)
+
 
 def post(session: Session, context: RequestContext) -> Tuple[Dict[str, Any], int]:
     body = context.body
@@ -22,7 +54,7 @@ def post(session: Session, context: RequestContext) -> Tuple[Dict[str, Any], int
     if not metric:
         return {constants.status: constants.not_found}, 404
     data = Data(**{f: body[f] for f in body if f in updatable_fileds},
-                metric=metric)
+                metric=metric, user_id=context.user.id)
     session.add(data)
     session.commit()
     return {constants.status: constants.success, constants.id: data.id}, 201
@@ -40,18 +72,22 @@ def get(session: Session, context: RequestContext) -> Tuple[List[Dict[str, Any]]
         constants.params_delim) if constants.tags in query_params else []  # todo display name still can have it but probably rare
     metric = query_params.get(constants.metric, constants.empty).strip()
     start_time, end_time = get_ts_start_and_end(query_params)
-    offset, limit = get_offset_and_limit(query_params)
+    requested = get_requested_fields(query_params)
+    fields = project(data_fields, requested)
 
     conditions = [
-        Metric.user_id == context.user.id
+        Data.user_id == context.user.id
     ]
-    query = select(Data).join(Data.metric)
+    query = select_fields(fields).add_columns(Data.metric_id)
 
     if not note_id and not data_id:
         conditions.extend([
             Data.time >= start_time,
             Data.time <= end_time
         ])
+        if tags or metric:
+            query = query.join(Data.metric)
+
         if tags:
             conditions.append(Metric.tags.any(Tag.display_name.in_(tags)))
 
@@ -65,48 +101,29 @@ def get(session: Session, context: RequestContext) -> Tuple[List[Dict[str, Any]]
         query = query.join(Data.note)
         conditions.append(Note.id == int(note_id))
 
-    query = (query.where(and_(*conditions)).order_by(Data.time.desc())
-             .options(joinedload(Data.metric)
-                      .joinedload(Metric.tags), joinedload(Data.metric)
-                      .joinedload(Metric.schedule))
-             .offset(offset).limit(limit))
-
-    data_points = session.scalars(query).unique().all()
-
-    return [{
-        constants.id: dp.id,
-        constants.note_id: dp.note_id,
-        constants.value: float(dp.value),
-        constants.units: dp.units,
-        constants.time: dp.time,
-        constants.metric: {
-            constants.id: dp.metric.id,
-            constants.name: dp.metric.display_name,
-            constants.tagged: dp.metric.tagged,
-            constants.tags: [tag.display_name for tag in dp.metric.tags],
-            constants.schedule: {} if dp.metric.schedule is None else {
-                constants.id: dp.metric.schedule.id,
-                constants.minute: dp.metric.schedule.minute,
-                constants.hour: dp.metric.schedule.hour,
-                constants.day_of_month: dp.metric.schedule.day_of_month,
-                constants.month: dp.metric.schedule.month,
-                constants.day_of_week: dp.metric.schedule.day_of_week,
-                constants.target_value: float(dp.metric.schedule.target_value),
-                constants.units: dp.metric.schedule.units,
-                constants.next_run: dp.metric.schedule.next_run,
-                constants.period_seconds: dp.metric.schedule.period_seconds,
-            }
-        }} for dp in data_points], 200
+    sort_columns = [Data.time, Data.id]
+    query, limit = paginate(query.where(and_(*conditions)), query_params, sort_columns, descending=True)
+    rows = session.execute(query).all()
+
+    data_points = [to_dict(row, fields) for row in rows]
+
+    #  the page is taken from data alone, metrics and their tags and schedules follow as IN queries over the distinct
+    #  metric ids. joining them in would repeat every data row per tag and push the limit into a subquery
+    if wants(requested, constants.metric):
+        metrics = owners_by_id(session, metric_spec, requested, {row.metric_id for row in rows})
+        for data_point, row in zip(data_points, rows):
+            data_point[constants.metric] = metrics[row.metric_id]
+
+    return data_points, 200, next_cursor_headers(rows, sort_columns, limit)
 
 
 patch_handler = lambda session, update_fields, user_id, path_params: session.execute(update(Data)
                                                                                      .values( **update_fields)
-                                                                                     .where(and_(Data.metric_id == Metric.id,
-                                                                                                 Data.id == path_params[constants.id],
-                                                                                                 Metric.user_id == user_id)))
+                                                                                     .where(and_(Data.id == path_params[constants.id],
+                                                                                                 Data.user_id == user_id)))
 
-delete_handler = lambda session, user_id, id: session.execute(sql_delete(Data).where(Data.metric_id == Metric.id)
-                                                              .where(and_(*[Data.id == id, Metric.user_id == user_id])))
+delete_handler = lambda session, user_id, id: session.execute(sql_delete(Data)
+                                                              .where(and_(*[Data.id == id, Data.user_id == user_id])))
 
 handler = handler_factory({
     HttpMethod.GET.value: get,
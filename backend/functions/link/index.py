@@ -2,14 +2,24 @@ from typing import Dict, Any, List, Tuple
 
 from sqlalchemy import select, and_, delete as sql_delete, inspect
 from sqlalchemy.dialects.mysql import match
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session
 
 from shared import constants
-from backend.lib.db import Note, Tag, Link, normalize_identifier
-from backend.lib.func.http import RequestContext, handler_factory, delete_factory, post_factory, get_offset_and_limit, \
-    get_ts_start_and_end
+from backend.lib.db import Note, Tag, Link, normalize_identifier, link_tags_association
+from backend.lib.func.http import RequestContext, handler_factory, delete_factory, post_factory, paginate, \
+    get_ts_start_and_end, next_cursor_headers, select_fields, to_dict, tags_by_id, get_requested_fields, project, wants
 from backend.lib.util import HttpMethod, get_or_create_tags
 
+link_fields = {
+    constants.id: Link.id,
+    constants.note_id: Link.note_id,
+    constants.url: Link.url,
+    constants.summary: Link.display_summary,
+    constants.description: Link.description,
+    constants.tagged: Link.tagged,
+    constants.time: Link.time,
+}
+
 
 def get(session: Session, context: RequestContext) -> Tuple[List[Dict[str, Any]], int]:
     query_params = context.query_params
@@ -21,12 +31,13 @@ def get(session: Session, context: RequestContext) -> Tuple[List[Dict[str, Any]]
     tags = query_params.get(constants.tags).split(constants.params_delim) if constants.tags in query_params else []
     link = query_params.get(constants.link, constants.empty).strip()
     start_time, end_time = get_ts_start_and_end(query_params)
-    offset, limit = get_offset_and_limit(query_params)
+    requested = get_requested_fields(query_params)
+    fields = project(link_fields, requested)
 
     conditions = [
         Link.user_id == context.user.id
     ]
-    query = select(Link)
+    query = select_fields(fields).add_columns(Link.id.label(constants.owner_id))
 
     if not note_id and not link_id:
         conditions.extend([
@@ -49,23 +60,17 @@ def get(session: Session, context: RequestContext) -> Tuple[List[Dict[str, Any]]
         query = query.join(Link.note)
         conditions.append(Note.id == int(note_id))
 
-    query = (query.where(and_(*conditions))
-             .offset(offset)
-             .limit(limit)
-             .order_by(Link.time.desc()).options(joinedload(Link.tags)))
-
-    links = session.scalars(query).unique().all()
-
-    return [{
-        constants.id: link.id,
-        constants.note_id: link.note_id,
-        constants.url: link.url,
-        constants.summary: link.display_summary,
-        constants.description: link.description,
-        constants.tagged: link.tagged,
-        constants.time: link.time,
-        constants.tags: [tag.display_name for tag in link.tags],
-    } for link in links], 200
+    sort_columns = [Link.time, Link.id]
+    query, limit = paginate(query.where(and_(*conditions)), query_params, sort_columns, descending=True)
+    rows = session.execute(query).all()
+    items = [to_dict(row, fields) for row in rows]
+
+    if wants(requested, constants.tags):
+        tags_by_owner = tags_by_id(session, link_tags_association, constants.link_id, {row.owner_id for row in rows})
+        for item, row in zip(items, rows):
+            item[constants.tags] = tags_by_owner.get(row.owner_id, [])
+
+    return items, 200, next_cursor_headers(rows, sort_columns, limit)
 
 
 def patch(session: Session, context: RequestContext) -> (Dict[str, Any], int):
@@ -5,10 +5,16 @@ from sqlalchemy.dialects.mysql import match
 from sqlalchemy.orm import Session
 
 from shared import constants
-from backend.lib.db import normalize_identifier, Metric, Tag
-from backend.lib.func.http import RequestContext, handler_factory, post_factory, get_offset_and_limit
+from backend.lib.db import normalize_identifier, Metric, Tag, metric_tags_association
+from backend.lib.func.http import RequestContext, handler_factory, post_factory, paginate, next_cursor_headers, \
+    select_fields, to_dict, tags_by_id, get_requested_fields, project, wants
 from backend.lib.util import HttpMethod, get_or_create_tags
 
+metric_fields = {
+    constants.id: Metric.id,
+    constants.name: Metric.display_name,
+}
+
 
 def get(session: Session, context: RequestContext) -> Tuple[List[Dict[str, Any]]|Dict[str, str], int]:
     path_params = context.path_params
@@ -16,7 +22,6 @@ def get(session: Session, context: RequestContext) -> Tuple[List[Dict[str, Any]]
     id = path_params.get(constants.id)
 
     query_params = context.query_params
-    offset, limit = get_offset_and_limit(query_params)
 
     text = query_params.get(constants.name, constants.empty).strip()
     tags = query_params.get(constants.tags).split(constants.params_delim) if constants.tags in query_params else []
@@ -30,19 +35,21 @@ def get(session: Session, context: RequestContext) -> Tuple[List[Dict[str, Any]]
         if text:
            conditions.append(match(inspect(Metric).c.display_name,
                                      against=text).in_natural_language_mode(), )
-    query = (select(Metric).where(and_(*conditions))
+    sort_columns = [Metric.display_name, Metric.id]
+    requested = get_requested_fields(query_params)
+    fields = project(metric_fields, requested)
+    query = select_fields(fields).add_columns(Metric.id.label(constants.owner_id)).where(and_(*conditions))
+    query, limit = paginate(query, query_params, sort_columns)
 
-             .offset(offset)
-             .limit(limit)
-             .order_by(Metric.display_name.asc()))
+    rows = session.execute(query).all()
+    items = [to_dict(row, fields) for row in rows]
 
-    metrics = session.scalars(query).unique().all()
+    if wants(requested, constants.tags):
+        tags_by_owner = tags_by_id(session, metric_tags_association, constants.metric_id, {row.owner_id for row in rows})
+        for item, row in zip(items, rows):
+            item[constants.tags] = tags_by_owner.get(row.owner_id, [])
 
-    return [{
-        constants.id: metric.id,
-        constants.name: metric.display_name,
-        constants.tags: [tag.display_name for tag in metric.tags],
-    } for metric in metrics], 200
+    return items, 200, next_cursor_headers(rows, sort_columns, limit)
 
 
 def patch(session: Session, context: RequestContext) -> (Dict[str, Any], int):
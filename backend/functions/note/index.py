@@ -4,13 +4,14 @@ import traceback
 from typing import Dict, Any, List, Tuple
 
 import boto3
-from sqlalchemy import select, func, and_, inspect
+from sqlalchemy import func, and_, inspect
 from sqlalchemy.dialects.mysql import match
 from sqlalchemy.orm import Session
 
 from shared import constants
-from backend.lib.db import Note, Tag, Metric, Origin, Data
-from backend.lib.func.http import handler_factory, RequestContext, get_ts_start_and_end, get_offset_and_limit
+from backend.lib.db import Note, Tag, Metric, Origin, Data, note_fields
+from backend.lib.func.http import handler_factory, RequestContext, get_ts_start_and_end, paginate, \
+    next_cursor_headers, select_fields, to_dict, get_requested_fields, project
 from backend.lib.util import  HttpMethod
 from shared.variables import *
 
@@ -82,8 +83,6 @@ def get(session: Session, context: RequestContext) -> Tuple[List[Dict[str, Any]]
 
     start_time, end_time = get_ts_start_and_end(query_params)
 
-    offset, limit = get_offset_and_limit(query_params)
-
     id = path_params.get(constants.id)
 
     tags = query_params.get(constants.tags, constants.empty).split(constants.params_delim) if constants.tags in query_params else []
@@ -92,7 +91,8 @@ def get(session: Session, context: RequestContext) -> Tuple[List[Dict[str, Any]]
 
     search_text = query_params.get(constants.text, constants.empty)
 
-    note_query = select(Note)
+    fields = project(note_fields, get_requested_fields(query_params))
+    note_query = select_fields(fields)
 
     conditions = [
         Note.user_id == context.user.id,
@@ -118,24 +118,11 @@ def get(session: Session, context: RequestContext) -> Tuple[List[Dict[str, Any]]
 
         conditions.append(Note.id == int(id))
 
-    note_query = note_query.where(and_(*conditions)).offset(offset).limit(limit).order_by(Note.time.desc())
-
-    notes = [{
-        constants.id: note.id,
-        constants.text: note.text,
-        constants.time: note.time,
-        constants.image_key: note.image_key,
-        constants.audio_key: note.audio_key,
-        constants.image_described: note.image_described,
-        constants.audio_transcribed: note.audio_transcribed,
-        constants.image_text: note.image_text,
-        constants.image_description: note.image_description,
-        constants.audio_text: note.audio_text,
-
-    }
-        for note in session.scalars(note_query).all()]
+    sort_columns = [Note.time, Note.id]
+    note_query, limit = paginate(note_query.where(and_(*conditions)), query_params, sort_columns, descending=True)
+    rows = session.execute(note_query).all()
 
-    return notes, 200
+    return [to_dict(row, fields) for row in rows], 200, next_cursor_headers(rows, sort_columns, limit)
 
 handler = handler_factory({
     HttpMethod.GET.value: get,
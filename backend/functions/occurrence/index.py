@@ -2,16 +2,47 @@ from typing import Dict, Any, List, Tuple
 
 from sqlalchemy import select, update, and_, delete as sql_delete, inspect
 from sqlalchemy.dialects.mysql import match
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session
 
 from shared import constants
-from backend.lib.db import Note, Tag, Task, Origin, Occurrence
-from backend.lib.func.http import RequestContext, handler_factory, patch_factory, delete_factory, get_offset_and_limit, \
-    get_ts_start_and_end
+from backend.lib.db import Note, Tag, Task, Origin, Occurrence, OccurrenceSchedule, task_tags_association
+from backend.lib.func.http import RequestContext, handler_factory, patch_factory, delete_factory, paginate, next_cursor_headers, \
+    get_ts_start_and_end, select_fields, to_dict, get_requested_fields, project, wants, owners_by_id, OwnerSpec
 from backend.lib.util import HttpMethod
 
 updatable_fields = {constants.completed, constants.priority, constants.time}
 
+occurrence_fields = {
+    constants.id: Occurrence.id,
+    constants.note_id: Occurrence.note_id,
+    constants.priority: Occurrence.priority,
+    constants.completed: Occurrence.completed,
+    constants.time: Occurrence.time,
+}
+
+task_fields = {
+    constants.id: Task.id,
+    constants.description: Task.description,
+    constants.summary: Task.display_summary,
+    constants.tagged: Task.tagged,
+}
+
+schedule_fields = {
+    constants.id: OccurrenceSchedule.id,
+    constants.minute: OccurrenceSchedule.minute,
+    constants.hour: OccurrenceSchedule.hour,
+    constants.day_of_month: OccurrenceSchedule.day_of_month,
+    constants.month: OccurrenceSchedule.month,
+    constants.day_of_week: OccurrenceSchedule.day_of_week,
+    constants.priority: OccurrenceSchedule.priority,
+    constants.next_run: OccurrenceSchedule.next_run,
+    constants.period_seconds: OccurrenceSchedule.period_seconds,
+}
+
+task_spec = OwnerSpec(key=constants.task, fields=task_fields, id=Task.id, association=task_tags_association,
+                      association_column=constants.task_id, schedule_fields=schedule_fields,
+                      schedule_owner_id=OccurrenceSchedule.task_id)
+
 
 def post(session: Session, context: RequestContext) -> Tuple[Dict[str, Any], int]:
     body = context.body
@@ -22,7 +53,7 @@ def post(session: Session, context: RequestContext) -> Tuple[Dict[str, Any], int
         return {constants.status: constants.not_found}, 404
 
     occurrence = Occurrence(**{f: body[f] for f in body if f in updatable_fields},
-                            task=task)
+                            task=task, user_id=context.user.id)
     session.add(occurrence)
     session.commit()
     return {constants.status: constants.success, constants.id: occurrence.id}, 201
@@ -38,11 +69,12 @@ def get(session: Session, context: RequestContext) -> Tuple[List[Dict[str, Any]]
     task = query_params.get(constants.task, constants.empty).strip()
     completed = query_params.get(constants.completed)
     start_time, end_time = get_ts_start_and_end(query_params)
-    offset, limit = get_offset_and_limit(query_params)
+    requested = get_requested_fields(query_params)
+    fields = project(occurrence_fields, requested)
     conditions = [
-        Task.user_id == context.user.id
+        Occurrence.user_id == context.user.id
     ]
-    query = select(Occurrence).join(Occurrence.task)
+    query = select_fields(fields).add_columns(Occurrence.task_id)
 
     if not note_id and not occurrence_id:
         conditions.extend([
@@ -50,6 +82,9 @@ def get(session: Session, context: RequestContext) -> Tuple[List[Dict[str, Any]]
             Occurrence.time <= end_time
         ])
 
+        if tags or task:
+            query = query.join(Occurrence.task)
+
         if tags:
             conditions.append(Task.tags.any(Tag.display_name.in_(tags)))
 
@@ -65,49 +100,27 @@ def get(session: Session, context: RequestContext) -> Tuple[List[Dict[str, Any]]
     elif note_id:
         query = query.join(Occurrence.note)
         conditions.append(Note.id == int(note_id))
-    query = (query.where(and_(*conditions)).offset(offset).limit(limit).order_by(Occurrence.priority.desc(),
-                                                                                 Occurrence.time.desc())
-    .options(
-        joinedload(Occurrence.task)
-        .joinedload(Task.tags), joinedload(Occurrence.task)
-        .joinedload(Task.schedule)
-    ))
-
-    occurrences = session.scalars(query).unique().all()
-
-    return [{
-        constants.id: occurrence.id,
-        constants.note_id: occurrence.note_id,
-        constants.priority: occurrence.priority,
-        constants.completed: occurrence.completed,
-        constants.time: occurrence.time,
-        constants.task: {
-            constants.id: occurrence.task.id,
-            constants.description: occurrence.task.description,
-            constants.summary: occurrence.task.display_summary,
-            constants.tagged: occurrence.task.tagged,
-            constants.tags: [tag.display_name for tag in occurrence.task.tags],
-            constants.schedule: {} if occurrence.task.schedule is None else {
-                constants.id: occurrence.task.schedule.id,
-                constants.minute: occurrence.task.schedule.minute,
-                constants.hour: occurrence.task.schedule.hour,
-                constants.day_of_month: occurrence.task.schedule.day_of_month,
-                constants.month: occurrence.task.schedule.month,
-                constants.day_of_week: occurrence.task.schedule.day_of_week,
-                constants.priority: occurrence.task.schedule.priority,
-                constants.next_run: occurrence.task.schedule.next_run,
-                constants.period_seconds: occurrence.task.schedule.period_seconds,
-            }
-        }} for occurrence in occurrences], 200
+    sort_columns = [Occurrence.priority, Occurrence.time, Occurrence.id]
+    query, limit = paginate(query.where(and_(*conditions)), query_params, sort_columns, descending=True)
+    rows = session.execute(query).all()
+
+    occurrences = [to_dict(row, fields) for row in rows]
+
+    #  same as data: page the occurrences, then load tasks, tags and schedules by the distinct task ids
+    if wants(requested, constants.task):
+        tasks = owners_by_id(session, task_spec, requested, {row.task_id for row in rows})
+        for occurrence, row in zip(occurrences, rows):
+            occurrence[constants.task] = tasks[row.task_id]
+
+    return occurrences, 200, next_cursor_headers(rows, sort_columns, limit)
 
 
 patch_handler = lambda session, update_fields, user_id, path_params: session.execute(update(Occurrence)
 .values(**update_fields).where(
-    and_(Occurrence.task_id == Task.id, Occurrence.id == path_params[constants.id], Task.user_id == user_id)))
+    and_(Occurrence.id == path_params[constants.id], Occurrence.user_id == user_id)))
 
 delete_handler = lambda session, user_id, id: session.execute(
-    sql_delete(Occurrence).where(Occurrence.task_id == Task.id)
-    .where(and_(Occurrence.id == id, Task.user_id == user_id)))
+    sql_delete(Occurrence).where(and_(Occurrence.id == id, Occurrence.user_id == user_id)))
 
 handler = handler_factory({
     HttpMethod.GET.value: get,
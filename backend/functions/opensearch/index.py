@@ -6,12 +6,14 @@ from opensearchpy import OpenSearch, RequestsHttpConnection
 from requests_aws4auth import AWS4Auth
 
 from shared import constants
+from backend.lib.search import index_body, versioned_index, alias_targets, swap_alias, adopt_legacy_index
 from shared.variables import *
 
 opensearch_endpoint = os.getenv(opensearch_endpoint)
 opensearch_port = int(os.getenv(opensearch_port))
 opensearch_index = os.getenv(opensearch_index)
-opensearch_index_refresh_interval = os.getenv(opensearch_index_refresh_interval)
+opensearch_index_refresh_interval = os.getenv(opensearch_index_refresh_interval,
+                                              constants.default_opensearch_index_refresh_interval)
 vector_dimension = int(os.getenv(embedding_vector_dimension))
 region = os.getenv(aws_region)
 credentials = boto3.Session().get_credentials()
@@ -39,29 +41,23 @@ def on_create():
         connection_class=RequestsHttpConnection
     )
 
-    index_mapping = {
-        constants.settings: {constants.index: {constants.knn: True}},
-
-        constants.mappings: {
-            constants.properties: {
-                constants.vector_field: {
-                    constants.type: constants.knn_vector,
-                    constants.dimension: int(vector_dimension)
-                },
-                constants.note_id: {constants.type: constants.integer},
-                constants.user_id: {constants.type: constants.integer},
-
-            }
-        }
-    }
-
     try:
-        if not opensearch_client.indices.exists(index=opensearch_index):
-            print(f'Index {opensearch_index} does not exist. Creating...')
-            opensearch_client.indices.create(index=opensearch_index, body=index_mapping)
+        targets = alias_targets(opensearch_client, opensearch_index)
+        if not targets:
+            index = versioned_index(opensearch_index)
+            print(f'Index {opensearch_index} does not exist. Creating {index} behind it...')
+            opensearch_client.indices.create(index=index, body=index_body(vector_dimension))
+            swap_alias(opensearch_client, opensearch_index, index)
             print('Index creation successful.')
+        elif targets == [opensearch_index]:
+            print(f'Index {opensearch_index} is not an alias yet. Moving it behind one...')
+            index = adopt_legacy_index(opensearch_client, opensearch_index)
+            print(f'{opensearch_index} now points to {index}.')
         else:
-            print(f'Index {opensearch_index} already exists. No action taken.')
+            #  hnsw parameters are fixed at creation, only the refresh interval can follow the config
+            print(f'Index {opensearch_index} already exists. Updating refresh interval.')
+            opensearch_client.indices.put_settings(index=opensearch_index, body={
+                constants.index: {constants.refresh_interval: opensearch_index_refresh_interval}})
 
         return {constants.resource_status: constants.resource_success}
 
@@ -1,37 +1,23 @@
-from sqlalchemy import select, update
+from typing import List, Dict
 
-from backend.lib.db import begin_session, get_utc_timestamp, DataSchedule, Data, Origin
-from backend.lib.util import get_next_run_timestamp, cron_expression_from_schedule
-
-
-#  todo this should be rewritten because of race condition plus because run can take long
-def handler(_, __):
-    session = begin_session()
-    try:
-
-        now_ts = get_utc_timestamp()
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
 
-        due_schedules_stmt = select(DataSchedule).where(DataSchedule.next_run <= now_ts)
-        due_schedules = session.scalars(due_schedules_stmt).all()
-
-        for schedule in due_schedules:
-            next_run = get_next_run_timestamp(cron_expression_from_schedule(schedule),  period_seconds=schedule.period_seconds)
-
-            update_stmt = (
-                update(DataSchedule)
-                .where(DataSchedule.id == schedule.id)
-                .values(
-                    next_run=int(next_run),
-
-                )
-            )
-            session.execute(update_stmt)
-            data_to_insert = Data(value=schedule.target_value, units=schedule.units, metric=schedule.metric)
-            session.add(data_to_insert)
+from shared import constants
+from backend.lib.db import DataSchedule, Data, Metric
+from backend.lib.func.scheduled import handler_factory
+from backend.lib.util import get_next_run_timestamp, cron_expression_from_schedule
 
-        session.commit()
 
+def on_claimed(session: Session, schedules: List[DataSchedule], now: int) -> Dict[int, int]:
+    user_ids = dict(session.execute(select(Metric.id, Metric.user_id)
+                                    .where(Metric.id.in_({s.metric_id for s in schedules}))).tuples().all())
+    session.execute(insert(Data), [{constants.value: s.target_value, constants.units: s.units,
+                                    constants.metric_id: s.metric_id, constants.user_id: user_ids[s.metric_id],
+                                    constants.time: now}
+                                   for s in schedules])
+    return {s.id: get_next_run_timestamp(cron_expression_from_schedule(s), base_time=now,
+                                         period_seconds=s.period_seconds) for s in schedules}
 
 
-    finally:
-        session.close()
+handler = handler_factory(DataSchedule, on_claimed)
@@ -1,34 +1,19 @@
-import json
-from datetime import datetime, timezone
+from typing import Optional
 
-from dateutil.relativedelta import relativedelta
-from sqlalchemy import delete
+from sqlalchemy import select, func, Select
 
-from shared import constants
-from backend.lib.db import begin_session, Data
+from backend.lib.db import Data, Metric, User
+from backend.lib.func.purge import handler_factory, id_range_condition, purge_retention_days, seconds_in_day
 
 
-def handler(event, _):
-    session = begin_session()
-    try:
+#  metric retention wins over user retention which wins over the default
+def deletable_ids(after_id: int, up_to_id: Optional[int], now: int) -> Select:
+    retention_days = func.coalesce(Metric.retention_days, User.retention_days, purge_retention_days)
+    return (select(Data.id)
+            .join(Metric, Data.metric_id == Metric.id)
+            .join(User, Metric.user_id == User.id)
+            .where(id_range_condition(Data.id, after_id, up_to_id),
+                   Data.time < now - retention_days * seconds_in_day))
 
-        three_months_ago = datetime.now(timezone.utc) - relativedelta(months=3)
-        cutoff_timestamp = int(three_months_ago.timestamp())
 
-        print(f'Deleting data older than: {three_months_ago.isoformat()} ({cutoff_timestamp})')
-
-        delete_stmt = delete(Data).where(Data.time < cutoff_timestamp)
-
-        result = session.execute(delete_stmt)
-        session.commit()
-
-        print(f'Successfully deleted {result.rowcount} rows.')
-
-        return {
-            constants.status_code: 200,
-            constants.body: json.dumps(f'Deleted {result.rowcount} rows.')
-        }
-
-
-    finally:
-        session.close()
+handler = handler_factory(Data.__tablename__, Data, deletable_ids)
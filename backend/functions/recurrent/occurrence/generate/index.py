@@ -1,37 +1,52 @@
-from sqlalchemy import select, update
+import os
+from typing import List, Dict, Tuple
 
-from backend.lib.db import begin_session, get_utc_timestamp, OccurrenceSchedule, Occurrence, Origin
-from backend.lib.util import get_next_run_timestamp, cron_expression_from_schedule
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
 
+from shared import constants
+from backend.lib.db import OccurrenceSchedule, Occurrence, Task
+from backend.lib.func.scheduled import handler_factory
+from backend.lib.util import cron_expression_from_schedule, get_next_run_timestamp, get_previous_run_timestamps
+from shared.variables import recurrent_catch_up_max_runs
 
-#  todo this should be rewritten because of race condition plus because run can take long
-def handler(_, __):
-    session = begin_session()
-    try:
+#  if the generator was down every missed slot gets its occurrence, up to this many per schedule (the latest ones).
+#  1 turns catch-up off
+recurrent_catch_up_max_runs = int(os.getenv(recurrent_catch_up_max_runs, constants.default_recurrent_catch_up_max_runs))
 
-        now_ts = get_utc_timestamp()
 
-        due_schedules_stmt = select(OccurrenceSchedule).where(OccurrenceSchedule.next_run <= now_ts)
-        due_schedules = session.scalars(due_schedules_stmt).all()
+def missed_periodic_runs(next_run: int, period_seconds: int, now: int, max_runs: int) -> Tuple[List[int], int]:
+    missed = (now - next_run) // period_seconds + 1
+    return [next_run + k * period_seconds for k in range(max(0, missed - max_runs), missed)], \
+        next_run + missed * period_seconds
 
-        for schedule in due_schedules:
-            next_run = get_next_run_timestamp(cron_expression_from_schedule(schedule), period_seconds=schedule.period_seconds)
 
-            update_stmt = (
-                update(OccurrenceSchedule)
-                .where(OccurrenceSchedule.id == schedule.id)
-                .values(
-                    next_run=int(next_run),
+def missed_cron_runs(cron_expression: str, next_run: int, now: int, max_runs: int) -> Tuple[List[int], int]:
+    #  walking back from now keeps the work bounded by max_runs however long the outage was
+    return get_previous_run_timestamps(cron_expression, now, next_run, max_runs), \
+        get_next_run_timestamp(cron_expression, base_time=now)
 
-                )
-            )
-            session.execute(update_stmt)
-            data_to_insert = Occurrence(priority=schedule.priority,  task=schedule.task)
-            session.add(data_to_insert)
 
-        session.commit()
+def on_claimed(session: Session, schedules: List[OccurrenceSchedule], now: int,
+               max_runs: int = recurrent_catch_up_max_runs) -> Dict[int, int]:
+    user_ids = dict(session.execute(select(Task.id, Task.user_id)
+                                    .where(Task.id.in_({s.task_id for s in schedules}))).tuples().all())
+    next_runs = {}
+    occurrences = []
+    for schedule in schedules:
+        if schedule.period_seconds is not None and schedule.period_seconds > 0:
+            runs, next_runs[schedule.id] = missed_periodic_runs(schedule.next_run, schedule.period_seconds, now,
+                                                                max_runs)
+        else:
+            runs, next_runs[schedule.id] = missed_cron_runs(cron_expression_from_schedule(schedule), schedule.next_run,
+                                                            now, max_runs)
 
+        occurrences.extend({constants.priority: schedule.priority, constants.task_id: schedule.task_id,
+                            constants.user_id: user_ids[schedule.task_id], constants.time: run}
+                           for run in runs or [now])
 
+    session.execute(insert(Occurrence), occurrences)
+    return next_runs
 
-    finally:
-        session.close()
+
+handler = handler_factory(OccurrenceSchedule, on_claimed)
@@ -1,7 +1,18 @@
+import os
 import traceback
+from typing import Any
+
+from sqlalchemy import inspect, Engine, select, update
+from sqlalchemy.schema import CreateColumn
 
 from shared import constants
-from backend.lib.db import setup_engine, Base
+from backend.lib.db import setup_engine, Base, Data, Metric, Occurrence, Task
+from shared.variables import backfill_batch_size
+
+backfill_batch_size = int(os.getenv(backfill_batch_size, constants.default_backfill_batch_size))
+
+#  old name: new name, renamed before anything is created so the rows carry over
+renamed_tables = {'purge_checkpoint': 'job_checkpoint'}
 
 
 def handler(event, _):
@@ -12,6 +23,9 @@ def handler(event, _):
         print('Create event received. Initializing db.')
         return on_create()
 
+    if request_type == constants.update_request_type:
+        print('Update event received. Migrating db.')
+        return on_update()
 
     return  {constants.resource_status: constants.resource_success}
 
@@ -30,4 +44,80 @@ def on_create():
 
     except Exception as e:
         traceback.print_exc()
-        return  {constants.resource_status: constants.resource_failed, constants.resource_reason: str(e)}
\ No newline at end of file
+        return  {constants.resource_status: constants.resource_failed, constants.resource_reason: str(e)}
+
+
+def on_update():
+
+    try:
+
+        engine = setup_engine()
+        migrate(engine)
+        #  the api stack deploys after this, so listings filtering on user_id never see rows without it
+        filled = {
+            Data.__tablename__: backfill(engine, Data, Metric, Data.metric_id),
+            Occurrence.__tablename__: backfill(engine, Occurrence, Task, Occurrence.task_id),
+        }
+        print(f'Backfilled user_id: {filled}')
+        print('Schema migration successful.')
+
+        return  {constants.resource_status: constants.resource_success}
+
+    except Exception as e:
+        traceback.print_exc()
+        return  {constants.resource_status: constants.resource_failed, constants.resource_reason: str(e)}
+
+
+#  additive only apart from renamed_tables: creates missing tables, then adds the columns and indexes the models have and the db doesn't.
+#  new columns on existing tables have to be nullable or have a server default. safe to run any number of times
+def migrate(engine: Engine):
+    existing_tables = set(inspect(engine).get_table_names())
+    with engine.begin() as connection:
+        for old, new in renamed_tables.items():
+            if old in existing_tables and new not in existing_tables:
+                print(f'Renaming table {old} to {new}')
+                connection.exec_driver_sql(f'ALTER TABLE {old} RENAME TO {new}')
+
+    Base.metadata.create_all(engine)
+
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    print(f'Adding column {table.name}.{column.name}')
+                    connection.exec_driver_sql(
+                        f'ALTER TABLE {engine.dialect.identifier_preparer.format_table(table)} '
+                        f'ADD COLUMN {CreateColumn(column).compile(dialect=engine.dialect)}')
+
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing_indexes:
+                #  online ddl, the table stays readable and writable while the index builds
+                print(f'Creating index {index.name} on {table.name}')
+                index.create(engine)
+
+
+#  copies the owner's user_id onto rows written before the column existed, one short transaction per batch.
+#  rows left null are what's left to do, so a second run only picks up what the first one didn't
+def backfill(engine: Engine, entity: Any, owner_entity: Any, owner_id_column: Any,
+             batch_size: int = backfill_batch_size) -> int:
+    filled = 0
+    while True:
+        with engine.begin() as connection:
+            ids = connection.scalars(select(entity.id).where(entity.user_id.is_(None))
+                                     .order_by(entity.id).limit(batch_size)).all()
+            if not ids:
+                break
+            changed = connection.execute(update(entity).where(owner_id_column == owner_entity.id, entity.id.in_(ids))
+                                         .values(user_id=owner_entity.user_id)).rowcount
+        if not changed:
+            print(f'{entity.__tablename__} rows {ids[0]}..{ids[-1]} have no owner to copy from, stopping')
+            break
+        filled += changed
+        if len(ids) < batch_size:
+            break
+    return filled
@@ -0,0 +1,62 @@
+import os
+from typing import Dict, Any, List, Tuple
+
+from sqlalchemy import and_, inspect
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import Session
+
+from shared import constants
+from backend.lib.db import Note, note_fields
+from backend.lib.func.http import handler_factory, RequestContext, get_offset_and_limit, select_fields, to_dict, \
+    get_requested_fields, project
+from backend.lib.search import blend_scores
+from backend.lib.util import HttpMethod, call_embedding
+from backend.lib.vectors import get_vector_store
+from shared.variables import *
+
+embedding_model = os.getenv(embedding_model)
+search_hybrid_weight = float(os.getenv(search_hybrid_weight, constants.default_search_hybrid_weight))
+
+
+def text_relevance(session: Session, user_id: int, text: str, limit: int) -> Dict[int, float]:
+    search_columns = inspect(Note).c.text, inspect(Note).c.image_text, inspect(Note).c.image_description, inspect(
+        Note).c.audio_text
+    relevance = match(*search_columns, against=text).in_natural_language_mode()
+    return {id: score for id, score in session.execute(
+        select_fields({constants.id: Note.id, constants.score: relevance})
+        .where(and_(Note.user_id == user_id, relevance))
+        .order_by(relevance.desc())
+        .limit(limit))}
+
+
+#  semantic search: the query text is embedded and matched against the user's note vectors, hybrid=true also ranks
+#  by fulltext relevance and blends the two. matching notes are read from mysql in one IN query, best first
+def get(session: Session, context: RequestContext) -> Tuple[List[Dict[str, Any]] | Dict[str, str], int]:
+    query_params = context.query_params
+    text = query_params.get(constants.text, constants.empty).strip()
+    if not text:
+        return {constants.status: constants.error, constants.error: constants.any_text_is_required}, 400
+
+    _, limit = get_offset_and_limit(query_params, default_limit=constants.default_search_limit)
+    hybrid = query_params.get(constants.hybrid, constants.empty).lower() == constants.true
+
+    vector = call_embedding(embedding_model, text)
+    scores = dict(get_vector_store().query(context.user.id, vector, limit))
+    if hybrid:
+        scores = blend_scores(scores, text_relevance(session, context.user.id, text, limit), search_hybrid_weight)
+
+    ranked = sorted(scores, key=lambda id: scores[id], reverse=True)[:limit]
+    if not ranked:
+        return [], 200
+
+    fields = project(note_fields, get_requested_fields(query_params))
+    query = (select_fields(fields).add_columns(Note.id.label(constants.owner_id))
+             .where(and_(Note.user_id == context.user.id, Note.id.in_(ranked))))
+    notes = {row.owner_id: to_dict(row, fields) for row in session.execute(query)}
+
+    return [notes[id] | {constants.score: scores[id]} for id in ranked if id in notes], 200
+
+
+handler = handler_factory({
+    HttpMethod.GET.value: get,
+})
@@ -1,14 +1,20 @@
 from typing import Dict, Any, List, Tuple
 
-from sqlalchemy import select, and_, inspect
+from sqlalchemy import and_, inspect
 from sqlalchemy.dialects.mysql import match
 from sqlalchemy.orm import Session
 
 from shared import constants
 from backend.lib.db import Tag, normalize_identifier
-from backend.lib.func.http import RequestContext, handler_factory, post_factory, get_offset_and_limit
+from backend.lib.func.http import RequestContext, handler_factory, post_factory, paginate, next_cursor_headers, \
+    select_fields, to_dict, get_requested_fields, project
 from backend.lib.util import HttpMethod
 
+tag_fields = {
+    constants.id: Tag.id,
+    constants.name: Tag.display_name,
+}
+
 
 def get(session: Session,context: RequestContext) -> Tuple[List[Dict[str, Any]]|Dict[str, str], int]:
     query_params = context.query_params
@@ -16,25 +22,18 @@ def get(session: Session,context: RequestContext) -> Tuple[List[Dict[str, Any]]|
     name = query_params.get(constants.name)
 
 
-    offset, limit = get_offset_and_limit(query_params)
-
     conditions = [Tag.user_id == context.user.id]
     if name:
         conditions.append(match(inspect(Tag).c.display_name,
                                      against=name).in_natural_language_mode(), )
 
-    query = (select(Tag).where(and_(*conditions))
-
-             .offset(offset)
-             .limit(limit)
-             .order_by(Tag.name.asc()))
+    sort_columns = [Tag.name, Tag.id]
+    fields = project(tag_fields, get_requested_fields(query_params))
+    query, limit = paginate(select_fields(fields).where(and_(*conditions)), query_params, sort_columns)
 
-    tags = session.scalars(query).all()
+    rows = session.execute(query).all()
 
-    return [{
-        constants.id: tag.id,
-        constants.name: tag.display_name,
-    } for tag in tags], 200
+    return [to_dict(row, fields) for row in rows], 200, next_cursor_headers(rows, sort_columns, limit)
 
 
 post_handler = lambda context, _: Tag(display_name=context.body[constants.name], name=normalize_identifier(context.body[constants.name]),  user_id=context.user.id)
@@ -3,10 +3,10 @@ import os
 from typing import List, Dict, Any
 
 from sqlalchemy import inspect, select, and_
-from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm import Session
 
 from shared import constants
-from backend.lib.db import Tag, Task, Note
+from backend.lib.db import Tag, Task, Note, task_tags_association
 from backend.lib.func.sqs import process_record_factory, Params, handler_factory, Model
 from backend.lib.util import add_tags
 from shared.constants import default_max_tokens
@@ -79,13 +79,13 @@ def text_supplier(session: Session, note_id, _):
 
 def on_response_from_model(session: Session, note_id: int, _: str, data: List[Dict[str, Any]]):
     note = session.get(Note, note_id)
-    add_tags(note.user_id, session, data, lambda: select(Task).where(
+    add_tags(note.user_id, session, data, Task, task_tags_association, lambda: select(Task.id).where(
         and_(
             Task.id.in_([item[constants.id] for item in data]),
             Task.tagged == False,
             Task.note_id == note_id
         )
-    ).options(selectinload(Task.tags)))
+    ))
     session.commit()
 
 
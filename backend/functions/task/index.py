@@ -5,10 +5,17 @@ from sqlalchemy.dialects.mysql import match
 from sqlalchemy.orm import Session
 
 from shared import constants
-from backend.lib.db import normalize_identifier, Task, Tag
-from backend.lib.func.http import RequestContext, handler_factory, post_factory, get_offset_and_limit
+from backend.lib.db import normalize_identifier, Task, Tag, task_tags_association
+from backend.lib.func.http import RequestContext, handler_factory, post_factory, paginate, next_cursor_headers, \
+    select_fields, to_dict, tags_by_id, get_requested_fields, project, wants
 from backend.lib.util import HttpMethod, get_or_create_tags
 
+task_fields = {
+    constants.id: Task.id,
+    constants.summary: Task.display_summary,
+    constants.description: Task.description,
+}
+
 
 def get(session: Session, context: RequestContext) -> Tuple[List[Dict[str, Any]]|Dict[str, str], int]:
     path_params = context.path_params
@@ -16,7 +23,6 @@ def get(session: Session, context: RequestContext) -> Tuple[List[Dict[str, Any]]
     id = path_params.get(constants.id)
 
     query_params = context.query_params
-    offset, limit = get_offset_and_limit(query_params)
 
     text = query_params.get(constants.text, constants.empty).strip()
     tags = query_params.get(constants.tags).split(constants.params_delim) if constants.tags in query_params else []
@@ -30,20 +36,21 @@ def get(session: Session, context: RequestContext) -> Tuple[List[Dict[str, Any]]
         if text:
            conditions.append(match(inspect(Task).c.display_summary, inspect(Task).c.description,
                                      against=text).in_natural_language_mode(), )
-    query = (select(Task).where(and_(*conditions))
+    sort_columns = [Task.display_summary, Task.id]
+    requested = get_requested_fields(query_params)
+    fields = project(task_fields, requested)
+    query = select_fields(fields).add_columns(Task.id.label(constants.owner_id)).where(and_(*conditions))
+    query, limit = paginate(query, query_params, sort_columns)
 
-             .offset(offset)
-             .limit(limit)
-             .order_by(Task.display_summary.asc()))
+    rows = session.execute(query).all()
+    items = [to_dict(row, fields) for row in rows]
 
-    tasks = session.scalars(query).unique().all()
+    if wants(requested, constants.tags):
+        tags_by_owner = tags_by_id(session, task_tags_association, constants.task_id, {row.owner_id for row in rows})
+        for item, row in zip(items, rows):
+            item[constants.tags] = tags_by_owner.get(row.owner_id, [])
 
-    return [{
-        constants.id: task.id,
-        constants.summary: task.display_summary,
-        constants.description: task.description,
-        constants.tags: [tag.display_name for tag in task.tags],
-    } for task in tasks], 200
+    return items, 200, next_cursor_headers(rows, sort_columns, limit)
 
 
 def patch(session: Session, context: RequestContext) -> (Dict[str, Any], int):
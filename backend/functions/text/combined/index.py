@@ -0,0 +1,82 @@
+import json
+import os
+from typing import Any, Dict, List
+
+import boto3
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from shared import constants
+from backend.lib.db import Note
+from backend.lib.extraction import metrics_schema, link_schema, task_schema, save_metrics, save_links, save_tasks
+from backend.lib.func.sqs import batch_handler_factory, Model, Params, note_text_supplier
+from shared.constants import default_max_tokens
+from shared.variables import *
+
+sns_client = boto3.client(constants.sns, region_name=os.getenv(aws_region))
+tagging_topic_arn = os.getenv(tagging_topic_arn)
+
+generative_model = os.getenv(generative_model)
+max_tokens = int(os.getenv(max_tokens, default_max_tokens))
+
+#  one pass instead of text/metric + text/link + text/task, so the note is read and sent to the model once
+combined_schema = {
+    "type": "object",
+    "properties": {
+        "metrics": metrics_schema,
+        "links": link_schema,
+        "tasks": task_schema,
+    },
+    "required": ["metrics", "links", "tasks"]
+}
+
+prompt = ("You are an expert data extraction bot. Analyze the text below and extract three kinds of items from it: "
+          "numeric metrics, web links and actionable tasks.\n"
+          "**metrics**: all quantifiable numeric metrics, including their value and unit. All numbers which measure or describe anything unless explicitly stated to ignore. "
+          "Sometimes numeric metrics may not be obvious. And could be explicitly specified like huge, a lot, not enough. In these cases you might estimate the number on the scale 1-10 inclusively. "
+          "Especially focus on what a person eats and does or anything related to the persons mental, physical health and wellbeing. "
+          "If you detect any sentiment add it as another metric where name will be specific emotion(not a generic sentiment) you detect and value the magnitude of that sentiment from 1 to 10 inclusive. Make sure to specify units for that emotion as 'sentiment'. "
+          "Make sure names of the metric are human readable.\n"
+          "**links**: all web links (http/https). For each link, derive a concise description from its anchor text or surrounding context.\n"
+          "**tasks**: a task can be an item in a to-do list, a statement of intent (e.g., 'I need to...', 'remind me to...'), or an explicit command (e.g., 'add task:'). "
+          "For each task, assign a priority from 1 (least important) to 10 (most important). If priority is not mentioned, use a default of 5.\n"
+          "Your output must be ONLY a JSON object that strictly adheres to the provided schema. "
+          "If nothing of some kind is found, output an empty array for it.\n\n"
+          f"**JSON Schema**:\n{json.dumps(combined_schema, indent=3)}\n\n"
+          "--- EXAMPLES ---\n"
+          "Text: 'I ran 5 miles today, found a good plan at https://run.com/plan. Need to buy new shoes.'\n"
+          "Output: {\"metrics\": [{\"name\": \"Distance run\", \"value\": 5, \"units\": \"miles\"}], "
+          "\"links\": [{\"url\": \"https://run.com/plan\", \"summary\": \"running plan\", \"description\": \"A running plan the author found helpful\"}], "
+          "\"tasks\": [{\"summary\": \"buy new shoes\", \"description\": \"Buy new running shoes\", \"priority\": 5}]}\n"
+          "--- END EXAMPLES ---\n\n"
+          "**Text to Analyze**:\n")
+
+
+def on_response_from_model(session: Session, note_id: int, data: Dict[str, List[Dict[str, Any]]]) -> None:
+    target_note = session.scalar(select(Note).where(Note.id == note_id))
+    if not target_note:
+        print(f"Note {note_id} not found")
+        return
+
+    saved_metrics = save_metrics(session, target_note, data.get(constants.metrics))
+    saved_links = save_links(session, target_note, data.get(constants.links))
+    saved_tasks = save_tasks(session, target_note, data.get(constants.tasks))
+
+    if saved_metrics or saved_links or saved_tasks:
+        session.commit()
+
+        send_to_sns(target_note.id)
+
+
+def send_to_sns(note_id):
+    sns_client.publish(
+        TopicArn=tagging_topic_arn,
+        Message=json.dumps({
+            constants.note_id: note_id,
+        }),
+        Subject='Extracted metrics, links and tasks ready for tagging'
+    )
+
+
+handler = batch_handler_factory(Params(prompt, note_text_supplier, Model(generative_model), max_tokens,
+                                       constants.combined), on_response_from_model)
@@ -3,13 +3,13 @@ import os
 from typing import Any, Dict, List
 
 import boto3
-from sqlalchemy import inspect, select, and_
 from sqlalchemy.orm import Session
 
 from shared import constants
-from backend.lib.db import Link, normalize_identifier, Note, Origin
-from backend.lib.func.sqs import handler_factory, Model
-from backend.lib.func.sqs import process_record_factory, note_text_supplier, Params
+from backend.lib.db import Note
+from backend.lib.extraction import link_schema, save_links
+from backend.lib.func.sqs import batch_handler_factory, Model
+from backend.lib.func.sqs import note_text_supplier, Params
 from shared.constants import default_max_tokens
 from shared.variables import *
 
@@ -19,28 +19,6 @@ tagging_topic_arn = os.getenv(tagging_topic_arn)
 generative_model = os.getenv(generative_model)
 max_tokens = int(os.getenv(max_tokens,  default_max_tokens))
 # todo add logic to submit text for analysis with either audio text + image or with text + image
-link_schema = {
-    "type": "array",
-    "items": {
-        "type": "object",
-        "properties": {
-            "url": {
-                "type": "string",
-                "description": f"The full URL as it appears in the text. Max length: {inspect(Link).c.url.type.length} characters."
-            },
-            "summary": {
-                "type": "string",
-                "description": f"A brief summary of the link's description. Max length: {inspect(Link).c.display_summary.type.length} characters."
-            },
-            "description": {
-                "type": "string",
-                "description": f"A concise description of the link's content based on the surrounding text. Max length: {inspect(Link).c.description.type.length} characters."
-            },
-        },
-        "required": ["url", "description", "summary"]
-    }
-}
-
 prompt = (
     "You are an expert at extracting links from text. Analyze the text below and extract all web links (http/https). "
     "For each link, derive a concise description from its anchor text or surrounding context. "
@@ -63,17 +41,8 @@ def on_response_from_model(session: Session, note_id: int, data: List[Dict[str,
     if not note:
         print(f"Note {note_id} not found")
         return
-    existing = [l.url for l in session.scalars(
-        select(Link).where(and_(Link.url.in_([d[constants.url] for d in data]), Link.user_id == note.user_id))).unique()]
 
-    new_ones = [Link(url=l[constants.url],
-                     user=note.user,
-                     note=note,
-                     summary=normalize_identifier(l[constants.summary]),
-                     display_summary=l[constants.summary],
-                     description=l[constants.description]) for l in data if l[constants.url] not in existing]
-    if new_ones:
-        session.add_all(new_ones)
+    if save_links(session, note, data):
         session.commit()
 
         send_to_sns(note_id)
@@ -89,5 +58,5 @@ def send_to_sns(note_id):
     )
 
 
-handler = handler_factory(
-    process_record_factory(Params(prompt, note_text_supplier, Model(generative_model), max_tokens), on_response_from_model))
+handler = batch_handler_factory(Params(prompt, note_text_supplier, Model(generative_model), max_tokens, constants.link),
+                                on_response_from_model)
@@ -3,14 +3,14 @@ import os
 from typing import List, Dict, Any
 
 import boto3
-from sqlalchemy import select, inspect
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from shared import constants
-from backend.lib.db import Metric, Data, Note, normalize_identifier, Origin
-from backend.lib.func.sqs import Params, process_record_factory, note_text_supplier, Model
-from backend.lib.func.sqs import handler_factory
-from backend.lib.util import get_or_create_metrics
+from backend.lib.db import Note
+from backend.lib.extraction import metrics_schema, save_metrics
+from backend.lib.func.sqs import Params, note_text_supplier, Model
+from backend.lib.func.sqs import batch_handler_factory
 from shared.constants import default_max_tokens
 from shared.variables import *
 
@@ -21,28 +21,6 @@ generative_model = os.getenv(generative_model)
 max_tokens =  int(os.getenv(max_tokens, default_max_tokens))
 
 
-metrics_schema = {
-    "type": "array",
-    "items": {
-        "type": "object",
-        "properties": {
-            "name": {
-                "type": "string",
-                "description": f"Human readable name of the metric (e.g., Distance run, Heart rate). Make sure it only contains nouns and adjectives. Max length: {inspect(Metric).c.name.type.length} characters."
-            },
-            "value": {
-                "type": "number",
-                "description": "The numeric value extracted."
-            },
-            "units": {
-                "type": "string",
-                "description": f"The unit of measurement (e.g., miles, kcal, bpm). If no units are mentioned, use a standard unit or 'items'. Max length: {inspect(Data).c.units.type.length} characters."
-            }
-        },
-        "required": ["name", "value", "units"]
-    }
-}
-
 prompt = ("You are an expert numeric data extraction bot. Analyze the text below and extract all quantifiable "
           "numeric metrics, including their value and unit. All numbers which measure or describe anything unless explicitly stated to ignore. "
           "Sometimes numeric metrics may not be obvious. And could be explicitly specified like huge, a lot, not enough. In these cases you might estimate the number on the scale 1-10 inclusively. But it's important to extract all quantifiable objects, live creatures, events, actions or anything. As much as you can. "
@@ -64,15 +42,8 @@ prompt = ("You are an expert numeric data extraction bot. Analyze the text below
 
 def on_response_from_model(session: Session, note_id: int, data: List[Dict[str, Any]]) -> None:
     target_note = session.scalar(select(Note).where(Note.id == note_id))
-    metrics_map = get_or_create_metrics(session, {normalize_identifier(item[constants.name]) : item[constants.name] for item in data}, target_note.user_id)
-    data_to_add = [
-        Data(value=d.get(constants.value), units=d.get(constants.units),
-             metric=metrics_map[normalize_identifier(d.get(constants.name))],
-             note=target_note)
-     for d in data if constants.name in d]
 
-    if  data_to_add:
-        session.add_all(data_to_add)
+    if save_metrics(session, target_note, data):
         session.commit()
 
         send_to_sns(target_note.id)
@@ -86,5 +57,5 @@ def send_to_sns(note_id):
         Subject='Extracted metrics ready for tagging'
     )
 
-handler = handler_factory(
-    process_record_factory(Params(prompt, note_text_supplier, Model(generative_model), max_tokens), on_response_from_model))
+handler = batch_handler_factory(Params(prompt, note_text_supplier, Model(generative_model), max_tokens, constants.metric),
+                                on_response_from_model)
@@ -0,0 +1,168 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from shared import constants
+from backend.lib.db import begin_session, get_utc_timestamp, Note, Origin, JobCheckpoint
+from backend.lib.func.sqs import note_text_supplier
+from backend.lib.search import get_opensearch_client, index_body, versioned_index, alias_targets, swap_alias, \
+    bulk_index, adopt_legacy_index
+from backend.lib.util import call_embedding
+from shared.variables import *
+
+opensearch_index = os.getenv(opensearch_index)
+opensearch_index_refresh_interval = os.getenv(opensearch_index_refresh_interval,
+                                              constants.default_opensearch_index_refresh_interval)
+embedding_model = os.getenv(embedding_model)
+vector_dimension = int(os.getenv(embedding_vector_dimension, constants.default_embedding_vector_dimension))
+reembedding_batch_size = int(os.getenv(reembedding_batch_size, constants.default_reembedding_batch_size))
+reembedding_sleep_seconds = float(os.getenv(reembedding_sleep_seconds, constants.default_reembedding_sleep_seconds))
+bedrock_max_concurrency = int(os.getenv(bedrock_max_concurrency, constants.default_bedrock_max_concurrency))
+
+
+#  the origin note_text_supplier would get the note's last embedding message with, so the text is the same
+def origin_of(note: Note) -> str:
+    if note.text:
+        return Origin.text.value
+    if note.audio_key:
+        return Origin.audio_text.value
+    return Origin.img_desc.value
+
+
+#  a note bedrock rejects (e.g. text over the model's input limit) counts as failed instead of failing the chunk,
+#  otherwise the checkpoint would never move past it
+def embed_or_none(text: str) -> Optional[List[float]]:
+    try:
+        return call_embedding(embedding_model, text)
+    except Exception:
+        #  call_embedding already printed the trace
+        return None
+
+
+def embed_chunk(session: Session, notes: List[Note], max_concurrency: int) -> Tuple[
+    List[Tuple[int, int, List[float]]], List[int]]:
+    texts = [(note.user_id, note.id, note_text_supplier(session, note.id, origin_of(note))) for note in notes]
+    texts = [(user_id, note_id, text) for user_id, note_id, text in texts if text]
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(texts)))) as executor:
+        vectors = list(executor.map(lambda text: embed_or_none(text[2]), texts))
+
+    documents = [(user_id, note_id, vector) for (user_id, note_id, _), vector in zip(texts, vectors) if vector]
+    failed = [note_id for (_, note_id, _), vector in zip(texts, vectors) if not vector]
+    return documents, failed
+
+
+def reembed(session: Session, client: Any, target: str, notes: List[Note], max_concurrency: int) -> Tuple[
+    int, List[int]]:
+    documents, not_embedded = embed_chunk(session, notes, max_concurrency)
+    #  create leaves notes the embedding worker wrote to the target meanwhile, those are newer
+    rejected = bulk_index(client, target, documents, constants.create)
+    return len(documents) - len(rejected), not_embedded + rejected
+
+
+#  fills <index>_v<version> when the alias doesn't point to it yet: notes are read in primary key chunks, embedded
+#  concurrently and written with one _bulk request per chunk, with refresh off until the end. the last note id of
+#  every chunk is committed to the checkpoint, so a run stopped by the timeout resumes there. notes bedrock or the
+#  domain failed on are kept in the checkpoint's retry ids and tried again once the table is done. the alias is only
+#  swapped, dropping the old index, when none are left, then later runs have nothing to do. an index from before
+#  aliases is taken as the configured version and only moved behind the alias
+def handler_factory(client_supplier: Callable[[], Any] = get_opensearch_client, batch_size: int = reembedding_batch_size,
+                    sleep_seconds: float = reembedding_sleep_seconds, max_concurrency: int = bedrock_max_concurrency,
+                    sleep: Callable[[float], None] = time.sleep):
+    def handler(_, context):
+        client = client_supplier()
+        target = versioned_index(opensearch_index)
+        targets = alias_targets(client, opensearch_index)
+        if targets == [opensearch_index]:
+            #  the index creator normally does this on deploy, a run scheduled before it must not start a re-embedding
+            print(f'{opensearch_index} is not an alias yet, moving it behind one as {target}')
+            adopt_legacy_index(client, opensearch_index)
+            return response(0, 0, True)
+        if target in targets:
+            return response(0, 0, True)
+
+        if not client.indices.exists(index=target):
+            print(f'Creating {target} for {embedding_model}')
+            client.indices.create(index=target, body=index_body(vector_dimension, constants.disabled_refresh_interval))
+
+        reembedded = 0
+        scanned = False
+        session = begin_session()
+        try:
+            name = f'{constants.reembedded}:{target}'
+            checkpoint = session.get(JobCheckpoint, name)
+            if not checkpoint:
+                checkpoint = JobCheckpoint(name=name, last_id=0)
+                session.add(checkpoint)
+            retry_ids = set(json.loads(checkpoint.retry_ids or '[]'))
+            print(f'Re-embedding notes into {target} from id {checkpoint.last_id}, retrying {len(retry_ids)}')
+
+            queue = None
+            while True:
+                if context and context.get_remaining_time_in_millis() < constants.scheduled_time_reserve_millis:
+                    print(f'Stopping at id {checkpoint.last_id}, the next run resumes from there')
+                    break
+
+                if queue is None:
+                    notes = session.scalars(select(Note).where(Note.id > checkpoint.last_id)
+                                            .order_by(Note.id).limit(batch_size)).all()
+                else:
+                    chunk, queue = queue[:batch_size], queue[batch_size:]
+                    retry_ids.difference_update(chunk)
+                    #  deleted notes drop out here
+                    notes = session.scalars(select(Note).where(Note.id.in_(chunk)).order_by(Note.id)).all()
+
+                if notes:
+                    written, failed = reembed(session, client, target, notes, max_concurrency)
+                    reembedded += written
+                    retry_ids.update(failed)
+                if queue is None:
+                    if notes:
+                        checkpoint.last_id = notes[-1].id
+                    #  the table is done, what failed so far is tried once more in this run
+                    if len(notes) < batch_size:
+                        scanned = True
+                        queue = sorted(retry_ids)
+                checkpoint.retry_ids = json.dumps(sorted(retry_ids))
+                checkpoint.time = get_utc_timestamp()
+                session.commit()
+                for note in notes:
+                    session.expunge(note)
+
+                if queue == []:
+                    break
+                sleep(sleep_seconds)
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+        finished = scanned and not retry_ids
+        if retry_ids:
+            print(f'Notes not re-embedded yet: {sorted(retry_ids)}, {opensearch_index} keeps pointing to the old index')
+        if finished:
+            client.indices.put_settings(index=target, body={
+                constants.index: {constants.refresh_interval: opensearch_index_refresh_interval}})
+            swap_alias(client, opensearch_index, target)
+            print(f'{opensearch_index} now points to {target}')
+
+        return response(reembedded, len(retry_ids), finished)
+
+    return handler
+
+
+def response(reembedded: int, failed: int, finished: bool) -> Dict[str, Any]:
+    print(f'Re-embedded {reembedded} notes, failed: {failed}, finished: {finished}')
+    return {
+        constants.status_code: 200,
+        constants.body: json.dumps({constants.reembedded: reembedded, constants.failed: failed,
+                                    constants.finished: finished})
+    }
+
+
+handler = handler_factory()
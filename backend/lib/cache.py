@@ -0,0 +1,233 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Callable
+
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.mysql import insert
+
+from shared import constants
+from backend.lib.db import begin_session, ModelResponse, get_utc_timestamp
+from shared.variables import model_cache, model_cache_ttl, model_cache_memory_max_entries, \
+    model_cache_persistent_max_entries, model_cache_dir
+
+model_cache = os.getenv(model_cache, constants.default_model_cache)
+model_cache_ttl = int(os.getenv(model_cache_ttl, constants.default_model_cache_ttl))
+model_cache_memory_max_entries = int(
+    os.getenv(model_cache_memory_max_entries, constants.default_model_cache_memory_max_entries))
+model_cache_persistent_max_entries = int(
+    os.getenv(model_cache_persistent_max_entries, constants.default_model_cache_persistent_max_entries))
+model_cache_dir = os.getenv(model_cache_dir, constants.default_model_cache_dir)
+
+#  persistent tiers only check their size every so many writes
+eviction_check_interval = 100
+
+
+def cache_key(model: str, prompt: Optional[str], text: str, max_tokens: Optional[int]) -> str:
+    prompt_hash = hashlib.sha256((prompt or constants.empty).encode(constants.utf_8)).hexdigest()
+    text_hash = hashlib.sha256((text or constants.empty).encode(constants.utf_8)).hexdigest()
+    return hashlib.sha256(f'{model}|{prompt_hash}|{text_hash}|{max_tokens}'.encode(constants.utf_8)).hexdigest()
+
+
+class MemoryTier:
+    name = constants.memory
+
+    def __init__(self, max_entries: int = model_cache_memory_max_entries, ttl: int = model_cache_ttl,
+                 clock: Callable[[], float] = time.monotonic):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = (value, self._clock() + self._ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+#  opt in (e.g. MODEL_CACHE=memory,db): every lookup is a session of its own and responses to users' text are kept
+#  in mysql until the ttl or the size cap evicts them
+class DbTier:
+    name = constants.db
+
+    def __init__(self, max_entries: int = model_cache_persistent_max_entries, ttl: int = model_cache_ttl):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._puts = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        session = begin_session()
+        try:
+            row = session.execute(select(ModelResponse.response, ModelResponse.time)
+                                  .where(ModelResponse.key == key)).first()
+            if row is None or row.time <= get_utc_timestamp() - self._ttl:
+                return None
+            return json.loads(row.response)
+        finally:
+            session.close()
+
+    def put(self, key: str, value: Any):
+        session = begin_session()
+        try:
+            now = get_utc_timestamp()
+            stmt = insert(ModelResponse).values(key=key, response=json.dumps(value), time=now)
+            session.execute(stmt.on_duplicate_key_update(response=stmt.inserted.response, time=stmt.inserted.time))
+            session.commit()
+
+            self._puts += 1
+            if self._puts % eviction_check_interval == 0:
+                self.evict(session)
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def evict(self, session):
+        session.execute(delete(ModelResponse).where(ModelResponse.time <= get_utc_timestamp() - self._ttl))
+        oldest_kept = session.scalar(select(ModelResponse.time).order_by(ModelResponse.time.desc())
+                                     .offset(self._max_entries - 1).limit(1))
+        if oldest_kept is not None:
+            session.execute(delete(ModelResponse).where(ModelResponse.time < oldest_kept))
+        session.commit()
+
+
+class FileTier:
+    name = constants.file
+
+    def __init__(self, directory: str = model_cache_dir, max_entries: int = model_cache_persistent_max_entries,
+                 ttl: int = model_cache_ttl):
+        self._directory = directory
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._puts = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            if os.path.getmtime(path) <= time.time() - self._ttl:
+                os.remove(path)
+                return None
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, value: Any):
+        path = self._path(key)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+
+        self._puts += 1
+        if self._puts % eviction_check_interval == 0:
+            self.evict()
+
+    def evict(self):
+        entries = sorted((e for e in os.scandir(self._directory) if e.name.endswith('.json')),
+                         key=lambda e: e.stat().st_mtime)
+        expired_before = time.time() - self._ttl
+        for index, entry in enumerate(entries):
+            if index < len(entries) - self._max_entries or entry.stat().st_mtime <= expired_before:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, f'{key}.json')
+
+
+#  tiers are checked in order and a hit in a slower tier is copied into the faster ones.
+#  a failing tier never fails the model call, it only costs a miss
+class TieredCache:
+    def __init__(self, tiers: List[Any]):
+        self._tiers = tiers
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.tier_hits = {tier.name: 0 for tier in tiers}
+
+    def get(self, key: str) -> Optional[Any]:
+        for index, tier in enumerate(self._tiers):
+            try:
+                value = tier.get(key)
+            except Exception:
+                traceback.print_exc()
+                continue
+            if value is not None:
+                with self._lock:
+                    self.hits += 1
+                    self.tier_hits[tier.name] += 1
+                for faster_tier in self._tiers[:index]:
+                    self._put_quietly(faster_tier, key, value)
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: Any):
+        for tier in self._tiers:
+            self._put_quietly(tier, key, value)
+
+    #  counts since the last call, so a warm lambda logs each invocation's own
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {'hits': self.hits, 'misses': self.misses, 'tier_hits': dict(self.tier_hits)}
+            self.hits = 0
+            self.misses = 0
+            self.tier_hits = {tier.name: 0 for tier in self._tiers}
+        return stats
+
+    @staticmethod
+    def _put_quietly(tier: Any, key: str, value: Any):
+        try:
+            tier.put(key, value)
+        except Exception:
+            traceback.print_exc()
+
+
+def build_cache(tier_names: str = model_cache) -> Optional[TieredCache]:
+    tier_factories = {
+        constants.memory: MemoryTier,
+        constants.db: DbTier,
+        constants.file: FileTier,
+    }
+    tiers = [tier_factories[name.strip()]() for name in tier_names.split(',') if name.strip()]
+    return TieredCache(tiers) if tiers else None
+
+
+model_response_cache = build_cache()
+
+
+def get_model_response_cache() -> Optional[TieredCache]:
+    return model_response_cache
+
+
+def set_model_response_cache(cache: Optional[TieredCache]):
+    global model_response_cache
+    model_response_cache = cache
@@ -1,9 +1,12 @@
 import datetime
 import json
 import os
+import threading
+import time
+import traceback
 from decimal import Decimal
 from enum import Enum
-from typing import List, Optional
+from typing import List, Optional, Callable, Dict, Tuple, Any
 
 import boto3
 from slugify import slugify
@@ -18,7 +21,8 @@ from sqlalchemy import (
     UniqueConstraint,
     Index,
     create_engine,
-    Table, Column, CheckConstraint
+    event,
+    Table, Column, CheckConstraint, Engine, QueuePool
 )
 from sqlalchemy.orm import (
     DeclarativeBase,
@@ -29,6 +33,7 @@ from sqlalchemy.orm import (
     validates
 )
 
+from shared import constants
 from shared.variables import *
 
 id_cant_be_empty = 'Identifier cannot be empty.'
@@ -92,6 +97,7 @@ class Tag(Base):
             mysql_prefix='FULLTEXT',
         ),
         UniqueConstraint('name', 'user_id', name='uq_tag_name'),
+        Index('idx_tag_user_name', 'user_id', 'name'),
 
     )
 
@@ -129,6 +135,8 @@ class User(Base):
     accepted_terms: Mapped[bool] = mapped_column(Boolean, default=False)
     parent_user_id: Mapped[int | None] = mapped_column(ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
     time: Mapped[int] = mapped_column(BigInteger, default=get_utc_timestamp)
+    #  days data and occurrences are kept for, null means the purge default
+    retention_days: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
 
     def __repr__(self) -> str:
         return f'User(id={self.id!r}, name={self.name!r})'
@@ -142,6 +150,7 @@ class Note(Base):
             'text', 'image_text', 'image_description', 'audio_text',
             mysql_prefix='FULLTEXT',
         ),
+        Index('idx_note_user_time', 'user_id', 'time'),
     )
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
@@ -178,11 +187,27 @@ class Note(Base):
         return f'Note(id={self.id!r}, user_id={self.user_id!r}, time={self.time})'
 
 
+#  columns a note is listed with, shared by /note and /note/search so both return the same fields
+note_fields = {
+    constants.id: Note.id,
+    constants.text: Note.text,
+    constants.time: Note.time,
+    constants.image_key: Note.image_key,
+    constants.audio_key: Note.audio_key,
+    constants.image_described: Note.image_described,
+    constants.audio_transcribed: Note.audio_transcribed,
+    constants.image_text: Note.image_text,
+    constants.image_description: Note.image_description,
+    constants.audio_text: Note.audio_text,
+}
+
+
 class Metric(Base):
     __tablename__ = 'metric'
     __table_args__ = (
         UniqueConstraint('name', 'user_id',  name='uq_metric_name'),
         Index('idx_metric_name', 'name'),
+        Index('idx_metric_user_display_name', 'user_id', 'display_name'),
         Index(
             'ft_display_name',
             'display_name',
@@ -193,6 +218,8 @@ class Metric(Base):
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     name: Mapped[str] = mapped_column(String(500))
     display_name: Mapped[str] = mapped_column(String(500))
+    #  overrides the user's retention for this metric's data
+    retention_days: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
 
     tagged: Mapped[bool] = mapped_column(Boolean, default=False)
     tags: Mapped[List['Tag']] = relationship(
@@ -224,9 +251,19 @@ class Metric(Base):
 
 class Data(Base):
     __tablename__ = 'data'
+    #  listing is user_id = ? and time between ? and ? order by time desc. metric_id, time serves a single metric's
+    #  history and time alone the purge and wide time ranges
+    __table_args__ = (
+        Index('idx_data_user_time', 'user_id', 'time'),
+        Index('idx_data_metric_time', 'metric_id', 'time'),
+        Index('idx_data_time', 'time'),
+    )
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     metric_id: Mapped[int] = mapped_column(ForeignKey('metric.id'))
+    #  copy of metric.user_id so ownership checks and listing don't need the join.
+    #  nullable only until the schema migration has backfilled existing rows
+    user_id: Mapped[int | None] = mapped_column(ForeignKey('user.id'), nullable=True)
     note_id: Mapped[int | None] = mapped_column(ForeignKey('note.id'), nullable=True)
 
     value: Mapped[Decimal] = mapped_column(Numeric(10, 2), nullable=False)
@@ -249,6 +286,7 @@ class DataSchedule(Base):
     __tablename__ = 'data_schedule'
     __table_args__ = (
         UniqueConstraint('metric_id', name='uq_metric_schedule'),
+        Index('idx_data_schedule_next_run', 'next_run'),
         CheckConstraint(
             '(minute is not null and hour is not null and day_of_month is not null and month is not null and day_of_week is not null) or (period_seconds is not null)',
             name='data_cron_or_period_required_check'
@@ -288,6 +326,7 @@ class Link(Base):
             'description', 'display_summary', 'url',
             mysql_prefix='FULLTEXT',
         ),
+        Index('idx_link_user_time', 'user_id', 'time'),
     )
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
@@ -322,6 +361,7 @@ class Task(Base):
 
     __table_args__ = (
         UniqueConstraint('summary', 'user_id', name='uq_task_summary'),
+        Index('idx_task_user_display_summary', 'user_id', 'display_summary'),
         Index(
 
             'ft_task_content',
@@ -335,6 +375,8 @@ class Task(Base):
     summary: Mapped[str] = mapped_column(String(500), nullable=False)
     display_summary: Mapped[str] = mapped_column(String(500), nullable=False)
     description: Mapped[str] = mapped_column(String(1000), nullable=False)
+    #  overrides the user's retention for this task's occurrences
+    retention_days: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
     tagged: Mapped[bool] = mapped_column(Boolean, default=False)
     user_id: Mapped[int] = mapped_column(ForeignKey('user.id'))
     user: Mapped['User'] = relationship()
@@ -382,6 +424,7 @@ class OccurrenceSchedule(Base):
 
     __table_args__ = (
         UniqueConstraint('task_id', name='uq_task_schedule'),
+        Index('idx_occurrence_schedule_next_run', 'next_run'),
         CheckConstraint(priority >= 1, name='occurrence_schedule_priority_not_zero'),
         CheckConstraint(priority <= 10, name='occurrence_schedule_priority_less_than_ten'),
         CheckConstraint(
@@ -400,6 +443,8 @@ class Occurrence(Base):
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     task_id: Mapped[int] = mapped_column(ForeignKey('task.id'))
+    #  copy of task.user_id, see Data.user_id
+    user_id: Mapped[int | None] = mapped_column(ForeignKey('user.id'), nullable=True)
     note_id: Mapped[int | None] = mapped_column(ForeignKey('note.id'), nullable=True)
     completed: Mapped[bool] = mapped_column(Boolean, default=False)
     time: Mapped[int] = mapped_column(BigInteger, default=get_utc_timestamp)
@@ -411,7 +456,11 @@ class Occurrence(Base):
 
     __table_args__ = (
         CheckConstraint(priority >= 1, name='priority_not_zero'),
-        CheckConstraint(priority <= 10, name='priority_less_than_ten')
+        CheckConstraint(priority <= 10, name='priority_less_than_ten'),
+        Index('idx_occurrence_user_time', 'user_id', 'time'),
+        Index('idx_occurrence_user_priority_time', 'user_id', 'priority', 'time'),
+        Index('idx_occurrence_task_time', 'task_id', 'time'),
+        Index('idx_occurrence_time', 'time'),
     )
 
     def __repr__(self) -> str:
@@ -419,35 +468,246 @@ class Occurrence(Base):
                 f'priority={self.priority!r}, completed={self.completed!r})')
 
 
+#  an orm insert that doesn't set user_id gets it from the metric or task object it was added with. the owner is never
+#  looked up, a row with only the owner's id has to set user_id itself, like the bulk inserts do
+def owner_user_id_listener_factory(owner_attribute: str):
+    def set_user_id(_, __, target):
+        if target.user_id is not None:
+            return
+        owner = target.__dict__.get(owner_attribute)
+        if owner is None or owner.user_id is None:
+            raise ValueError(f'{type(target).__name__} needs user_id or a loaded {owner_attribute}.')
+        target.user_id = owner.user_id
+
+    return set_user_id
+
+
+event.listen(Data, 'before_insert', owner_user_id_listener_factory('metric'))
+event.listen(Occurrence, 'before_insert', owner_user_id_listener_factory('task'))
+
+
+#  where a chunked job (purge, re-embedding) stopped, so a run cut short by the timeout resumes there. retry_ids is a
+#  json list of ids the job passed but couldn't process yet
+class JobCheckpoint(Base):
+    __tablename__ = 'job_checkpoint'
+
+    name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    last_id: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    retry_ids: Mapped[str | None] = mapped_column(Text, nullable=True)
+    time: Mapped[int] = mapped_column(BigInteger, default=get_utc_timestamp)
+
+    def __repr__(self) -> str:
+        return f'JobCheckpoint(name={self.name!r}, last_id={self.last_id!r})'
+
+
+#  persistent tier of the model response cache, see backend.lib.cache
+class ModelResponse(Base):
+    __tablename__ = 'model_response'
+    __table_args__ = (
+        Index('idx_model_response_time', 'time'),
+    )
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    response: Mapped[str] = mapped_column(Text(16777215), nullable=False)
+    time: Mapped[int] = mapped_column(BigInteger, default=get_utc_timestamp)
+
+    def __repr__(self) -> str:
+        return f'ModelResponse(key={self.key!r}, time={self.time!r})'
+
+
+#  hash of the model input a pipeline last processed for a note. image notes are published once per image output
+#  and the text assembled for them is often the same, see backend.lib.func.sqs
+class NoteTextHash(Base):
+    __tablename__ = 'note_text_hash'
+
+    note_id: Mapped[int] = mapped_column(ForeignKey('note.id', ondelete='cascade'), primary_key=True)
+    pipeline: Mapped[str] = mapped_column(String(50), primary_key=True)
+    hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    time: Mapped[int] = mapped_column(BigInteger, default=get_utc_timestamp)
+
+    def __repr__(self) -> str:
+        return f'NoteTextHash(note_id={self.note_id!r}, pipeline={self.pipeline!r}, hash={self.hash!r})'
+
+
 secret_arn = os.getenv(db_secret_arn)
 db_endpoint = os.getenv(db_endpoint)
 db_name = os.getenv(db_name)
 db_test = os.getenv(db_test)
 db_port = os.getenv(db_port)
 
+db_pool_size = int(os.getenv(db_pool_size, constants.default_db_pool_size))
+db_max_overflow = int(os.getenv(db_max_overflow, constants.default_db_max_overflow))
+db_pool_recycle = int(os.getenv(db_pool_recycle, constants.default_db_pool_recycle))
+db_pool_timeout = int(os.getenv(db_pool_timeout, constants.default_db_pool_timeout))
+db_pool_pre_ping = os.getenv(db_pool_pre_ping, str(True)).lower() == str(True).lower()
+db_secret_ttl = int(os.getenv(db_secret_ttl, constants.default_db_secret_ttl))
+db_secret_refresh_ahead = int(os.getenv(db_secret_refresh_ahead, constants.default_db_secret_refresh_ahead))
+
 secrets_client = boto3.client('secretsmanager', region_name=os.getenv(aws_region))
 
 
+def secret_credentials_supplier() -> Tuple[str, str]:
+    if db_test:
+        return os.getenv(db_user), os.getenv(db_pass)
+
+    secret_response = secrets_client.get_secret_value(SecretId=secret_arn)
+    secret_dict = json.loads(secret_response['SecretString'])
+    return secret_dict['username'], secret_dict['password']
+
+
+#  keeps the db secret in memory so only the first engine/connection of a process pays the secrets manager call.
+#  close to expiry the secret is refreshed in a background thread while the cached one keeps being served
+class CredentialProvider:
+    def __init__(self, credentials_supplier: Callable[[], Tuple[str, str]], ttl: int = db_secret_ttl,
+                 refresh_ahead: int = db_secret_refresh_ahead, clock: Callable[[], float] = time.monotonic):
+        self._credentials_supplier = credentials_supplier
+        self._ttl = ttl
+        self._refresh_ahead = min(refresh_ahead, ttl)
+        self._clock = clock
+        self._credentials = None
+        self._fetched_at = None
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+
+    def get(self) -> Tuple[str, str]:
+        if self._credentials is None or self._age() >= self._ttl:
+            return self.refresh()
+
+        if self._age() >= self._ttl - self._refresh_ahead:
+            self._refresh_in_background()
+        return self._credentials
+
+    def refresh(self) -> Tuple[str, str]:
+        with self._lock:
+            credentials = self._credentials_supplier()
+            self._credentials = credentials
+            self._fetched_at = self._clock()
+            return credentials
+
+    def invalidate(self):
+        with self._lock:
+            self._credentials = None
+            self._fetched_at = None
+
+    def _age(self) -> float:
+        return self._clock() - self._fetched_at
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refresh_thread and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self._refresh_quietly, daemon=True)
+            self._refresh_thread.start()
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception:
+            #  the cached secret is still valid for a while, next get will retry
+            traceback.print_exc()
+
+
+def is_auth_error(error: Exception) -> bool:
+    return getattr(error, 'errno', None) == constants.mysql_access_denied_error_code
+
+
+#  plugged into the engine's do_connect so every new pooled connection uses the current secret.
+#  if the password was rotated the first attempt fails with access denied, then we re-read the secret once
+def credentials_connect_factory(provider: CredentialProvider) -> Callable[[Any, Any, List[Any], Dict[str, Any]], Any]:
+    def connect(dialect, _, cargs: List[Any], cparams: Dict[str, Any]):
+        username, password = provider.get()
+        try:
+            return dialect.connect(*cargs, **(cparams | {'user': username, 'password': password}))
+        except Exception as e:
+            if not is_auth_error(e):
+                raise
+            print('Database authentication failed, refreshing credentials and retrying once.')
+            username, password = provider.refresh()
+            return dialect.connect(*cargs, **(cparams | {'user': username, 'password': password}))
+
+    return connect
+
+
+credential_provider = CredentialProvider(secret_credentials_supplier)
+
+
+class PoolConfig:
+    def __init__(self, size: int = db_pool_size, max_overflow: int = db_max_overflow,
+                 recycle: int = db_pool_recycle, pre_ping: bool = db_pool_pre_ping, timeout: int = db_pool_timeout):
+        self.size = size
+        self.max_overflow = max_overflow
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.timeout = timeout
+
+
+#  one engine (and so one pool) per warm process, every begin_session call checks out from it
+class EngineRegistry:
+    def __init__(self, engine_supplier: Callable[[], Engine]):
+        self._engine_supplier = engine_supplier
+        self._engine = None
+        self._session_makers = {}
+        self._lock = threading.Lock()
+
+    def get(self) -> Engine:
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._engine = self._engine_supplier()
+        return self._engine
+
+    def session_maker(self, auto_flush: bool = True) -> sessionmaker:
+        maker = self._session_makers.get(auto_flush)
+        if maker is None:
+            maker = sessionmaker(bind=self.get(), autoflush=auto_flush)
+            self._session_makers[auto_flush] = maker
+        return maker
+
+    def dispose(self):
+        with self._lock:
+            if self._engine is not None:
+                self._engine.dispose()
+            self._engine = None
+            self._session_makers = {}
+
+    def stats(self) -> Dict[str, int]:
+        if self._engine is None:
+            return {}
+        pool = self._engine.pool
+        if not isinstance(pool, QueuePool):
+            return {}
+        return {
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': max(pool.overflow(), 0),
+        }
+
+
 def begin_session(auto_flush=True):
-    engine = setup_engine()
+    return engine_registry.session_maker(auto_flush)()
+
 
-    return sessionmaker(bind=engine, autoflush=auto_flush)()
+def pool_stats() -> Dict[str, int]:
+    return engine_registry.stats()
 
 
-def setup_engine(fix_auth=False):
-    if not db_test:
-        secret_response = secrets_client.get_secret_value(SecretId=secret_arn)
-        secret_dict = json.loads(secret_response['SecretString'])
+def setup_engine(fix_auth=False, pool_config: PoolConfig = None):
+    if not pool_config:
+        pool_config = PoolConfig()
 
-        username = secret_dict['username']
-        password = secret_dict['password']
-    else:
-        username = os.getenv(db_user)
-        password = os.getenv(db_pass)
+    username, password = credential_provider.get()
     connection_string = (
         f'mysql+mysqlconnector://{username}:{password}@{db_endpoint}:{db_port}/{db_name}'
     )
-    engine = create_engine(connection_string, pool_recycle=300, echo=db_test is not None)
+    engine = create_engine(connection_string,
+                           pool_size=pool_config.size,
+                           max_overflow=pool_config.max_overflow,
+                           pool_recycle=pool_config.recycle,
+                           pool_pre_ping=pool_config.pre_ping,
+                           pool_timeout=pool_config.timeout,
+                           echo=db_test is not None)
+    event.listen(engine, 'do_connect', credentials_connect_factory(credential_provider))
     if fix_auth and not db_test:
         sql_command = text(f"ALTER USER '{username}'@'%' IDENTIFIED WITH mysql_native_password BY '{password}';")
         with engine.connect() as connection:
@@ -455,3 +715,6 @@ def setup_engine(fix_auth=False):
             connection.execute(text('FLUSH PRIVILEGES;'))
             connection.commit()
     return engine
+
+
+engine_registry = EngineRegistry(setup_engine)
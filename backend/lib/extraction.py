@@ -0,0 +1,130 @@
+from typing import List, Dict, Any
+
+from sqlalchemy import select, and_, inspect
+from sqlalchemy.orm import Session
+
+from shared import constants
+from backend.lib.db import Metric, Data, Note, Link, Task, Occurrence, normalize_identifier
+from backend.lib.util import get_or_create_metrics, get_or_create_tasks
+
+#  schemas and persistence shared by text/metric, text/link, text/task and text/combined.
+#  save_* only add to the session, committing and notifying tagging is up to the caller
+
+metrics_schema = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "name": {
+                "type": "string",
+                "description": f"Human readable name of the metric (e.g., Distance run, Heart rate). Make sure it only contains nouns and adjectives. Max length: {inspect(Metric).c.name.type.length} characters."
+            },
+            "value": {
+                "type": "number",
+                "description": "The numeric value extracted."
+            },
+            "units": {
+                "type": "string",
+                "description": f"The unit of measurement (e.g., miles, kcal, bpm). If no units are mentioned, use a standard unit or 'items'. Max length: {inspect(Data).c.units.type.length} characters."
+            }
+        },
+        "required": ["name", "value", "units"]
+    }
+}
+
+link_schema = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "url": {
+                "type": "string",
+                "description": f"The full URL as it appears in the text. Max length: {inspect(Link).c.url.type.length} characters."
+            },
+            "summary": {
+                "type": "string",
+                "description": f"A brief summary of the link's description. Max length: {inspect(Link).c.display_summary.type.length} characters."
+            },
+            "description": {
+                "type": "string",
+                "description": f"A concise description of the link's content based on the surrounding text. Max length: {inspect(Link).c.description.type.length} characters."
+            },
+        },
+        "required": ["url", "description", "summary"]
+    }
+}
+
+task_schema = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "summary": {
+                "type": "string",
+                "description": f"A short and unique summary of the task. Max length: {inspect(Task).c.display_summary.type.length} characters."
+            },
+            "description": {
+                "type": "string",
+                "description": f"The full text of the task to be completed. Max length: {inspect(Task).c.description.type.length} characters."
+            },
+            "priority": {
+                "type": "integer",
+                "description": "An estimated priority from 1 (lowest) to 10 (highest). Default to 5 if not specified.",
+                "minimum": 1,
+                "maximum": 10
+            }
+        },
+        "required": ["description", "priority", "summary"]
+    }
+}
+
+
+def save_metrics(session: Session, note: Note, data: List[Dict[str, Any]]) -> bool:
+    if not data:
+        return False
+    metrics_map = get_or_create_metrics(session, {normalize_identifier(item[constants.name]): item[constants.name] for
+                                                  item in data if constants.name in item}, note.user_id)
+    data_to_add = [
+        Data(value=d.get(constants.value), units=d.get(constants.units),
+             metric=metrics_map[normalize_identifier(d.get(constants.name))],
+             note=note, user_id=note.user_id)
+        for d in data if constants.name in d]
+
+    if data_to_add:
+        session.add_all(data_to_add)
+    return len(data_to_add) > 0
+
+
+def save_links(session: Session, note: Note, data: List[Dict[str, Any]]) -> bool:
+    if not data:
+        return False
+    existing = [l.url for l in session.scalars(
+        select(Link).where(and_(Link.url.in_([d[constants.url] for d in data]), Link.user_id == note.user_id))).unique()]
+
+    new_ones = [Link(url=l[constants.url],
+                     user=note.user,
+                     note=note,
+                     summary=normalize_identifier(l[constants.summary]),
+                     display_summary=l[constants.summary],
+                     description=l[constants.description]) for l in data if l[constants.url] not in existing]
+    if new_ones:
+        session.add_all(new_ones)
+    return len(new_ones) > 0
+
+
+def save_tasks(session: Session, note: Note, data: List[Dict[str, Any]]) -> bool:
+    if not data:
+        return False
+    tasks_map = get_or_create_tasks(session, {
+        normalize_identifier(item[constants.summary]): {constants.summary: item[constants.summary],
+                                                        constants.description: item[constants.description]} for item in
+        data}, note.user_id)
+    occurrence_to_add = [
+        Occurrence(priority=d.get(constants.priority),
+                   task=tasks_map[normalize_identifier(d.get(constants.summary))],
+                   note=note, user_id=note.user_id)
+        for d in data if constants.summary in d]
+
+    if occurrence_to_add:
+        session.add_all(occurrence_to_add)
+    return len(occurrence_to_add) > 0
@@ -1,16 +1,44 @@
+import base64
 import json
+import operator
 import traceback
-from typing import Callable, Dict, Any, List, Set, Tuple
+from decimal import Decimal
+from typing import Callable, Dict, Any, List, Set, Tuple, Sequence, Iterable
 
+from sqlalchemy import Select, Table, select, and_, or_
 from sqlalchemy.orm import Session
 
 from shared import constants
-from backend.lib.db import begin_session, get_utc_timestamp
+from backend.lib.db import begin_session, get_utc_timestamp, Tag
 from backend.lib.util import get_user_ids_from_event
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 seconds_in_day = 24 * 60 * 60
 
 
+#  numeric columns come back as Decimal, the serializer writes them as numbers so handlers don't convert per row
+def encode_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'Type {type(value).__name__} is not JSON serializable')
+
+
+#  orjson when it's installed, stdlib json otherwise. both take the same input and give the same parsed output
+def serialize(value: Any) -> str:
+    if orjson:
+        return orjson.dumps(value, default=encode_default, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(value, default=encode_default)
+
+
+#  raised by request parsing helpers, handler_factory answers it with a 400 and the message as the error
+class BadRequest(ValueError):
+    pass
+
+
 class User:
     def __init__(self, id: int, external_id: str):
         self.id = id
@@ -71,8 +99,8 @@ def post_factory(entity_supplier: Callable[[RequestContext, Session], Any]) -> C
 
 
 def handler_factory(per_method_handlers: Dict[
-    str, Callable[[Session, RequestContext], Tuple[Dict[str, Any] | List[Dict[str, Any]], int]]]) -> Callable[
-    [Dict[str, Any], Any], Any]:
+    str, Callable[[Session, RequestContext], Tuple[Dict[str, Any] | List[Dict[str, Any]], int]]],
+                    serializer: Callable[[Any], str] = serialize) -> Callable[[Dict[str, Any], Any], Any]:
     def handler(event: Dict[str, Any], _: Any) -> Dict[str, Any]:
         session = begin_session()
 
@@ -87,16 +115,21 @@ def handler_factory(per_method_handlers: Dict[
                         'headers': constants.cors_headers, }
 
             #  move user id to context todo
-            result, status_code = per_method_handlers[http_method](session,
+            #  handlers return (result, status code) or (result, status code, extra headers)
+            result, status_code, *headers = per_method_handlers[http_method](session,
                                                                    RequestContext(body, query_params, path_params, User(
                                                                        *get_user_ids_from_event(event, session))))
 
             return {
                 'statusCode': status_code,
-                'headers': {'Content-Type': 'application/json'} |  constants.cors_headers,
-                'body': json.dumps(result)
+                'headers': {'Content-Type': 'application/json'} |  constants.cors_headers | (headers[0] if headers else {}),
+                'body': serializer(result)
             }
 
+        except BadRequest as e:
+            session.rollback()
+            return {'statusCode': 400, 'body': json.dumps({'error': str(e)}), 'headers': constants.cors_headers, }
+
         except Exception:
             if session:
                 session.rollback()
@@ -112,11 +145,148 @@ def handler_factory(per_method_handlers: Dict[
 
 
 def get_offset_and_limit(query_params, default_offset=0, default_limit=100) -> Tuple[int, int]:
-    offset = max(query_params.get(constants.offset, default_offset), default_offset)
-    limit = max(min(query_params.get(constants.limit, default_limit),  default_limit), 0)
+    offset = max(int(query_params.get(constants.offset, default_offset)), default_offset)
+    limit = max(min(int(query_params.get(constants.limit, default_limit)),  default_limit), 0)
     return offset, limit
 
 
+#  keyset pagination. columns are the sort order and the last one has to be unique (the id), a cursor holds their
+#  values for the last row of a page and the next page starts right after it, so it costs the same as the first.
+#  without a cursor offset still works. the sort columns are added to the select for next_cursor_headers
+def paginate(query: Select, query_params: Dict[str, Any], columns: Sequence[Any], descending: bool = False) -> Tuple[
+    Select, int]:
+    offset, limit = get_offset_and_limit(query_params)
+    cursor = query_params.get(constants.cursor)
+    if cursor:
+        try:
+            values = decode_cursor(cursor, len(columns))
+        except ValueError:
+            raise BadRequest(constants.invalid_cursor)
+        query = query.where(keyset_condition(columns, values, descending))
+    else:
+        query = query.offset(offset)
+    query = query.add_columns(*[column.label(cursor_label(index)) for index, column in enumerate(columns)])
+    return query.order_by(*[column.desc() if descending else column.asc() for column in columns]).limit(limit), limit
+
+
+#  (a, b, id) < (x, y, z) spelled out, mysql doesn't range scan an index for row constructor comparisons
+def keyset_condition(columns: Sequence[Any], values: Sequence[Any], descending: bool):
+    compare = operator.lt if descending else operator.gt
+    condition = compare(columns[-1], values[-1])
+    for column, value in zip(reversed(columns[:-1]), reversed(values[:-1])):
+        condition = or_(compare(column, value), and_(column == value, condition))
+    return condition
+
+
+def next_cursor_headers(rows: Sequence[Any], columns: Sequence[Any], limit: int) -> Dict[str, str]:
+    if not rows or len(rows) < limit:
+        return {}
+    last = rows[-1]._mapping
+    return {constants.next_cursor_header: encode_cursor([last[cursor_label(index)] for index in range(len(columns))])}
+
+
+def cursor_label(index: int) -> str:
+    return f'{constants.cursor}_{index}'
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(values), separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Invalid cursor.')
+    return values
+
+
+#  listings select labelled columns, {response key: column}, and turn rows straight into response dicts.
+#  no entities are built and nothing goes through the identity map
+def select_fields(fields: Dict[str, Any]) -> Select:
+    return select(*[column.label(key) for key, column in fields.items()])
+
+
+def to_dict(row: Any, keys: Iterable[str]) -> Dict[str, Any]:
+    mapping = row._mapping
+    return {key: mapping[key] for key in keys}
+
+
+#  sparse fieldsets: fields=id|time|metric.name returns only those keys, a nested object by name returns all of it.
+#  no fields param means everything. handlers narrow their column maps with project so the select shrinks too
+def get_requested_fields(query_params: Dict[str, Any]) -> Set[str] | None:
+    fields = query_params.get(constants.fields, constants.empty)
+    requested = {field.strip() for field in fields.split(constants.params_delim) if field.strip()}
+    return requested or None
+
+
+def wants(requested: Set[str] | None, path: str) -> bool:
+    if requested is None:
+        return True
+    return any(path == field or path.startswith(field + constants.field_path_delim)
+               or field.startswith(path + constants.field_path_delim) for field in requested)
+
+
+def project(fields: Dict[str, Any], requested: Set[str] | None, parent: str | None = None) -> Dict[str, Any]:
+    return {key: column for key, column in fields.items() if wants(requested, field_path(parent, key))}
+
+
+def field_path(*keys: str | None) -> str:
+    return constants.field_path_delim.join(key for key in keys if key)
+
+
+#  related rows for a page in one IN query, {owner id: response dict}
+def fields_by_id(session: Session, fields: Dict[str, Any], id_column: Any, ids: Set[int]) -> Dict[int, Dict[str, Any]]:
+    if not ids:
+        return {}
+    query = select_fields(fields).add_columns(id_column.label(constants.owner_id)).where(id_column.in_(ids))
+    return {row._mapping[constants.owner_id]: to_dict(row, fields) for row in session.execute(query)}
+
+
+def tags_by_id(session: Session, association: Table, owner_id_column: str, ids: Set[int]) -> Dict[int, List[str]]:
+    tags = {}
+    if ids:
+        owner_id = association.c[owner_id_column]
+        query = (select(owner_id, Tag.display_name).join(Tag, Tag.id == association.c[constants.tag_id])
+                 .where(owner_id.in_(ids)))
+        for id, display_name in session.execute(query):
+            tags.setdefault(id, []).append(display_name)
+    return tags
+
+
+#  how a metric or task is embedded in data and occurrence listings: the key it's under, its columns and id column,
+#  its tag association and its schedule's columns and owner id column
+class OwnerSpec:
+    def __init__(self, key: str, fields: Dict[str, Any], id: Any, association: Table, association_column: str,
+                 schedule_fields: Dict[str, Any], schedule_owner_id: Any):
+        self.key = key
+        self.fields = fields
+        self.id = id
+        self.association = association
+        self.association_column = association_column
+        self.schedule_fields = schedule_fields
+        self.schedule_owner_id = schedule_owner_id
+
+
+#  the owners of a page with their tags and schedule, for the distinct owner ids and narrowed to what was requested
+def owners_by_id(session: Session, spec: OwnerSpec, requested: Set[str] | None, ids: Set[int]) -> Dict[
+    int, Dict[str, Any]]:
+    owners = fields_by_id(session, project(spec.fields, requested, spec.key), spec.id, ids)
+
+    if wants(requested, field_path(spec.key, constants.tags)):
+        tags = tags_by_id(session, spec.association, spec.association_column, ids)
+        for id, owner in owners.items():
+            owner[constants.tags] = tags.get(id, [])
+
+    schedule_path = field_path(spec.key, constants.schedule)
+    if wants(requested, schedule_path):
+        schedules = fields_by_id(session, project(spec.schedule_fields, requested, schedule_path),
+                                 spec.schedule_owner_id, ids)
+        for id, owner in owners.items():
+            owner[constants.schedule] = schedules.get(id, {})
+
+    return owners
+
+
 def get_ts_start_and_end(query_params) -> Tuple[int, int]:
     start_param = query_params.get(constants.start)
     end_param = query_params.get(constants.end)
@@ -0,0 +1,81 @@
+import json
+import os
+import time
+from typing import Any, Callable, Optional
+
+from sqlalchemy import select, delete, Select
+
+from shared import constants
+from backend.lib.db import begin_session, get_utc_timestamp, JobCheckpoint
+from shared.variables import purge_batch_size, purge_sleep_seconds, purge_retention_days
+
+purge_batch_size = int(os.getenv(purge_batch_size, constants.default_purge_batch_size))
+purge_sleep_seconds = float(os.getenv(purge_sleep_seconds, constants.default_purge_sleep_seconds))
+purge_retention_days = int(os.getenv(purge_retention_days, constants.default_purge_retention_days))
+
+seconds_in_day = 24 * 60 * 60
+
+
+#  walks the table by primary key ranges of batch_size rows. each range is one short transaction that deletes what
+#  deletable_ids_supplier(after id, up to id or None for the tail, now) selects in it, and records the range end
+#  in the checkpoint. a run stopped by the timeout resumes from the checkpoint, a finished one starts over next time
+def handler_factory(name: str, entity: Any, deletable_ids_supplier: Callable[[int, Optional[int], int], Select],
+                    batch_size: int = purge_batch_size, sleep_seconds: float = purge_sleep_seconds,
+                    clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+    def handler(_, context):
+        started = clock()
+        deleted = 0
+        finished = False
+        now = get_utc_timestamp()
+
+        session = begin_session()
+        try:
+            checkpoint = session.get(JobCheckpoint, name)
+            if not checkpoint:
+                checkpoint = JobCheckpoint(name=name, last_id=0)
+                session.add(checkpoint)
+            print(f'Purging {name} from id {checkpoint.last_id}')
+
+            while True:
+                if context and context.get_remaining_time_in_millis() < constants.scheduled_time_reserve_millis:
+                    print(f'Stopping at id {checkpoint.last_id}, the next run resumes from there')
+                    break
+
+                range_end = session.scalar(select(entity.id).where(entity.id > checkpoint.last_id)
+                                           .order_by(entity.id).offset(batch_size - 1).limit(1))
+                ids = session.scalars(deletable_ids_supplier(checkpoint.last_id, range_end, now)).all()
+                if ids:
+                    deleted += session.execute(delete(entity).where(entity.id.in_(ids))
+                                               .execution_options(synchronize_session=False)).rowcount
+
+                finished = range_end is None
+                checkpoint.last_id = 0 if finished else range_end
+                checkpoint.time = now
+                session.commit()
+
+                if finished:
+                    break
+                sleep(sleep_seconds)
+
+            elapsed = clock() - started
+            rows_per_second = deleted / elapsed if elapsed > 0 else float(deleted)
+            print(f'Deleted {deleted} {name} rows in {elapsed:.1f}s ({rows_per_second:.0f} rows/s), finished: {finished}')
+
+            return {
+                constants.status_code: 200,
+                constants.body: json.dumps({constants.deleted: deleted,
+                                            constants.rows_per_second: round(rows_per_second, 1),
+                                            constants.finished: finished})
+            }
+
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    return handler
+
+
+def id_range_condition(id_column: Any, after_id: int, up_to_id: Optional[int]):
+    return (id_column > after_id) if up_to_id is None else id_column.between(after_id + 1, up_to_id)
@@ -0,0 +1,51 @@
+import os
+from typing import Any, Callable, List, Dict
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from shared import constants
+from backend.lib.db import begin_session, get_utc_timestamp
+from shared.variables import recurrent_chunk_size
+
+recurrent_chunk_size = int(os.getenv(recurrent_chunk_size, constants.default_recurrent_chunk_size))
+
+
+#  due schedules are claimed chunk by chunk with skip locked so overlapping invocations split the work instead of
+#  generating twice. on_claimed adds the rows for a chunk and returns {schedule id: next run},
+#  the schedules are advanced and the chunk committed together
+def handler_factory(schedule_entity: Any, on_claimed: Callable[[Session, List[Any], int], Dict[int, int]],
+                    chunk_size: int = recurrent_chunk_size):
+    def handler(_, context):
+        claimed = 0
+        while True:
+            if context and context.get_remaining_time_in_millis() < constants.scheduled_time_reserve_millis:
+                print(f'Stopping after {claimed} schedules, the rest will be picked up by the next run')
+                break
+
+            session = begin_session()
+            try:
+                now = get_utc_timestamp()
+                schedules = session.scalars(
+                    select(schedule_entity).where(schedule_entity.next_run <= now)
+                    .order_by(schedule_entity.next_run, schedule_entity.id)
+                    .limit(chunk_size)
+                    .with_for_update(skip_locked=True)).all()
+                if not schedules:
+                    break
+
+                next_runs = on_claimed(session, schedules, now)
+                session.execute(update(schedule_entity), [{constants.id: schedule_id, constants.next_run: next_run}
+                                                          for schedule_id, next_run in next_runs.items()])
+                session.commit()
+                claimed += len(schedules)
+
+                if len(schedules) < chunk_size:
+                    break
+            except Exception:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+
+    return handler
@@ -1,15 +1,17 @@
 import json
 import os
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from typing import Any, Dict, Callable, List, Optional
+from typing import Any, Dict, Callable, List, Optional, Tuple
 
 import boto3
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 
 from shared import constants
-from backend.lib.db import begin_session, Note, Origin
+from backend.lib.cache import cache_key, get_model_response_cache
+from backend.lib.db import begin_session, Note, Origin, NoteTextHash, get_utc_timestamp
 from backend.lib.util import call_generative, call_embedding
 from shared.variables import *
 
@@ -18,13 +20,37 @@ tagging_topic_arn = os.getenv(tagging_topic_arn)
 
 text_extraction_model = os.getenv(generative_model)
 max_tokens = os.getenv(max_tokens)
+sqs_max_workers = int(os.getenv(sqs_max_workers, constants.default_sqs_max_workers))
+bedrock_max_concurrency = int(os.getenv(bedrock_max_concurrency, constants.default_bedrock_max_concurrency))
 
 
-#  this and the rest of it which uses this needs to be refactored todo
-def handler_factory(process_record: Callable[[Dict[str, Any]], None]):
-    def handler(event, _):
-        for record in event[constants.records]:
+#  records are processed concurrently, each one in its own session checked out from the shared engine pool
+#  (sessions are not thread safe). failed records are reported back so sqs only redelivers those
+def handler_factory(process_record: Callable[[Dict[str, Any]], None], max_workers: int = sqs_max_workers):
+    def handler(event, _) -> Dict[str, List[Dict[str, str]]]:
+        records = event[constants.records]
+        failures = []
+
+        if max_workers <= 1 or len(records) <= 1:
+            for record in records:
+                if not run_record(record):
+                    failures.append(record)
+        else:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(records))) as executor:
+                failures = [record for record, succeeded in zip(records, executor.map(run_record, records)) if
+                            not succeeded]
+
+        return {constants.batch_item_failures: [{constants.item_identifier: record[constants.message_id]} for record in
+                                                failures]}
+
+    def run_record(record: Dict[str, Any]) -> bool:
+        try:
             process_record(record)
+            return True
+        except Exception:
+            #  process_record already printed the trace
+            print(f'Failed to process record {record.get(constants.message_id)}.')
+            return False
 
     return handler
 
@@ -41,11 +67,44 @@ class Model:
 class Params:
 
     def __init__(self, prompt: str, text_supplier: Callable[[Session, int, str], str], model: Model,
-                 max_tokens: int = None):
+                 max_tokens: int = None, pipeline: str = None):
         self.prompt = prompt
         self.text_supplier = text_supplier
         self.model = model
         self.max_tokens = max_tokens
+        #  with a pipeline name a note is skipped when the model input is the same as last time, see record_text
+        self.pipeline = pipeline
+
+
+def parse_record(record: Dict[str, Any]) -> Tuple[Optional[int], Optional[str]]:
+    sns_notification = json.loads(record[constants.body])
+    payload = json.loads(sns_notification[constants.message])
+    return payload.get(constants.note_id), payload.get(constants.origin)
+
+
+def text_hash(params: Params, text: str) -> str:
+    return cache_key(params.model.name, params.prompt, text, params.max_tokens)
+
+
+#  true when the pipeline already processed this exact model input for the note. image notes are published once per
+#  image output with the same text assembled from both, and the note post may have published it already
+def is_text_processed(session: Session, note_id: int, params: Params, hash: str) -> bool:
+    return session.scalar(select(NoteTextHash.hash).where(NoteTextHash.note_id == note_id,
+                                                          NoteTextHash.pipeline == params.pipeline)) == hash
+
+
+#  added to the session that writes the results, so the hash is only stored together with them. a worker that dies
+#  halfway leaves nothing behind and the redelivered record is processed again
+def record_text(session: Session, note_id: int, params: Params, hash: str):
+    session.merge(NoteTextHash(note_id=note_id, pipeline=params.pipeline, hash=hash, time=get_utc_timestamp()))
+
+
+def invoke_model(params: Params, text: str) -> Dict[str, Any] | List[Dict[str, Any] | float] | None:
+    if params.model.type == BedrockModelType.generative:
+        return call_generative(params.model.name, params.prompt, text, max_tokens=params.max_tokens)
+    elif params.model.type == BedrockModelType.embedding:
+        return call_embedding(params.model.name, text)
+    return None
 
 
 def process_record_factory(params: Params, on_response_from_model: Callable[
@@ -54,10 +113,7 @@ def process_record_factory(params: Params, on_response_from_model: Callable[
     def process_record(record: Dict[str, Any]):
         session = begin_session()
         try:
-            sns_notification = json.loads(record[constants.body])
-            payload = json.loads(sns_notification[constants.message])
-            note_id = payload.get(constants.note_id)
-            origin = payload.get(constants.origin)
+            note_id, origin = parse_record(record)
 
             if not note_id:
                 print('Skipping record: note_id not found in payload.')
@@ -68,19 +124,24 @@ def process_record_factory(params: Params, on_response_from_model: Callable[
             if not text:
                 print(f'Skipping record: text not found in payload {note_id}.')
                 return
-            data = None
 
-            if params.model.type == BedrockModelType.generative:
-                data = call_generative(params.model.name, params.prompt, text,
-                                       max_tokens=params.max_tokens)
-            elif params.model.type == BedrockModelType.embedding:
-                data = call_embedding(params.model.name, text)
+            hash = text_hash(params, text) if params.pipeline else None
+            if hash and is_text_processed(session, note_id, params, hash):
+                print(f'Skipping record: text of note {note_id} is unchanged since it was processed.')
+                return
+
+            data = invoke_model(params, text)
+
+            if hash:
+                record_text(session, note_id, params, hash)
 
             if not data:
                 print(f'No numeric metrics extracted by Bedrock for Note ID {note_id}.')
+                session.commit()
                 return
 
             on_response_from_model(session, note_id, data)
+            session.commit()
         except Exception:
             session.rollback()
             traceback.print_exc()
@@ -90,6 +151,119 @@ def process_record_factory(params: Params, on_response_from_model: Callable[
 
     return process_record
 
+
+#  alternative to handler_factory(process_record_factory(...)) for workers which mostly wait on bedrock.
+#  texts for the whole batch are read first, then the model is called for all of them concurrently (capped and
+#  rate limited per model) and only then the responses are written one by one in a single session.
+#  with on_responses_from_model the responses are written in one call instead, it gets [(note id, data)] and
+#  returns the note ids it failed to write
+def batch_handler_factory(params: Params, on_response_from_model: Callable[
+    [Session, int, Dict[str, Any] | List[Dict[str, Any] | float]], None] = None,
+                          max_concurrency: int = bedrock_max_concurrency,
+                          on_responses_from_model: Callable[
+                              [Session, List[Tuple[int, Dict[str, Any] | List[Dict[str, Any] | float]]]], List[
+                                  int]] = None) -> Callable[
+    [Dict[str, Any], Any], Dict[str, List[Dict[str, str]]]]:
+    def handler(event, _) -> Dict[str, List[Dict[str, str]]]:
+        records = event[constants.records]
+        failures = []
+        pending = []
+        seen = set()
+
+        session = begin_session()
+        try:
+            for record in records:
+                try:
+                    note_id, origin = parse_record(record)
+                    if not note_id:
+                        print('Skipping record: note_id not found in payload.')
+                        continue
+
+                    text = params.text_supplier(session, note_id, origin)
+                    if not text:
+                        print(f'Skipping record: text not found in payload {note_id}.')
+                        continue
+                    hash = text_hash(params, text) if params.pipeline else None
+                    if hash and ((note_id, hash) in seen or is_text_processed(session, note_id, params, hash)):
+                        print(f'Skipping record: text of note {note_id} is unchanged since it was processed.')
+                        continue
+                    seen.add((note_id, hash))
+                    pending.append((record, note_id, text, hash))
+                except Exception:
+                    session.rollback()
+                    traceback.print_exc()
+                    failures.append(record)
+        finally:
+            session.close()
+
+        responses = []
+        if pending:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(pending)))) as executor:
+                futures = [(record, note_id, hash, executor.submit(invoke_model, params, text)) for
+                           record, note_id, text, hash in pending]
+                for record, note_id, hash, future in futures:
+                    try:
+                        responses.append((record, note_id, hash, future.result()))
+                    except Exception:
+                        traceback.print_exc()
+                        failures.append(record)
+
+        extracted = []
+        empty = []
+        for record, note_id, hash, data in responses:
+            if not data:
+                print(f'No data extracted by Bedrock for Note ID {note_id}.')
+                empty.append((record, note_id, hash))
+                continue
+            extracted.append((record, note_id, hash, data))
+
+        #  hashes are stored in the session that writes the results and only for what was written
+        session = begin_session()
+        try:
+            written = []
+            if on_responses_from_model and extracted:
+                try:
+                    failed = set(on_responses_from_model(session, [(note_id, data) for _, note_id, _, data in
+                                                                   extracted]))
+                    failures.extend(record for record, note_id, _, _ in extracted if note_id in failed)
+                    written.extend((note_id, hash) for _, note_id, hash, _ in extracted if note_id not in failed)
+                except Exception:
+                    session.rollback()
+                    traceback.print_exc()
+                    failures.extend(record for record, _, _, _ in extracted)
+            elif on_response_from_model:
+                for record, note_id, hash, data in extracted:
+                    try:
+                        if hash:
+                            record_text(session, note_id, params, hash)
+                        on_response_from_model(session, note_id, data)
+                        session.commit()
+                    except Exception:
+                        session.rollback()
+                        traceback.print_exc()
+                        failures.append(record)
+
+            written.extend((note_id, hash) for _, note_id, hash in empty)
+            for note_id, hash in written:
+                if hash:
+                    record_text(session, note_id, params, hash)
+            session.commit()
+        except Exception:
+            session.rollback()
+            traceback.print_exc()
+        finally:
+            session.close()
+
+        cache = get_model_response_cache()
+        if cache:
+            print(f'Model response cache: {cache.stats()}')
+
+        return {constants.batch_item_failures: [{constants.item_identifier: record[constants.message_id]} for record in
+                                                failures]}
+
+    return handler
+
+
 #  refactor and test todo
 def note_text_supplier(session: Session, note_id: int, origin: str) -> Optional[str]:
     note_query = select(Note).where(Note.id == note_id)
@@ -0,0 +1,173 @@
+import os
+import threading
+from typing import List, Tuple, Dict, Optional
+
+import boto3
+from opensearchpy import OpenSearch, RequestsHttpConnection
+from requests_aws4auth import AWS4Auth
+
+from shared import constants
+from shared.variables import opensearch_endpoint, opensearch_port, aws_region, opensearch_index_refresh_interval, \
+    opensearch_index_engine, opensearch_index_ef_construction, opensearch_index_m, embedding_index_version
+
+opensearch_index_refresh_interval = os.getenv(opensearch_index_refresh_interval,
+                                              constants.default_opensearch_index_refresh_interval)
+opensearch_index_engine = os.getenv(opensearch_index_engine, constants.default_opensearch_index_engine)
+opensearch_index_ef_construction = int(os.getenv(opensearch_index_ef_construction,
+                                                 constants.default_opensearch_index_ef_construction))
+opensearch_index_m = int(os.getenv(opensearch_index_m, constants.default_opensearch_index_m))
+embedding_index_version = os.getenv(embedding_index_version, constants.default_embedding_index_version)
+
+opensearch_client = None
+opensearch_client_lock = threading.Lock()
+
+
+def get_opensearch_client() -> OpenSearch:
+    global opensearch_client
+    if opensearch_client is None:
+        with opensearch_client_lock:
+            if opensearch_client is None:
+                credentials = boto3.Session().get_credentials()
+                aws_auth = AWS4Auth(credentials.access_key, credentials.secret_key, os.getenv(aws_region),
+                                    constants.es, session_token=credentials.token)
+                opensearch_client = OpenSearch(
+                    hosts=[{constants.host: os.getenv(opensearch_endpoint),
+                            constants.port: int(os.getenv(opensearch_port, 443))}],
+                    http_auth=aws_auth,
+                    use_ssl=True,
+                    verify_certs=True,
+                    connection_class=RequestsHttpConnection
+                )
+    return opensearch_client
+
+
+def index_body(dimension: int, refresh_interval: str = opensearch_index_refresh_interval) -> Dict:
+    return {
+        constants.settings: {constants.index: {constants.knn: True, constants.refresh_interval: refresh_interval}},
+
+        constants.mappings: {
+            constants.properties: {
+                constants.vector_field: {
+                    constants.type: constants.knn_vector,
+                    constants.dimension: dimension,
+                    constants.method: {
+                        constants.name: constants.hnsw,
+                        constants.space_type: constants.cosinesimil,
+                        constants.engine: opensearch_index_engine,
+                        constants.parameters: {
+                            constants.ef_construction: opensearch_index_ef_construction,
+                            constants.hnsw_m: opensearch_index_m,
+                        }
+                    }
+                },
+                constants.note_id: {constants.type: constants.integer},
+                constants.user_id: {constants.type: constants.integer},
+
+            }
+        }
+    }
+
+
+#  readers and writers go through the configured index name, which is an alias over <name>_v<version>. changing the
+#  embedding model or dimension means bumping the version, the re-embedding job fills the new index and swaps the alias
+def versioned_index(alias: str, version: str = embedding_index_version) -> str:
+    return f'{alias}_v{version}'
+
+
+#  indices the alias points to, or the name itself for an index created before aliases were used
+def alias_targets(client: OpenSearch, alias: str) -> List[str]:
+    if client.indices.exists_alias(name=alias):
+        return list(client.indices.get_alias(name=alias))
+    if client.indices.exists(index=alias):
+        return [alias]
+    return []
+
+
+#  the index the re-embedding job is filling for the alias, none when there's no migration going on
+def migration_target(client: OpenSearch, alias: str, version: str = embedding_index_version) -> Optional[str]:
+    target = versioned_index(alias, version)
+    if target in alias_targets(client, alias) or not client.indices.exists(index=target):
+        return None
+    return target
+
+
+#  one update_aliases call, so searches see either the old index or the new one. the old indices are dropped with it
+def swap_alias(client: OpenSearch, alias: str, index: str):
+    actions = [{constants.add: {constants.index: index, constants.alias: alias}}]
+    actions.extend({constants.remove_index: {constants.index: old}} for old in alias_targets(client, alias) if
+                   old != index)
+    client.indices.update_aliases(body={constants.actions: actions})
+
+
+#  an index created before aliases were used holds the configured version's vectors: it's cloned to <name>_v<version>
+#  (segments are hard linked, nothing is re-embedded) and swap_alias drops it as the alias takes its name. writes to it
+#  are blocked while it's cloned, the embedding worker's sqs retries cover that
+def adopt_legacy_index(client: OpenSearch, alias: str, version: str = embedding_index_version) -> str:
+    index = versioned_index(alias, version)
+    client.indices.put_settings(index=alias, body={constants.index: {constants.blocks_write: True}})
+    client.indices.clone(index=alias, target=index,
+                         body={constants.settings: {constants.index: {constants.blocks_write: None}}})
+    client.cluster.health(index=index, wait_for_status=constants.yellow)
+    swap_alias(client, alias, index)
+    return index
+
+
+#  exact knn over the user's own vectors: the term query narrows to the user first and knn_score ranks what's left,
+#  so other users' notes never crowd out the top k. works with whatever engine the index was created with
+def knn_query(user_id: int, vector: List[float], k: int) -> Dict:
+    return {
+        constants.size: k,
+        constants.source_field: [constants.note_id],
+        constants.query: {
+            constants.script_score: {
+                constants.query: {constants.term: {constants.user_id: user_id}},
+                constants.script: {
+                    constants.source: constants.knn_score,
+                    constants.lang: constants.knn,
+                    constants.params: {
+                        constants.field: constants.vector_field,
+                        constants.query_value: vector,
+                        constants.space_type: constants.cosinesimil,
+                    }
+                }
+            }
+        }
+    }
+
+
+#  one _bulk request for the whole batch, returns the note ids the domain rejected. refresh is left to the index's
+#  refresh_interval so a batch doesn't force a segment per call. with op_type create documents already in the index
+#  are left as they are, a conflict isn't a rejection
+def bulk_index(client: OpenSearch, index: str, documents: List[Tuple[int, int, List[float]]],
+               op_type: str = constants.index) -> List[int]:
+    if not documents:
+        return []
+    body = []
+    for user_id, note_id, vector in documents:
+        body.append({op_type: {constants.index_field: index, constants.id_field: note_id}})
+        body.append({constants.vector_field: vector, constants.note_id: note_id, constants.user_id: user_id})
+    response = client.bulk(body=body)
+    if not response.get(constants.errors):
+        return []
+    return [note_id for (_, note_id, _), item in zip(documents, response[constants.items]) if
+            item[op_type].get(constants.error) and item[op_type].get(constants.status) != constants.conflict_status]
+
+
+def knn_search(client: OpenSearch, index: str, user_id: int, vector: List[float], k: int) -> List[Tuple[int, float]]:
+    response = client.search(index=index, body=knn_query(user_id, vector, k))
+    return [(hit[constants.source_field][constants.note_id], hit[constants.score_field])
+            for hit in response[constants.hits][constants.hits]]
+
+
+#  scores from different scales brought to 0..1 before blending, a single candidate or a tie counts as a full match
+def normalize_scores(scores: Dict[int, float]) -> Dict[int, float]:
+    if not scores:
+        return {}
+    low, high = min(scores.values()), max(scores.values())
+    return {id: (score - low) / (high - low) if high > low else 1.0 for id, score in scores.items()}
+
+
+def blend_scores(knn_scores: Dict[int, float], text_scores: Dict[int, float], knn_weight: float) -> Dict[int, float]:
+    knn_scores, text_scores = normalize_scores(knn_scores), normalize_scores(text_scores)
+    return {id: knn_weight * knn_scores.get(id, 0.0) + (1 - knn_weight) * text_scores.get(id, 0.0)
+            for id in knn_scores.keys() | text_scores.keys()}
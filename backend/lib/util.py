@@ -1,19 +1,41 @@
+import copy
 import datetime
+import functools
 import json
 import os
+import threading
+import time
 import traceback
 import uuid
 from enum import Enum
 from typing import Dict, Any, List, Set, Callable, Tuple, Optional
 
 import boto3
+from botocore.config import Config
 from croniter import croniter
-from sqlalchemy import select, and_, Executable
-from sqlalchemy.orm import Session
+from sqlalchemy import select, and_, Executable, Table, insert, delete, update, tuple_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session, lazyload
 
 from shared import constants
+from backend.lib.cache import cache_key, get_model_response_cache
 from backend.lib.db import User, Tag, Metric, normalize_identifier, Task, get_utc_timestamp
-from shared.variables import aws_region, gemini_api_key
+from shared.variables import aws_region, gemini_api_key, bedrock_max_pool_connections, bedrock_max_attempts, \
+    bedrock_read_timeout, bedrock_requests_per_second, bedrock_burst, cron_cache_size
+
+bedrock_max_pool_connections = int(os.getenv(bedrock_max_pool_connections, constants.default_bedrock_max_pool_connections))
+bedrock_max_attempts = int(os.getenv(bedrock_max_attempts, constants.default_bedrock_max_attempts))
+bedrock_read_timeout = int(os.getenv(bedrock_read_timeout, constants.default_bedrock_read_timeout))
+
+bedrock_requests_per_second = float(os.getenv(bedrock_requests_per_second, constants.default_bedrock_requests_per_second))
+bedrock_burst = float(os.getenv(bedrock_burst, constants.default_bedrock_burst))
+
+cron_cache_size = int(os.getenv(cron_cache_size, constants.default_cron_cache_size))
+
+bedrock_client = None
+bedrock_client_lock = threading.Lock()
+rate_limiters = {}
+rate_limiters_lock = threading.Lock()
 
 
 class HttpMethod(Enum):
@@ -42,38 +64,36 @@ def get_or_create_task(session: Session, display_summary: str, description: str,
 
 def get_or_create_tasks(session: Session, names_to_display_names: Dict[str, Dict[str, str]], user_id: int) -> Dict[
     str, Task]:
-    existing = {m.summary: m for m in
-                session.scalars(select(Task).where(
-                    and_(Task.user_id == user_id, Task.summary.in_(names_to_display_names.keys())))).unique()}
-    non_existing = set(names_to_display_names.keys()).difference(existing.keys())
-
-    results = {
-        name: Task(summary=name, user_id=user_id, display_summary=names_to_display_names[name][constants.summary],
-                   description=names_to_display_names[name][constants.description]) for name in
-        non_existing}
-
-    if results:
-        session.add_all(results.values())
-        return results | existing
-
-    return existing
+    return upsert_by_name(session, Task, Task.summary, user_id, [
+        {constants.summary: name, constants.display_summary: names_to_display_names[name][constants.summary],
+         constants.description: names_to_display_names[name][constants.description]} for name in
+        names_to_display_names])
 
 
 def get_or_create_metrics(session: Session, summary_to_display_summary: Dict[str, str], user_id: int) -> Dict[
     str, Metric]:
-    existing = {m.name: m for m in
-                session.scalars(select(Metric).where(
-                    and_(Metric.user_id == user_id, Metric.name.in_(summary_to_display_summary.keys())))).unique()}
-    non_existing = set(summary_to_display_summary.keys()).difference(existing.keys())
+    return upsert_by_name(session, Metric, Metric.name, user_id, [
+        {constants.name: name, constants.display_name: summary_to_display_summary[name]} for name in
+        summary_to_display_summary])
+
 
-    results = {name: Metric(name=name, user_id=user_id, display_name=summary_to_display_summary[name]) for name in
-               non_existing}
+#  select-then-insert races between workers writing for the same user and fails the whole record on the unique key.
+#  one multi-row upsert that leaves existing rows untouched, then one locking read (a plain read could miss rows
+#  committed after our snapshot was taken). rows go in sorted so concurrent inserts lock keys in the same order
+def upsert_by_name(session: Session, entity: Any, name_column: Any, user_id: int, rows: List[Dict[str, Any]]) -> Dict[
+    str, Any]:
+    if not rows:
+        return {}
 
-    if results:
-        session.add_all(results.values())
-        return results | existing
+    rows = sorted(rows, key=lambda row: row[name_column.key])
+    stmt = mysql_insert(entity).values([row | {constants.user_id: user_id} for row in rows])
+    session.execute(stmt.on_duplicate_key_update(id=entity.id))
 
-    return existing
+    names = [row[name_column.key] for row in rows]
+    #  lazyload keeps the entity's eager joins (tags, schedule) out of the locking read, only these rows are locked
+    return {getattr(e, name_column.key): e for e in session.scalars(
+        select(entity).options(lazyload('*')).where(and_(entity.user_id == user_id, name_column.in_(names)))
+        .with_for_update(read=True))}
 
 
 def get_user_ids_from_event(event: Dict[str, Any], session: Session) -> Tuple[int, str]:
@@ -83,9 +103,78 @@ def get_user_ids_from_event(event: Dict[str, Any], session: Session) -> Tuple[in
 
     return user.id if user else None, external_user
 
+#  boto3 clients are thread safe once built but building one is slow (endpoint resolution, loaders, credential chain)
+#  so every worker in the process shares this one
+def get_bedrock_client():
+    global bedrock_client
+    if bedrock_client is None:
+        with bedrock_client_lock:
+            if bedrock_client is None:
+                bedrock_client = boto3.client(constants.bedrock_runtime, region_name=os.getenv(aws_region),
+                                              config=Config(max_pool_connections=bedrock_max_pool_connections,
+                                                            tcp_keepalive=True,
+                                                            read_timeout=bedrock_read_timeout,
+                                                            retries={'max_attempts': bedrock_max_attempts,
+                                                                     'mode': constants.adaptive}))
+    return bedrock_client
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        #  a bucket that can't hold one token would never let a request through
+        if capacity < 1:
+            raise ValueError(f'Token bucket capacity must be at least 1, got {capacity}.')
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1):
+        if tokens > self._capacity:
+            raise ValueError(f'Cannot acquire {tokens} tokens from a bucket of {self._capacity}.')
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+                self._updated_at = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self._rate
+            self._sleep(wait)
+
+
+#  one bucket per model since bedrock quotas are per model. non-positive rate means no limit
+def get_rate_limiter(model: str) -> Optional[TokenBucket]:
+    if bedrock_requests_per_second <= 0:
+        return None
+    limiter = rate_limiters.get(model)
+    if limiter is None:
+        with rate_limiters_lock:
+            limiter = rate_limiters.setdefault(model, TokenBucket(bedrock_requests_per_second, bedrock_burst))
+    return limiter
+
+
+def wait_for_model_capacity(model: str):
+    limiter = get_rate_limiter(model)
+    if limiter:
+        limiter.acquire()
+
+
 def call_generative(model: str, prompt: str, text_content: str, max_tokens: int = 3072) -> List[Dict[str, Any]]:
+    cache = get_model_response_cache()
+    key = cache_key(model, prompt, text_content, max_tokens)
+    if cache:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
     try:
-        bedrock_runtime = boto3.client(constants.bedrock_runtime)
+        bedrock_runtime = get_bedrock_client()
+        wait_for_model_capacity(model)
 
         id = uuid.uuid4().hex
         response = bedrock_runtime.invoke_model(
@@ -107,7 +196,10 @@ def call_generative(model: str, prompt: str, text_content: str, max_tokens: int
         if metrics_json_str.startswith('```'):
             metrics_json_str = metrics_json_str.split('\n', 1)[-1].strip('`')
 
-        return json.loads(metrics_json_str)
+        result = json.loads(metrics_json_str)
+        if cache:
+            cache.put(key, result)
+        return result
 
     except Exception as e:
         traceback.print_exc()
@@ -115,8 +207,15 @@ def call_generative(model: str, prompt: str, text_content: str, max_tokens: int
 
 
 def call_embedding(model: str, text_content: str) -> Optional[List[float]]:
+    cache = get_model_response_cache()
+    key = cache_key(model, None, text_content, None)
+    if cache:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
     try:
-        bedrock_runtime = boto3.client(constants.bedrock_runtime)
+        bedrock_runtime = get_bedrock_client()
+        wait_for_model_capacity(model)
 
         body = json.dumps({constants.input_text: text_content})
         response = bedrock_runtime.invoke_model(
@@ -126,20 +225,65 @@ def call_embedding(model: str, text_content: str) -> Optional[List[float]]:
             contentType=constants.application_json
         )
         response_body = json.loads(response.get(constants.body).read())
-        return response_body.get(constants.embedding)
+        embedding = response_body.get(constants.embedding)
+        if cache and embedding is not None:
+            cache.put(key, embedding)
+        return embedding
 
     except Exception as e:
         traceback.print_exc()
         raise e
 
 
+def cron_fields_from_dict(data: Dict[str, str]) -> Tuple[str, ...]:
+    return (data[constants.minute], data[constants.hour], data[constants.day_of_month], data[constants.month],
+            data[constants.day_of_week])
+
 
+def cron_fields_from_schedule(schedule: Any) -> Tuple[str, ...]:
+    return schedule.minute, schedule.hour, schedule.day_of_month, schedule.month, schedule.day_of_week
+
+
+#  plain 5 field cron. croniter reads a 6th field as seconds at the end, so the leading '0' these used to carry
+#  was taken as the minute and every field after it shifted by one
 def cron_expression_from_dict(data: Dict[str, str]) -> str:
-    return f'0 {data[constants.minute]} {data[constants.hour]} {data[constants.day_of_month]} {data[constants.month]} {data[constants.day_of_week]}'
+    return ' '.join(cron_fields_from_dict(data))
 
 
 def cron_expression_from_schedule(schedule: Any) -> str:
-    return f'0 {schedule.minute} {schedule.hour} {schedule.day_of_month} {schedule.month} {schedule.day_of_week}'
+    return ' '.join(cron_fields_from_schedule(schedule))
+
+
+#  users share a handful of patterns (daily at 8, hourly) so parsing once per pattern per process is enough.
+#  iterators are stateful, callers get a copy of the compiled one
+@functools.lru_cache(maxsize=cron_cache_size)
+def compile_cron(fields: Tuple[str, ...]) -> croniter:
+    return croniter(' '.join(fields))
+
+
+#  the generators ask for the same pattern with the same base time for a whole chunk
+@functools.lru_cache(maxsize=cron_cache_size * 4)
+def next_run_timestamps(fields: Tuple[str, ...], base_time: int, count: int) -> Tuple[int, ...]:
+    iterator = copy.copy(compile_cron(fields))
+    iterator.set_current(datetime.datetime.fromtimestamp(base_time, datetime.timezone.utc), force=True)
+    return tuple(int(iterator.get_next(datetime.datetime).timestamp()) for _ in range(count))
+
+
+def get_next_run_timestamps(cron_expression: str, base_time: int, count: int) -> List[int]:
+    return list(next_run_timestamps(tuple(cron_expression.split()), base_time, count))
+
+
+#  fire times in [since, base_time], latest max_runs of them, oldest first
+def get_previous_run_timestamps(cron_expression: str, base_time: int, since: int, max_runs: int) -> List[int]:
+    iterator = copy.copy(compile_cron(tuple(cron_expression.split())))
+    iterator.set_current(datetime.datetime.fromtimestamp(base_time + 1, datetime.timezone.utc), force=True)
+    runs = []
+    while len(runs) < max_runs:
+        run = int(iterator.get_prev(datetime.datetime).timestamp())
+        if run < since:
+            break
+        runs.append(run)
+    return runs[::-1]
 
 
 def enrich_schedule_map_with_next_timestamp(data_from_the_client: Dict[str, str]) -> Dict[str, str]:
@@ -156,9 +300,7 @@ def get_next_run_timestamp(cron_expression: str, base_time: int = None, period_s
     if period_seconds is not None and period_seconds > 0:
         return base_time + period_seconds
 
-    iterator = croniter(cron_expression, datetime.datetime.fromtimestamp(base_time, datetime.timezone.utc))
-    next_run_datetime = iterator.get_next(datetime.datetime)
-    return int(next_run_datetime.timestamp())
+    return next_run_timestamps(tuple(cron_expression.split()), base_time, 1)[0]
 
 
 def get_or_create_tags(user_id: int, session: Session, tag_display_names: Set[str]) -> Dict[str, Tag]:
@@ -166,33 +308,46 @@ def get_or_create_tags(user_id: int, session: Session, tag_display_names: Set[st
         return {}
 
     names_map = {normalize_identifier(name): name for name in tag_display_names}
-    stmt = select(Tag).where(and_(Tag.name.in_(names_map.keys()), Tag.user_id == user_id))
-    existing_tags = session.scalars(stmt).all()
-    existing_tags_dict = {tag.name: tag for tag in existing_tags}
-    new_tags = {t: Tag(user_id=user_id, name=t, display_name=names_map[t]) for t in names_map if
-                t not in existing_tags_dict}
-
-    if new_tags:
-        session.add_all(new_tags.values())
-        session.flush()
+    return upsert_by_name(session, Tag, Tag.name, user_id,
+                          [{constants.name: name, constants.display_name: display_name} for name, display_name in
+                           names_map.items()])
 
-    return existing_tags_dict | new_tags
 
-
-# todo refactor this
-def add_tags(user_id: int, session: Session, data: List[Dict[str, Any]], stmt_supplier: Callable[[], Executable]):
+#  set based so a tagging batch costs one select, one insert, one delete and one update
+#  instead of a delete + insert per association row. stmt_supplier selects the ids of the entities to tag
+def add_tags(user_id: int, session: Session, data: List[Dict[str, Any]], entity: Any, association: Table,
+             stmt_supplier: Callable[[], Executable]):
     if not data:
         return
 
+    entity_ids = set(session.scalars(stmt_supplier()).unique().all())
+    if not entity_ids:
+        return
+
     tag_map = get_tags_map_for_update(user_id, data, session)
-    data_map = {item[constants.id]: [normalize_identifier(t) for t in item.get(constants.tags, [])] for item in data}
-
-    entities_to_update = session.scalars(stmt_supplier()).unique().all()
-    for entity in entities_to_update:
-        entity.tags.clear()
-        entity.tags.extend([tag_map[tag_name] for tag_name in data_map[entity.id] if
-                            tag_name not in {tag.name for tag in entity.tags}])
-        entity.tagged = True
+    entity_column = next(c for c in association.c if c.name != constants.tag_id)
+    tag_column = association.c[constants.tag_id]
+
+    desired = {(item[constants.id], tag_map[normalize_identifier(tag_name)].id) for item in data if
+               item[constants.id] in entity_ids for tag_name in item.get(constants.tags, [])}
+    current = set(session.execute(select(entity_column, tag_column)
+                                  .where(entity_column.in_(entity_ids))).tuples().all())
+
+    to_add = desired - current
+    if to_add:
+        session.execute(insert(association).prefix_with('IGNORE', dialect='mysql').values(
+            [{entity_column.name: entity_id, constants.tag_id: tag_id} for entity_id, tag_id in sorted(to_add)]))
+
+    to_remove = current - desired
+    if to_remove:
+        session.execute(delete(association).where(tuple_(entity_column, tag_column).in_(sorted(to_remove))))
+
+    session.execute(update(entity).where(entity.id.in_(entity_ids)).values(tagged=True)
+                    .execution_options(synchronize_session=False))
+    #  association rows were written behind the orm's back
+    for instance in list(session.identity_map.values()):
+        if isinstance(instance, entity) and instance.id in entity_ids:
+            session.expire(instance)
 
 
 def get_tags_map_for_update(user_id: int, data: List[Dict[str, str]], session):
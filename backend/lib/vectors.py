@@ -0,0 +1,245 @@
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from shared import constants
+from backend.lib.search import get_opensearch_client, knn_search, bulk_index, migration_target, \
+    embedding_index_version
+from shared.variables import vector_store, vector_store_dir, vector_store_ivf_min_size, vector_store_ivf_probes, \
+    opensearch_index
+
+vector_store = os.getenv(vector_store, constants.default_vector_store)
+vector_store_dir = os.getenv(vector_store_dir, constants.default_vector_store_dir)
+vector_store_ivf_min_size = int(os.getenv(vector_store_ivf_min_size, constants.default_vector_store_ivf_min_size))
+vector_store_ivf_probes = int(os.getenv(vector_store_ivf_probes, constants.default_vector_store_ivf_probes))
+opensearch_index = os.getenv(opensearch_index)
+
+#  rows scored per matrix product while clustering, bounds the memory of a training pass
+assignment_chunk_size = 10000
+kmeans_iterations = 10
+
+
+#  both stores index one vector per note under the note id and answer knn queries for one user with
+#  [(note id, score)] best first. scores are 1 + cosine similarity, what opensearch's knn_score gives for cosinesimil.
+#  index_many takes [(user id, note id, vector)] and returns the note ids that weren't written
+class OpenSearchStore:
+    name = constants.opensearch
+
+    def __init__(self, index: str = opensearch_index, client_supplier: Callable[[], Any] = get_opensearch_client,
+                 version: str = embedding_index_version):
+        self._index = index
+        self._client_supplier = client_supplier
+        self._version = version
+
+    def index(self, user_id: int, note_id: int, vector: List[float]):
+        if self.index_many([(user_id, note_id, vector)]):
+            raise ValueError(f'Note {note_id} was rejected by {self._index}.')
+
+    #  while the re-embedding job fills the next version, writes go to it too, otherwise notes it already passed
+    #  would lose their update when the old index is dropped with the swap. only the new index's result counts,
+    #  the old one is about to go and rejects vectors of a new dimension
+    def index_many(self, documents: List[Tuple[int, int, List[float]]]) -> List[int]:
+        client = self._client_supplier()
+        target = migration_target(client, self._index, self._version)
+        rejected = bulk_index(client, self._index, documents)
+        if not target:
+            return rejected
+        if rejected:
+            print(f'Notes {rejected} not written to {self._index} during the migration to {target}')
+        return bulk_index(client, target, documents)
+
+    def query(self, user_id: int, vector: List[float], k: int) -> List[Tuple[int, float]]:
+        return knn_search(self._client_supplier(), self._index, user_id, vector, k)
+
+
+def normalize(vector: Any) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector, axis=-1, keepdims=True)
+    return vector / np.where(norm == 0, 1, norm)
+
+
+#  one user's vectors as a matrix of unit rows. small partitions are searched brute force, from ivf_min_size rows
+#  the rows are clustered (spherical k-means, sqrt(n) lists) and a query only scores the lists of its nearest
+#  centroids plus rows added since the last training. training is redone when the partition has doubled
+class Partition:
+    def __init__(self, ids: np.ndarray, vectors: np.ndarray):
+        self.ids = ids
+        self.vectors = vectors
+        self.positions = {int(id): row for row, id in enumerate(ids)}
+        self.centroids = None
+        self.assignments = None
+        self.trained_size = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def upsert(self, note_id: int, vector: np.ndarray):
+        if len(self) and vector.shape[0] != self.vectors.shape[1]:
+            raise ValueError(f'Vector dimension {vector.shape[0]} does not match {self.vectors.shape[1]}.')
+
+        row = self.positions.get(note_id)
+        if row is None:
+            self.positions[note_id] = len(self)
+            self.ids = np.append(self.ids, np.int64(note_id))
+            self.vectors = np.vstack([self.vectors.reshape(-1, vector.shape[0]), vector[None, :]])
+            return
+
+        if not self.vectors.flags.writeable:
+            self.vectors = np.array(self.vectors)
+        self.vectors[row] = vector
+        if row < self.trained_size:
+            self.assignments[row] = int(np.argmax(self.centroids @ vector))
+
+    #  new notes of a batch are appended with one copy of the matrix instead of one per note
+    def upsert_many(self, note_ids: List[int], vectors: List[np.ndarray]):
+        appended = {}
+        for note_id, vector in zip(note_ids, vectors):
+            if note_id in self.positions:
+                self.upsert(note_id, vector)
+            else:
+                appended[note_id] = vector
+        if not appended:
+            return
+
+        new_vectors = np.stack(list(appended.values()))
+        if len(self) and new_vectors.shape[1] != self.vectors.shape[1]:
+            raise ValueError(f'Vector dimension {new_vectors.shape[1]} does not match {self.vectors.shape[1]}.')
+        self.positions.update({note_id: len(self) + offset for offset, note_id in enumerate(appended)})
+        self.ids = np.concatenate([self.ids, np.fromiter(appended, dtype=np.int64, count=len(appended))])
+        self.vectors = np.vstack([self.vectors.reshape(-1, new_vectors.shape[1]), new_vectors])
+
+    def search(self, query: np.ndarray, k: int, probes: int, ivf_min_size: int) -> List[Tuple[int, float]]:
+        if not len(self) or k <= 0:
+            return []
+
+        if len(self) >= ivf_min_size:
+            if self.centroids is None or len(self) >= 2 * self.trained_size:
+                self.train()
+            nearest = np.argsort(self.centroids @ query)[::-1][:probes]
+            candidates = np.concatenate([np.flatnonzero(np.isin(self.assignments, nearest)),
+                                         np.arange(self.trained_size, len(self))])
+        else:
+            candidates = np.arange(len(self))
+
+        scores = self.vectors[candidates] @ query
+        top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.ids[candidates[i]]), float(1 + scores[i])) for i in top]
+
+    def train(self, seed: int = 0):
+        size = len(self)
+        lists = max(1, int(np.sqrt(size)))
+        rng = np.random.default_rng(seed)
+        centroids = np.array(self.vectors[rng.choice(size, lists, replace=False)])
+
+        for _ in range(kmeans_iterations):
+            assignments = self._assign(centroids)
+            for index in range(lists):
+                members = self.vectors[assignments == index]
+                if len(members):
+                    centroids[index] = normalize(members.sum(axis=0))
+
+        self.centroids = centroids
+        self.assignments = self._assign(centroids)
+        self.trained_size = size
+
+    def _assign(self, centroids: np.ndarray) -> np.ndarray:
+        return np.concatenate([np.argmax(self.vectors[start:start + assignment_chunk_size] @ centroids.T, axis=1)
+                               for start in range(0, len(self), assignment_chunk_size)])
+
+
+#  in process store for tests and small deployments, partitioned by user. with a directory every partition is kept
+#  as <user id>.ids.npy and <user id>.vectors.npy, written through a temp file and replaced, and opened memory mapped
+#  so a cold start only reads the pages a query touches
+class LocalStore:
+    name = constants.local
+
+    def __init__(self, directory: Optional[str] = vector_store_dir, ivf_min_size: int = vector_store_ivf_min_size,
+                 probes: int = vector_store_ivf_probes):
+        self._directory = directory
+        self._ivf_min_size = ivf_min_size
+        self._probes = probes
+        self._partitions: Dict[int, Partition] = {}
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def index(self, user_id: int, note_id: int, vector: List[float]):
+        self.index_many([(user_id, note_id, vector)])
+
+    def index_many(self, documents: List[Tuple[int, int, List[float]]]) -> List[int]:
+        by_user = {}
+        for user_id, note_id, vector in documents:
+            note_ids, vectors = by_user.setdefault(user_id, ([], []))
+            note_ids.append(note_id)
+            vectors.append(normalize(vector))
+        with self._lock:
+            #  a partition is written once per batch, not once per note
+            for user_id, (note_ids, vectors) in by_user.items():
+                partition = self._partition(user_id)
+                partition.upsert_many(note_ids, vectors)
+                self._save(user_id, partition)
+        return []
+
+    def query(self, user_id: int, vector: List[float], k: int) -> List[Tuple[int, float]]:
+        with self._lock:
+            return self._partition(user_id).search(normalize(vector), k, self._probes, self._ivf_min_size)
+
+    #  clusters the user's partition now instead of on the first query past ivf_min_size, e.g. after a bulk load
+    def train(self, user_id: int):
+        with self._lock:
+            partition = self._partition(user_id)
+            if len(partition):
+                partition.train()
+
+    def _partition(self, user_id: int) -> Partition:
+        partition = self._partitions.get(user_id)
+        if partition is None:
+            partition = self._load(user_id)
+            self._partitions[user_id] = partition
+        return partition
+
+    def _load(self, user_id: int) -> Partition:
+        ids_path, vectors_path = self._paths(user_id)
+        if not self._directory or not os.path.exists(ids_path) or not os.path.exists(vectors_path):
+            return Partition(np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32))
+        ids = np.load(ids_path, mmap_mode='r')
+        vectors = np.load(vectors_path, mmap_mode='r')
+        #  the vectors file is replaced first, a save interrupted in between leaves extra rows without ids
+        size = min(len(ids), len(vectors))
+        return Partition(np.array(ids[:size]), vectors[:size])
+
+    def _save(self, user_id: int, partition: Partition):
+        if not self._directory:
+            return
+        ids_path, vectors_path = self._paths(user_id)
+        for path, array in [(vectors_path, partition.vectors), (ids_path, partition.ids)]:
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp_path, path)
+
+    def _paths(self, user_id: int) -> Tuple[str, str]:
+        return (os.path.join(self._directory or constants.empty, f'{user_id}.ids.npy'),
+                os.path.join(self._directory or constants.empty, f'{user_id}.vectors.npy'))
+
+
+def build_vector_store(name: str = vector_store) -> Any:
+    return {
+        constants.opensearch: OpenSearchStore,
+        constants.local: LocalStore,
+    }[name]()
+
+
+vectors = build_vector_store()
+
+
+def get_vector_store() -> Any:
+    return vectors
+
+
+def set_vector_store(store: Any):
+    global vectors
+    vectors = store
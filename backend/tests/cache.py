@@ -0,0 +1,126 @@
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+
+from shared import constants
+from backend.lib import util
+from backend.lib.cache import cache_key, MemoryTier, FileTier, TieredCache, set_model_response_cache, \
+    get_model_response_cache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FailingTier:
+    name = 'failing'
+
+    def get(self, key):
+        raise ConnectionError('no db')
+
+    def put(self, key, value):
+        raise ConnectionError('no db')
+
+
+def prepare_bedrock_response(text):
+    return {constants.body: io.BytesIO(json.dumps({constants.content: [{constants.text: text}]}).encode())}
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        self.previous_cache = get_model_response_cache()
+
+    def tearDown(self):
+        set_model_response_cache(self.previous_cache)
+
+    def test_cache_key_depends_on_every_component(self):
+        key = cache_key('model', 'prompt', 'text', 100)
+
+        assert key == cache_key('model', 'prompt', 'text', 100)
+        assert len({key,
+                    cache_key('other', 'prompt', 'text', 100),
+                    cache_key('model', 'other', 'text', 100),
+                    cache_key('model', 'prompt', 'other', 100),
+                    cache_key('model', 'prompt', 'text', 200)}) == 5
+
+    def test_memory_tier_evicts_least_recently_used_and_expired(self):
+        clock = FakeClock()
+        tier = MemoryTier(max_entries=2, ttl=10, clock=clock)
+
+        tier.put('a', 1)
+        tier.put('b', 2)
+        assert tier.get('a') == 1
+        tier.put('c', 3)
+
+        assert tier.get('b') is None
+        assert tier.get('a') == 1
+        assert tier.get('c') == 3
+
+        clock.now = 10
+        assert tier.get('a') is None
+        assert len(tier) == 1
+
+    def test_file_tier_expires_and_trims(self):
+        with tempfile.TemporaryDirectory() as directory:
+            tier = FileTier(directory=directory, max_entries=2, ttl=60)
+
+            tier.put('a', [1, 2])
+            assert tier.get('a') == [1, 2]
+            assert tier.get('missing') is None
+
+            stale = time.time() - 120
+            os.utime(os.path.join(directory, 'a.json'), (stale, stale))
+            assert tier.get('a') is None
+
+            for index, key in enumerate(['b', 'c', 'd']):
+                tier.put(key, index)
+                mtime = time.time() - 30 + index
+                os.utime(os.path.join(directory, f'{key}.json'), (mtime, mtime))
+            tier.evict()
+
+            assert sorted(os.listdir(directory)) == ['c.json', 'd.json']
+
+    def test_tiered_cache_backfills_and_counts(self):
+        memory = MemoryTier(max_entries=10, ttl=60)
+        persistent = MemoryTier(max_entries=10, ttl=60)
+        persistent.name = constants.db
+        cache = TieredCache([memory, FailingTier(), persistent])
+
+        persistent.put('a', {'x': 1})
+
+        assert cache.get('a') == {'x': 1}
+        assert memory.get('a') == {'x': 1}
+        assert cache.get('a') == {'x': 1}
+        assert cache.get('b') is None
+
+        cache.put('b', [1])
+        assert persistent.get('b') == [1]
+        assert cache.stats() == {'hits': 2, 'misses': 1,
+                                 'tier_hits': {constants.memory: 1, 'failing': 0, constants.db: 1}}
+        assert cache.stats() == {'hits': 0, 'misses': 0,
+                                 'tier_hits': {constants.memory: 0, 'failing': 0, constants.db: 0}}
+
+    @patch('backend.lib.util.get_bedrock_client')
+    def test_model_call_reuses_cached_response(self, client_mock):
+        set_model_response_cache(TieredCache([MemoryTier(max_entries=10, ttl=60)]))
+        bedrock = MagicMock()
+        bedrock.invoke_model.side_effect = lambda **kwargs: prepare_bedrock_response('[{"name": "steps"}]')
+        client_mock.return_value = bedrock
+
+        first = util.call_generative('model', 'prompt', 'I walked', 100)
+        second = util.call_generative('model', 'prompt', 'I walked', 100)
+        util.call_generative('model', 'prompt', 'I walked', 200)
+
+        assert first == second == [{'name': 'steps'}]
+        assert bedrock.invoke_model.call_count == 2
+        assert get_model_response_cache().stats()['hits'] == 1
+
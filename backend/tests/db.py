@@ -1,6 +1,8 @@
 import unittest
 
-from backend.lib.db import normalize_identifier
+from sqlalchemy import create_engine, QueuePool
+
+from backend.lib.db import normalize_identifier, EngineRegistry, CredentialProvider, credentials_connect_factory
 
 
 class Test(unittest.TestCase):
@@ -26,3 +28,87 @@ class Test(unittest.TestCase):
 
             assert normalize_identifier("Final Test (Round 1) - GO!") ==  "final_test_round_1_go"
 
+
+    def test_engine_registry_builds_engine_once(self):
+        calls = []
+
+        def engine_supplier():
+            calls.append(1)
+            return create_engine('sqlite://', poolclass=QueuePool, pool_size=2, max_overflow=1)
+
+        registry = EngineRegistry(engine_supplier)
+        assert registry.stats() == {}
+
+        assert registry.get() is registry.get()
+        assert registry.session_maker() is registry.session_maker()
+        assert len(calls) == 1
+
+        first, second, third = [registry.get().connect() for _ in range(3)]
+        stats = registry.stats()
+        assert stats['size'] == 2
+        assert stats['checked_out'] == 3
+        assert stats['overflow'] == 1
+
+        for connection in [first, second, third]:
+            connection.close()
+        assert registry.stats()['checked_out'] == 0
+
+        registry.dispose()
+        assert registry.stats() == {}
+        registry.get()
+        assert len(calls) == 2
+
+    def test_credential_provider_caches_and_refreshes(self):
+        now = [0]
+        fetched = []
+
+        def supplier():
+            fetched.append(1)
+            return 'user', f'password_{len(fetched)}'
+
+        provider = CredentialProvider(supplier, ttl=100, refresh_ahead=10, clock=lambda: now[0])
+
+        assert provider.get() == ('user', 'password_1')
+        now[0] = 50
+        assert provider.get() == ('user', 'password_1')
+        assert len(fetched) == 1
+
+        now[0] = 95
+        assert provider.get() == ('user', 'password_1')
+        provider._refresh_thread.join()
+        assert provider.get() == ('user', 'password_2')
+
+        now[0] = 500
+        assert provider.get() == ('user', 'password_3')
+
+        provider.invalidate()
+        assert provider.get() == ('user', 'password_4')
+
+    def test_credentials_connect_retries_once_on_auth_error(self):
+        passwords = ['old', 'rotated', 'rotated_again']
+        provider = CredentialProvider(lambda: ('user', passwords.pop(0)), ttl=100, refresh_ahead=10)
+
+        class AccessDenied(Exception):
+            errno = 1045
+
+        class Dialect:
+            def __init__(self):
+                self.attempts = []
+
+            def connect(self, *_, **cparams):
+                self.attempts.append(cparams['password'])
+                if cparams['password'] != 'rotated':
+                    raise AccessDenied()
+                return 'connection'
+
+        dialect = Dialect()
+        connect = credentials_connect_factory(provider)
+        assert connect(dialect, None, [], {'host': 'db'}) == 'connection'
+        assert dialect.attempts == ['old', 'rotated']
+
+        class Broken(Dialect):
+            def connect(self, *_, **cparams):
+                raise AccessDenied()
+
+        with self.assertRaises(AccessDenied):
+            connect(Broken(), None, [], {'host': 'db'})
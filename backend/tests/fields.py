@@ -0,0 +1,37 @@
+import unittest
+
+from sqlalchemy.dialects import mysql
+
+from shared import constants
+from backend.lib.func.http import get_requested_fields, wants, project, select_fields
+from backend.lib.db import note_fields
+from backend.functions.data.index import metric_fields
+
+
+class Test(unittest.TestCase):
+
+    def test_requested_fields_are_parsed(self):
+        assert get_requested_fields({}) is None
+        assert get_requested_fields({constants.fields: ' | '}) is None
+        assert get_requested_fields({constants.fields: 'id| time |metric.name'}) == {'id', 'time', 'metric.name'}
+
+    def test_wants_covers_parents_and_children(self):
+        requested = {'id', 'metric.name', 'task'}
+
+        assert wants(None, 'anything')
+        assert wants(requested, 'id')
+        assert not wants(requested, 'time')
+        assert wants(requested, 'metric')
+        assert wants(requested, 'metric.name')
+        assert not wants(requested, 'metric.tags')
+        assert wants(requested, 'task.schedule.minute')
+
+    def test_projection_narrows_the_select(self):
+        fields = project(note_fields, {constants.id, constants.time})
+        sql = str(select_fields(fields).compile(dialect=mysql.dialect()))
+
+        assert list(fields) == [constants.id, constants.time]
+        assert 'note.text' not in sql and 'note.audio_text' not in sql
+        assert project(note_fields, None) == note_fields
+        assert list(project(metric_fields, {'metric.name'}, constants.metric)) == [constants.name]
+        assert project(metric_fields, {constants.metric}, constants.metric) == metric_fields
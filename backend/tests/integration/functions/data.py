@@ -752,6 +752,26 @@ class Test(unittest.TestCase):
         session.add_all([note, metric_one, metric_two])
         session.commit()
 
+    def test_orm_insert_copies_owner_user_id(self):
+        session = begin_session()
+        try:
+            metric = Metric(name='metric', display_name='metric', user_id=legit_user_id)
+            session.add(Data(value=1, metric=metric))
+            session.commit()
+            metric_id = metric.id
+
+            #  the owner isn't looked up for a row that only has its id
+            session = refresh_cache(session)
+            session.add(Data(value=2, metric_id=metric_id))
+            with self.assertRaises(ValueError):
+                session.commit()
+            session.rollback()
+
+            session = refresh_cache(session)
+            assert [d.user_id for d in session.query(Data).all()] == [legit_user_id]
+        finally:
+            session.close()
+
     def tearDown(self):
         baseTearDown()
 
@@ -0,0 +1,99 @@
+import unittest
+
+from sqlalchemy import event, insert, text
+
+from backend.tests.integration.base import *
+from backend.functions.data.index import handler as data_handler
+from backend.functions.occurrence.index import handler as occurrence_handler
+from backend.functions.link.index import handler as link_handler
+from backend.functions.note.index import handler as note_handler
+from backend.lib.db import Data, Occurrence, engine_registry
+
+#  tables the listing endpoints range scan. a plan that reads any of them with type ALL is a full scan
+listing_tables = {Data.__tablename__, Occurrence.__tablename__, Link.__tablename__, Note.__tablename__}
+users = 2
+per_user = 50
+rows_per_parent = 20
+
+
+def prepare_get_event(external_user_id: str, query_params: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        constants.body: '{}',
+        constants.query_params: query_params,
+        constants.path_params: {},
+        constants.request_context: {constants.http: {constants.method: constants.get},
+                                    'authorizer': {'jwt': {'claims': {'cognito:username': external_user_id}}}},
+    }
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.event = baseSetUp(Trigger.http)
+        self.statements = []
+
+    def test_listing_queries_use_indexes(self):
+        self._setup_rows()
+        now = get_utc_timestamp()
+        query_params = {constants.start: now - seconds_in_day * 2, constants.end: now}
+
+        engine = engine_registry.get()
+        event.listen(engine, 'before_cursor_execute', self._capture)
+        try:
+            for handler in [data_handler, occurrence_handler, link_handler, note_handler]:
+                result = handler(prepare_get_event(self.external_id, dict(query_params)), None)
+                assert result[constants.status_code] == 200, result
+        finally:
+            event.remove(engine, 'before_cursor_execute', self._capture)
+
+        assert self.statements
+        full_scans = []
+        with engine.connect() as connection:
+            for statement, parameters in self.statements:
+                for row in connection.exec_driver_sql(f'EXPLAIN {statement}', parameters).mappings():
+                    if row['table'] in listing_tables and row['type'] == 'ALL':
+                        full_scans.append((row['table'], statement))
+
+        assert full_scans == [], full_scans
+
+    def _capture(self, _, __, statement, parameters, ___, ____):
+        if statement.lstrip().upper().startswith('SELECT') and any(
+                f'FROM {table}' in statement for table in listing_tables):
+            self.statements.append((statement, parameters))
+
+    def _setup_rows(self):
+        session = begin_session()
+        try:
+            self.external_id = session.get(User, legit_user_id).external_id
+            now = get_utc_timestamp()
+            for user_id in range(1, users + 1):
+                notes = [Note(user_id=user_id, text=f'note {i}', time=now - i * 3600) for i in range(per_user)]
+                metrics = [Metric(user_id=user_id, name=f'metric{i}', display_name=f'metric {i}') for i in
+                           range(per_user)]
+                tasks = [Task(user_id=user_id, summary=f'task{i}', display_summary=f'task {i}', description='task')
+                         for i in range(per_user)]
+                session.add_all(notes + metrics + tasks)
+                session.flush()
+
+                session.execute(insert(Link), [
+                    {constants.user_id: user_id, constants.url: f'https://{user_id}.com/{i}',
+                     constants.summary: f'link{i}', constants.display_summary: f'link {i}',
+                     constants.time: now - i * 600} for i in range(per_user * rows_per_parent)])
+                session.execute(insert(Data), [
+                    {constants.metric_id: metric.id, constants.user_id: user_id, constants.value: i,
+                     constants.time: now - i * 3600}
+                    for metric in metrics for i in range(rows_per_parent)])
+                session.execute(insert(Occurrence), [
+                    {constants.task_id: task.id, constants.user_id: user_id, constants.priority: 5,
+                     constants.time: now - i * 3600}
+                    for task in tasks for i in range(rows_per_parent)])
+            session.commit()
+
+            for table in listing_tables:
+                session.execute(text(f'ANALYZE TABLE {table}'))
+        finally:
+            session.close()
+
+    def tearDown(self):
+        baseTearDown()
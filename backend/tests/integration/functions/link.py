@@ -660,6 +660,25 @@ class Test(unittest.TestCase):
             assert result[constants.status_code] == 200
             assert len(json.loads(result[constants.body])) == 1
 
+            # cursor pages of 2 walk all 5 in the same order, the last page has no next cursor
+            self.event[constants.query_params] = {
+                constants.start: three_days_ago - seconds_in_day,
+                constants.end: get_utc_timestamp(),
+            }
+            everything = [item[constants.url] for item in json.loads(handler(self.event, None)[constants.body])]
+            paged = []
+            cursor = None
+            for _ in range(3):
+                self.event[constants.query_params][constants.limit] = 2
+                if cursor:
+                    self.event[constants.query_params][constants.cursor] = cursor
+                result = handler(self.event, None)
+                assert result[constants.status_code] == 200
+                paged.extend(item[constants.url] for item in json.loads(result[constants.body]))
+                cursor = result[constants.headers].get(constants.next_cursor_header)
+            assert paged == everything
+            assert cursor is None
+
             assert session.query(Link).count() == 5
 
         finally:
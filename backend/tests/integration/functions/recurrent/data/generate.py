@@ -1,6 +1,8 @@
+import threading
 import unittest
 from backend.tests.integration.base import *
-from backend.functions.recurrent.data.generate.index import handler
+from backend.functions.recurrent.data.generate.index import handler, on_claimed
+from backend.lib.func.scheduled import handler_factory
 from backend.lib.db import Data
 from backend.tests.integration.functions.data import metric_one_name, metric_one_display_name
 
@@ -52,5 +54,30 @@ class Test(unittest.TestCase):
         finally:
             session.close()
 
+    def test_overlapping_runs_generate_once_per_schedule(self):
+        session = begin_session()
+        try:
+            old_next_run = get_utc_timestamp() - 1
+            for i in range(5):
+                session.add(Metric(name=f'{metric_one_name}{i}', display_name=f'{metric_one_display_name}{i}',
+                                   user_id=legit_user_id,
+                                   schedule=DataSchedule(target_value=i, units='r', next_run=old_next_run,
+                                                         period_seconds=60)))
+            session.commit()
+
+            chunked_handler = handler_factory(DataSchedule, on_claimed, chunk_size=2)
+            threads = [threading.Thread(target=chunked_handler, args=(None, None)) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            session = refresh_cache(session)
+            assert sorted([d.metric_id for d in session.query(Data).all()]) == [1, 2, 3, 4, 5]
+            assert all(s.next_run > old_next_run for s in session.query(DataSchedule).all())
+
+        finally:
+            session.close()
+
     def tearDown(self):
         baseTearDown()
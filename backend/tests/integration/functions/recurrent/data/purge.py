@@ -1,11 +1,21 @@
+import json
 import unittest
 from backend.tests.integration.base import *
-from backend.functions.recurrent.data.purge.index import handler
-from backend.lib.db import Origin, Data
+from backend.functions.recurrent.data.purge.index import handler, deletable_ids
+from backend.lib.func.purge import handler_factory
+from backend.lib.db import Origin, Data, JobCheckpoint
 
 from backend.tests.integration.functions.data import metric_one_name, metric_one_display_name
 
 
+class Context:
+    def __init__(self, remaining_millis):
+        self.remaining_millis = remaining_millis
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_millis.pop(0)
+
+
 class Test(unittest.TestCase):
 
     def setUp(self):
@@ -39,5 +49,52 @@ class Test(unittest.TestCase):
         finally:
             session.close()
 
+    def test_purge_respects_metric_and_user_retention(self):
+        session = begin_session()
+        try:
+            two_days_ago = get_utc_timestamp() - seconds_in_day * 2 - 1
+            session.get(User, legit_user_id).retention_days = 1
+            short = Metric(name=metric_one_name, display_name=metric_one_display_name, user_id=legit_user_id)
+            long = Metric(name=f'{metric_one_name}2', display_name=f'{metric_one_display_name}2', user_id=legit_user_id,
+                          retention_days=30)
+            short.data_points = [Data(value=1, units='l', time=two_days_ago)]
+            long.data_points = [Data(value=2, units='l', time=two_days_ago)]
+            session.add_all([short, long])
+            session.commit()
+
+            handler(None, None)
+
+            session = refresh_cache(session)
+            assert [d.value for d in session.query(Data).all()] == [2]
+        finally:
+            session.close()
+
+    def test_purge_resumes_after_timeout(self):
+        session = begin_session()
+        try:
+            old = get_utc_timestamp() - seconds_in_day * 31 * 4
+            metric = Metric(name=metric_one_name, display_name=metric_one_display_name, user_id=legit_user_id)
+            metric.data_points = [Data(value=i, units='l', time=old) for i in range(5)]
+            session.add(metric)
+            session.commit()
+
+            chunked_handler = handler_factory(Data.__tablename__, Data, deletable_ids, batch_size=2, sleep_seconds=0)
+            result = chunked_handler(None, Context([60000, 0]))
+            assert json.loads(result[constants.body])[constants.finished] is False
+
+            session = refresh_cache(session)
+            assert len(session.query(Data).all()) == 3
+            assert session.get(JobCheckpoint, Data.__tablename__).last_id == 2
+
+            result = chunked_handler(None, None)
+            assert json.loads(result[constants.body])[constants.deleted] == 3
+            assert json.loads(result[constants.body])[constants.finished] is True
+
+            session = refresh_cache(session)
+            assert len(session.query(Data).all()) == 0
+            assert session.get(JobCheckpoint, Data.__tablename__).last_id == 0
+        finally:
+            session.close()
+
     def tearDown(self):
         baseTearDown()
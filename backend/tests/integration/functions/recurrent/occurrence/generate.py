@@ -47,5 +47,24 @@ class Test(unittest.TestCase):
         finally:
             session.close()
 
+    def test_generate_catches_up_missed_runs(self):
+        session = begin_session()
+        try:
+            old_next_run = get_utc_timestamp() - 3 * 60 - 1
+            task = Task(summary=task_one_summary, display_summary=task_one_display_summary, user_id=legit_user_id,
+                        description=task_one_display_summary,
+                        schedule=OccurrenceSchedule(priority=3, next_run=old_next_run, period_seconds=60))
+            session.add(task)
+            session.commit()
+
+            handler(None, None)
+
+            session = refresh_cache(session)
+            task = get_tasks_by_display_summary(task_one_display_summary, session)[0]
+            assert sorted([o.time for o in task.occurrences]) == [old_next_run + k * 60 for k in range(4)]
+            assert task.schedule.next_run == old_next_run + 4 * 60
+        finally:
+            session.close()
+
     def tearDown(self):
         baseTearDown()
@@ -1,7 +1,9 @@
 import unittest
+
+from sqlalchemy import create_engine, inspect, insert
 from backend.tests.integration.base import *
-from backend.functions.schema.index import handler
-from backend.lib.db import Occurrence
+from backend.functions.schema.index import handler, backfill
+from backend.lib.db import Occurrence, Data
 from backend.tests.integration.functions.occurrence import task_one_summary, task_one_display_summary
 
 
@@ -28,6 +30,65 @@ class Test(unittest.TestCase):
         finally:
             session.close()
 
+    def test_update_adds_missing_columns_and_indexes(self):
+        event = {constants.request_type: constants.create_request_type}
+        handler(event, None)
+
+        engine = create_engine(connection_str)
+        with engine.begin() as connection:
+            connection.exec_driver_sql('ALTER TABLE data DROP INDEX idx_data_time')
+            connection.exec_driver_sql('ALTER TABLE metric DROP COLUMN retention_days')
+
+        event[constants.request_type] = constants.update_request_type
+        assert handler(event, None) == {constants.resource_status: constants.resource_success}
+        assert handler(event, None) == {constants.resource_status: constants.resource_success}
+
+        inspector = inspect(engine)
+        assert 'idx_data_time' in {index['name'] for index in inspector.get_indexes('data')}
+        assert 'retention_days' in {column['name'] for column in inspector.get_columns('metric')}
+
+    def test_update_renames_tables_keeping_their_rows(self):
+        event = {constants.request_type: constants.create_request_type}
+        handler(event, None)
+
+        engine = create_engine(connection_str)
+        with engine.begin() as connection:
+            connection.exec_driver_sql("INSERT INTO job_checkpoint (name, last_id) VALUES ('data', 7)")
+            connection.exec_driver_sql('ALTER TABLE job_checkpoint RENAME TO purge_checkpoint')
+
+        event[constants.request_type] = constants.update_request_type
+        assert handler(event, None) == {constants.resource_status: constants.resource_success}
+
+        tables = inspect(engine).get_table_names()
+        assert 'job_checkpoint' in tables and 'purge_checkpoint' not in tables
+        with engine.begin() as connection:
+            assert connection.exec_driver_sql("SELECT last_id FROM job_checkpoint WHERE name = 'data'").scalar() == 7
+
+    def test_update_backfills_owner_user_id(self):
+        baseSetUp(Trigger.http)
+
+        session = begin_session()
+        try:
+            metric = Metric(name='metric', display_name='metric', user_id=legit_user_id)
+            task = Task(summary='task', display_summary='task', description='task', user_id=legit_user_id)
+            session.add_all([metric, task])
+            session.flush()
+            #  core inserts skip the orm, like rows written before user_id existed
+            session.execute(insert(Data), [{constants.metric_id: metric.id, constants.value: i} for i in range(5)])
+            session.execute(insert(Occurrence), [{constants.task_id: task.id, constants.priority: 5} for _ in range(3)])
+            session.commit()
+
+            engine = create_engine(connection_str)
+            assert backfill(engine, Data, Metric, Data.metric_id, batch_size=2) == 5
+            event = {constants.request_type: constants.update_request_type}
+            assert handler(event, None) == {constants.resource_status: constants.resource_success}
+
+            session = refresh_cache(session)
+            assert {d.user_id for d in session.query(Data).all()} == {legit_user_id}
+            assert {o.user_id for o in session.query(Occurrence).all()} == {legit_user_id}
+        finally:
+            session.close()
+
     def _create_test_data(self, session):
         user = User(external_id='external_id')
         time_now = get_utc_timestamp()
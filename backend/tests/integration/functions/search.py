@@ -0,0 +1,73 @@
+import json
+import unittest
+from unittest.mock import patch
+
+from backend.tests.integration.base import *
+from backend.functions.search.index import handler
+
+
+def prepare_search_event(external_user_id: str, query_params: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        constants.body: '{}',
+        constants.query_params: query_params,
+        constants.path_params: {},
+        constants.request_context: {constants.http: {constants.method: constants.get},
+                                    'authorizer': {'jwt': {'claims': {'cognito:username': external_user_id}}}},
+    }
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.event = baseSetUp(Trigger.http)
+        session = begin_session()
+        try:
+            self.external_id = get_user_by_id(legit_user_id, session).external_id
+            self.malicious_external_id = get_user_by_id(malicious_user_id, session).external_id
+            notes = [Note(user_id=legit_user_id, text='went running in the park'),
+                     Note(user_id=legit_user_id, text='bought groceries'),
+                     Note(user_id=legit_user_id, text='slept badly, running late'),
+                     Note(user_id=malicious_user_id, text='running with friends')]
+            session.add_all(notes)
+            session.commit()
+            self.note_ids = [note.id for note in notes]
+        finally:
+            session.close()
+
+    @patch('backend.functions.search.index.call_embedding')
+    @patch('backend.functions.search.index.get_vector_store')
+    def test_search_returns_notes_in_knn_order(self, store_mock, call_mock):
+        call_mock.return_value = [0.1, 0.2]
+        store_mock.return_value.query.return_value = [(self.note_ids[2], 1.9), (self.note_ids[0], 1.5),
+                                                      (self.note_ids[3], 1.4)]
+
+        result = handler(prepare_search_event(self.external_id, {constants.text: 'running',
+                                                                 constants.fields: 'id|text'}), None)
+
+        assert result[constants.status_code] == 200
+        items = json.loads(result[constants.body])
+        #  another user's note is never returned even if the index hands it back
+        assert [item[constants.id] for item in items] == [self.note_ids[2], self.note_ids[0]]
+        assert set(items[0]) == {constants.id, constants.text, constants.score}
+        assert store_mock.return_value.query.call_args.args[0] == legit_user_id
+
+    @patch('backend.functions.search.index.call_embedding')
+    @patch('backend.functions.search.index.get_vector_store')
+    def test_hybrid_search_adds_fulltext_matches(self, store_mock, call_mock):
+        call_mock.return_value = [0.1, 0.2]
+        store_mock.return_value.query.return_value = [(self.note_ids[1], 1.2)]
+
+        result = handler(prepare_search_event(self.external_id, {constants.text: 'running',
+                                                                 constants.hybrid: 'true'}), None)
+
+        assert result[constants.status_code] == 200
+        ids = [item[constants.id] for item in json.loads(result[constants.body])]
+        assert sorted(ids) == sorted([self.note_ids[0], self.note_ids[1], self.note_ids[2]])
+
+    def test_search_without_text_returns_400(self):
+        result = handler(prepare_search_event(self.external_id, {}), None)
+        assert result[constants.status_code] == 400
+
+    def tearDown(self):
+        baseTearDown()
@@ -1,8 +1,9 @@
 import json
+import threading
 import unittest
 from backend.tests.integration.base import *
 from backend.functions.tag.index import handler
-from backend.lib.util import get_user_ids_from_event
+from backend.lib.util import get_user_ids_from_event, get_or_create_tags
 
 
 tag_one_display_name = 'display name one'
@@ -192,6 +193,47 @@ class Test(unittest.TestCase):
         finally:
             session.close()
 
+    def test_get_or_create_tags_is_race_free(self):
+        self._setup_tags()
+        session = begin_session()
+        try:
+            user_id, _ = get_user_ids_from_event(self.event, session)
+        finally:
+            session.close()
+
+        names = {tag_one_display_name, 'brand new tag', 'another new tag'}
+        barrier = threading.Barrier(4, timeout=30)
+        results = []
+        errors = []
+
+        def create():
+            worker_session = begin_session()
+            try:
+                barrier.wait()
+                results.append({name: tag.id for name, tag in get_or_create_tags(user_id, worker_session, names).items()})
+                worker_session.commit()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                worker_session.close()
+
+        threads = [threading.Thread(target=create) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert len(results) == 4
+        assert all(result == results[0] for result in results)
+        assert set(results[0].keys()) == {normalize_identifier(name) for name in names}
+
+        session = begin_session()
+        try:
+            assert len(session.query(Tag).filter(Tag.user_id == user_id).all()) == 7
+        finally:
+            session.close()
+
     def _setup_tags(self):
 
         session = begin_session()
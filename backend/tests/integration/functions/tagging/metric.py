@@ -88,6 +88,29 @@ class Test(unittest.TestCase):
         finally:
             session.close()
 
+    def test_on_response_from_model_replaces_stale_tags(self):
+        self._setup_metrics()
+        session = begin_session()
+        try:
+            metric_one = get_metric_by_id(1, session)
+            metric_one.tags = [Tag(user_id=metric_one.user_id, name=tag_three_name, display_name=tag_three_display_name),
+                               Tag(user_id=metric_one.user_id, name=tag_one_name, display_name=tag_one_display_name)]
+            session.commit()
+
+            session = refresh_cache(session)
+            on_response_from_model(session, 1, None, [{constants.id: 1, constants.tags: [tag_one_display_name, tag_two_display_name]},
+                                                      {constants.id: 2, constants.tags: [tag_two_display_name, tag_two_display_name]}])
+            session.commit()
+
+            session = refresh_cache(session)
+            assert len(session.query(Tag).all()) == 3
+            assert sorted([tag.name for tag in get_metric_by_id(1, session).tags]) == sorted([tag_one_name, tag_two_name])
+            assert [tag.name for tag in get_metric_by_id(2, session).tags] == [tag_two_name]
+            assert all(metric.tagged for metric in session.query(Metric).all())
+
+        finally:
+            session.close()
+
     def _setup_metrics(self, tagged=False):
 
         session = begin_session()
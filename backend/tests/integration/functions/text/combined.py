@@ -0,0 +1,83 @@
+import os
+from unittest.mock import patch
+from backend.tests.integration.base import *
+from shared.variables import *
+
+os.environ[max_tokens] = '1024'
+os.environ[generative_model] = 'lalalala'
+
+import unittest
+
+from backend.functions.text.combined.index import on_response_from_model
+from backend.lib.db import Data, Occurrence
+from backend.lib.util import get_user_ids_from_event
+from backend.tests.integration.base import *
+
+metric_display_name = 'Distance run'
+link_url = 'https://run.com/plan'
+task_summary = 'buy new shoes'
+
+
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        self.event = baseSetUp(Trigger.http)
+
+    @patch('backend.functions.text.combined.index.send_to_sns')
+    def test_on_response_from_model_succeeds(self, send_to_sns_mock):
+        self._setup_note()
+        session = begin_session()
+        model_output = {
+            constants.metrics: [{constants.name: metric_display_name, constants.value: 5, constants.units: 'miles'},
+                                {constants.name: metric_display_name, constants.value: 3, constants.units: 'miles'}],
+            constants.links: [{constants.url: link_url, constants.summary: 'running plan',
+                               constants.description: 'a running plan'}],
+            constants.tasks: [{constants.summary: task_summary, constants.description: 'buy new running shoes',
+                               constants.priority: 5}],
+        }
+
+        try:
+            on_response_from_model(session, 1, model_output)
+
+            session = refresh_cache(session)
+            assert len(session.query(Metric).all()) == 1
+            assert sorted([float(d.value) for d in session.query(Data).all()]) == [3, 5]
+            assert [l.url for l in session.query(Link).all()] == [link_url]
+            assert [t.display_summary for t in session.query(Task).all()] == [task_summary]
+            assert len(session.query(Occurrence).all()) == 1
+            assert {d.note_id for d in session.query(Data).all()} == {1}
+
+            send_to_sns_mock.assert_called_once_with(1)  # one tagging message for all three kinds
+
+        finally:
+            session.close()
+
+    @patch('backend.functions.text.combined.index.send_to_sns')
+    def test_on_response_from_model_with_nothing_extracted(self, send_to_sns_mock):
+        self._setup_note()
+        session = begin_session()
+        try:
+            on_response_from_model(session, 1, {constants.metrics: [], constants.links: [], constants.tasks: []})
+
+            session = refresh_cache(session)
+            assert len(session.query(Data).all()) == 0
+            assert len(session.query(Link).all()) == 0
+            assert len(session.query(Task).all()) == 0
+            send_to_sns_mock.assert_not_called()
+
+        finally:
+            session.close()
+
+    def _setup_note(self):
+        session = begin_session()
+        try:
+            user_id, _ = get_user_ids_from_event(self.event, session)
+            session.add(Note(user_id=user_id))
+            session.commit()
+        finally:
+            session.close()
+
+    def tearDown(self):
+        baseTearDown()
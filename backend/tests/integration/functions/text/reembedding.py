@@ -0,0 +1,129 @@
+import json
+import unittest
+from unittest.mock import patch, MagicMock
+
+from backend.tests.integration.base import *
+from backend.functions.text.reembedding.index import handler_factory
+from backend.lib.db import JobCheckpoint
+
+
+class Context:
+    def __init__(self, remaining_millis):
+        self.remaining_millis = remaining_millis
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_millis.pop(0)
+
+
+def prepare_client() -> MagicMock:
+    client = MagicMock()
+    client.indices.exists_alias.return_value = True
+    client.indices.get_alias.return_value = {'notes_v0': {}}
+    client.indices.exists.return_value = False
+    client.bulk.return_value = {constants.errors: False}
+    return client
+
+
+@patch('backend.functions.text.reembedding.index.opensearch_index', 'notes')
+@patch('backend.functions.text.reembedding.index.call_embedding', lambda _, text: [float(len(text))])
+class Test(unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.event = baseSetUp(Trigger.http)
+        session = begin_session()
+        try:
+            notes = [Note(user_id=legit_user_id, text='one'), Note(user_id=malicious_user_id, text='three'),
+                     Note(user_id=legit_user_id, text='seven')]
+            session.add_all(notes)
+            session.commit()
+            self.note_ids = [note.id for note in notes]
+        finally:
+            session.close()
+
+    def test_notes_are_reindexed_in_chunks_and_the_alias_swapped(self):
+        client = prepare_client()
+        handler = handler_factory(lambda: client, batch_size=2, sleep_seconds=0)
+
+        result = handler(None, Context([60000, 0]))
+
+        assert json.loads(result[constants.body]) == {constants.reembedded: 2, constants.failed: 0,
+                                                      constants.finished: False}
+        assert client.indices.create.call_args.kwargs['index'] == 'notes_v1'
+        client.indices.update_aliases.assert_not_called()
+
+        client.indices.exists.return_value = True
+        result = handler(None, None)
+
+        assert json.loads(result[constants.body])[constants.finished]
+        documents = [call.kwargs['body'][1::2] for call in client.bulk.call_args_list]
+        assert documents == [[{constants.vector_field: [3.0], constants.note_id: self.note_ids[0],
+                               constants.user_id: legit_user_id},
+                              {constants.vector_field: [5.0], constants.note_id: self.note_ids[1],
+                               constants.user_id: malicious_user_id}],
+                             [{constants.vector_field: [5.0], constants.note_id: self.note_ids[2],
+                               constants.user_id: legit_user_id}]]
+        assert client.indices.update_aliases.call_args.kwargs['body'] == {constants.actions: [
+            {constants.add: {constants.index: 'notes_v1', constants.alias: 'notes'}},
+            {constants.remove_index: {constants.index: 'notes_v0'}}]}
+
+        session = begin_session()
+        try:
+            assert session.get(JobCheckpoint, 'reembedded:notes_v1').last_id == self.note_ids[2]
+        finally:
+            session.close()
+
+    def test_the_alias_is_not_swapped_until_failed_notes_are_retried(self):
+        client = prepare_client()
+
+        def call_embedding(_, text):
+            if text == 'three':
+                raise ValueError('throttled')
+            return [float(len(text))]
+
+        with patch('backend.functions.text.reembedding.index.call_embedding', call_embedding):
+            result = handler_factory(lambda: client, batch_size=2, sleep_seconds=0)(None, None)
+
+        assert json.loads(result[constants.body]) == {constants.reembedded: 2, constants.failed: 1,
+                                                      constants.finished: False}
+        client.indices.update_aliases.assert_not_called()
+        session = begin_session()
+        try:
+            assert json.loads(session.get(JobCheckpoint, 'reembedded:notes_v1').retry_ids) == [self.note_ids[1]]
+        finally:
+            session.close()
+
+        client.indices.exists.return_value = True
+        client.bulk.reset_mock()
+        result = handler_factory(lambda: client, batch_size=2, sleep_seconds=0)(None, None)
+
+        assert json.loads(result[constants.body]) == {constants.reembedded: 1, constants.failed: 0,
+                                                      constants.finished: True}
+        assert [document[constants.note_id] for document in client.bulk.call_args.kwargs['body'][1::2]] == [
+            self.note_ids[1]]
+        assert client.indices.update_aliases.called
+
+    def test_nothing_is_done_once_the_alias_points_to_the_version(self):
+        client = prepare_client()
+        client.indices.get_alias.return_value = {'notes_v1': {}}
+
+        result = handler_factory(lambda: client)(None, None)
+
+        assert json.loads(result[constants.body])[constants.finished]
+        client.bulk.assert_not_called()
+        client.indices.create.assert_not_called()
+
+    def test_an_index_from_before_aliases_is_only_moved_behind_one(self):
+        client = prepare_client()
+        client.indices.exists_alias.return_value = False
+        client.indices.exists.return_value = True
+
+        result = handler_factory(lambda: client)(None, None)
+
+        assert json.loads(result[constants.body])[constants.finished]
+        assert client.indices.clone.call_args.kwargs['target'] == 'notes_v1'
+        client.bulk.assert_not_called()
+        client.indices.create.assert_not_called()
+
+    def tearDown(self):
+        baseTearDown()
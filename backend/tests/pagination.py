@@ -0,0 +1,87 @@
+import json
+import unittest
+from unittest.mock import patch, MagicMock
+
+from sqlalchemy import select
+from sqlalchemy.dialects import mysql
+
+from shared import constants
+from backend.lib.db import Data, Tag
+from backend.lib.func.http import paginate, keyset_condition, next_cursor_headers, encode_cursor, decode_cursor, \
+    get_offset_and_limit, cursor_label, handler_factory, BadRequest
+
+
+def compile_query(query):
+    return str(query.compile(dialect=mysql.dialect(), compile_kwargs={'literal_binds': True}))
+
+
+class Row:
+    def __init__(self, *sort_values):
+        self._mapping = {cursor_label(index): value for index, value in enumerate(sort_values)}
+
+
+class Test(unittest.TestCase):
+
+    def test_cursor_round_trips(self):
+        cursor = encode_cursor(['Ünïcode name', 42])
+
+        assert '=' not in cursor
+        assert decode_cursor(cursor, 2) == ['Ünïcode name', 42]
+        with self.assertRaises(ValueError):
+            decode_cursor(cursor, 3)
+        with self.assertRaises(ValueError):
+            decode_cursor('not a cursor', 2)
+
+    def test_keyset_condition_expands_row_comparison(self):
+        condition = keyset_condition([Data.time, Data.id], [100, 7], descending=True)
+
+        assert compile_query(select(Data.id).where(condition)).endswith(
+            'WHERE data.time < 100 OR data.time = 100 AND data.id < 7')
+        assert 'tag.name > \'b\' OR tag.name = \'b\' AND tag.id > 3' in compile_query(
+            select(Tag.id).where(keyset_condition([Tag.name, Tag.id], ['b', 3], descending=False)))
+
+    def test_paginate_uses_cursor_instead_of_offset(self):
+        columns = [Data.time, Data.id]
+        query, limit = paginate(select(Data.id), {constants.offset: '5', constants.limit: '10'}, columns,
+                                descending=True)
+        sql = compile_query(query)
+        assert limit == 10
+        assert 'ORDER BY data.time DESC, data.id DESC' in sql
+        assert sql.endswith('LIMIT 5, 10')
+        assert f'data.time AS {cursor_label(0)}, data.id AS {cursor_label(1)}' in sql
+
+        query, _ = paginate(select(Data.id), {constants.offset: '5', constants.limit: '10',
+                                              constants.cursor: encode_cursor([100, 7])}, columns, descending=True)
+        sql = compile_query(query)
+        assert 'data.time < 100' in sql
+        assert sql.endswith('LIMIT 10')
+
+    @patch('backend.lib.func.http.get_user_ids_from_event', lambda event, session: (1, 'external_id'))
+    @patch('backend.lib.func.http.begin_session', MagicMock)
+    def test_garbage_cursor_is_a_bad_request(self):
+        with self.assertRaises(BadRequest):
+            paginate(select(Data.id), {constants.cursor: 'garbage!'}, [Data.time, Data.id])
+
+        def get(_, request_context):
+            paginate(select(Data.id), request_context.query_params, [Data.time, Data.id])
+            return [], 200
+
+        response = handler_factory({'GET': get})({
+            constants.query_params: {constants.cursor: 'garbage!'},
+            constants.request_context: {constants.http: {constants.method: 'GET'}}}, None)
+
+        assert response['statusCode'] == 400
+        assert json.loads(response['body']) == {constants.error: constants.invalid_cursor}
+
+    def test_next_cursor_only_for_full_pages(self):
+        columns = [Data.time, Data.id]
+        rows = [Row(200, 9), Row(100, 7)]
+
+        assert next_cursor_headers(rows, columns, 3) == {}
+        assert next_cursor_headers([], columns, 0) == {}
+        headers = next_cursor_headers(rows, columns, 2)
+        assert decode_cursor(headers[constants.next_cursor_header], 2) == [100, 7]
+
+    def test_offset_and_limit_are_clamped(self):
+        assert get_offset_and_limit({}) == (0, 100)
+        assert get_offset_and_limit({constants.offset: '-3', constants.limit: '1000'}) == (0, 100)
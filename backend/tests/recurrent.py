@@ -0,0 +1,42 @@
+import datetime
+import unittest
+
+from backend.functions.recurrent.occurrence.generate.index import missed_periodic_runs, missed_cron_runs
+
+
+def timestamp(*args) -> int:
+    return int(datetime.datetime(*args, tzinfo=datetime.timezone.utc).timestamp())
+
+
+class Test(unittest.TestCase):
+
+    def test_missed_periodic_runs_catches_up(self):
+        runs, next_run = missed_periodic_runs(1000, 60, 1000, 100)
+        assert runs == [1000]
+        assert next_run == 1060
+
+        runs, next_run = missed_periodic_runs(1000, 60, 1250, 100)
+        assert runs == [1000, 1060, 1120, 1180, 1240]
+        assert next_run == 1300
+
+        runs, next_run = missed_periodic_runs(1000, 60, 1250, 2)
+        assert runs == [1180, 1240]
+        assert next_run == 1300
+
+    def test_missed_cron_runs_catches_up(self):
+        expression = '0 * * * *'
+        next_run = timestamp(2025, 10, 10, 7, 0)
+        now = timestamp(2025, 10, 10, 10, 30)
+
+        runs, new_next_run = missed_cron_runs(expression, next_run, now, 100)
+        assert runs == [timestamp(2025, 10, 10, hour, 0) for hour in [7, 8, 9, 10]]
+        assert new_next_run == timestamp(2025, 10, 10, 11, 0)
+
+        runs, new_next_run = missed_cron_runs(expression, next_run, now, 2)
+        assert runs == [timestamp(2025, 10, 10, 9, 0), timestamp(2025, 10, 10, 10, 0)]
+        assert new_next_run == timestamp(2025, 10, 10, 11, 0)
+
+        runs, new_next_run = missed_cron_runs(expression, timestamp(2025, 10, 10, 10, 0), timestamp(2025, 10, 10, 10, 0),
+                                              100)
+        assert runs == [timestamp(2025, 10, 10, 10, 0)]
+        assert new_next_run == timestamp(2025, 10, 10, 11, 0)
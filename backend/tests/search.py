@@ -0,0 +1,88 @@
+import unittest
+from unittest.mock import MagicMock
+
+from shared import constants
+from backend.lib.search import knn_query, knn_search, normalize_scores, blend_scores, bulk_index, swap_alias, \
+    adopt_legacy_index
+
+
+class Test(unittest.TestCase):
+
+    def test_knn_query_is_filtered_by_user(self):
+        query = knn_query(7, [0.1, 0.2], 5)
+
+        assert query[constants.size] == 5
+        script_score = query[constants.query][constants.script_score]
+        assert script_score[constants.query] == {constants.term: {constants.user_id: 7}}
+        assert script_score[constants.script][constants.params][constants.query_value] == [0.1, 0.2]
+
+    def test_knn_search_reads_note_ids_and_scores(self):
+        client = MagicMock()
+        client.search.return_value = {constants.hits: {constants.hits: [
+            {constants.source_field: {constants.note_id: 3}, constants.score_field: 1.8},
+            {constants.source_field: {constants.note_id: 1}, constants.score_field: 1.2}]}}
+
+        assert knn_search(client, 'index', 7, [0.1], 2) == [(3, 1.8), (1, 1.2)]
+        assert client.search.call_args.kwargs['index'] == 'index'
+
+    def test_bulk_index_sends_one_request_and_reports_rejected_notes(self):
+        client = MagicMock()
+        client.bulk.return_value = {constants.errors: True, constants.items: [
+            {constants.index: {constants.id_field: '3'}},
+            {constants.index: {constants.id_field: '4', constants.error: {constants.type: 'mapper_parsing_exception'}}}]}
+
+        assert bulk_index(client, 'index', [(7, 3, [0.1]), (7, 4, [0.2])]) == [4]
+        assert client.bulk.call_count == 1
+        assert client.bulk.call_args.kwargs['body'] == [
+            {constants.index: {constants.index_field: 'index', constants.id_field: 3}},
+            {constants.vector_field: [0.1], constants.note_id: 3, constants.user_id: 7},
+            {constants.index: {constants.index_field: 'index', constants.id_field: 4}},
+            {constants.vector_field: [0.2], constants.note_id: 4, constants.user_id: 7}]
+        assert bulk_index(client, 'index', []) == []
+        assert client.bulk.call_count == 1
+
+        #  with create a document that's already there is kept and not reported
+        client.bulk.return_value = {constants.errors: True, constants.items: [
+            {constants.create: {constants.status: constants.conflict_status, constants.error: {}}}]}
+        assert bulk_index(client, 'index', [(7, 3, [0.1])], constants.create) == []
+        assert client.bulk.call_args.kwargs['body'][0] == {
+            constants.create: {constants.index_field: 'index', constants.id_field: 3}}
+
+    def test_swap_alias_replaces_old_indices_in_one_call(self):
+        client = MagicMock()
+        client.indices.exists_alias.return_value = False
+        client.indices.exists.return_value = True
+
+        #  an index created before aliases were used is dropped as the alias takes its name
+        swap_alias(client, 'notes', 'notes_v1')
+        assert client.indices.update_aliases.call_args.kwargs['body'] == {constants.actions: [
+            {constants.add: {constants.index: 'notes_v1', constants.alias: 'notes'}},
+            {constants.remove_index: {constants.index: 'notes'}}]}
+
+        client.indices.exists_alias.return_value = True
+        client.indices.get_alias.return_value = {'notes_v1': {}}
+        swap_alias(client, 'notes', 'notes_v2')
+        assert client.indices.update_aliases.call_args.kwargs['body'][constants.actions][1:] == [
+            {constants.remove_index: {constants.index: 'notes_v1'}}]
+
+    def test_legacy_index_is_cloned_behind_the_alias(self):
+        client = MagicMock()
+        client.indices.exists_alias.return_value = False
+        client.indices.exists.return_value = True
+
+        assert adopt_legacy_index(client, 'notes', '1') == 'notes_v1'
+        assert client.indices.put_settings.call_args.kwargs == {
+            'index': 'notes', 'body': {constants.index: {constants.blocks_write: True}}}
+        assert client.indices.clone.call_args.kwargs['target'] == 'notes_v1'
+        assert client.indices.update_aliases.call_args.kwargs['body'] == {constants.actions: [
+            {constants.add: {constants.index: 'notes_v1', constants.alias: 'notes'}},
+            {constants.remove_index: {constants.index: 'notes'}}]}
+
+    def test_scores_are_normalized_and_blended(self):
+        assert normalize_scores({}) == {}
+        assert normalize_scores({1: 5.0}) == {1: 1.0}
+        assert normalize_scores({1: 1.0, 2: 2.0, 3: 3.0}) == {1: 0.0, 2: 0.5, 3: 1.0}
+
+        blended = blend_scores({1: 1.9, 2: 1.1}, {2: 12.0, 3: 4.0}, 0.75)
+        assert blended == {1: 0.75, 2: 0.25, 3: 0.0}
+        assert sorted(blended, key=blended.get, reverse=True) == [1, 2, 3]
@@ -0,0 +1,24 @@
+import json
+import unittest
+from decimal import Decimal
+from unittest.mock import patch
+
+from backend.lib.func import http
+from backend.lib.func.http import serialize
+
+
+class Test(unittest.TestCase):
+
+    def test_serializers_agree(self):
+        value = [{'value': Decimal('1.50'), 'tags': ['a'], 'nested': {1: None, 'ok': True}}]
+        expected = [{'value': 1.5, 'tags': ['a'], 'nested': {'1': None, 'ok': True}}]
+
+        assert json.loads(serialize(value)) == expected
+        with patch.object(http, 'orjson', None):
+            assert json.loads(serialize(value)) == expected
+
+    def test_unknown_types_still_fail(self):
+        for orjson in [http.orjson, None]:
+            with patch.object(http, 'orjson', orjson):
+                with self.assertRaises(TypeError):
+                    serialize({'value': object()})
@@ -0,0 +1,160 @@
+import json
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from shared import constants
+from backend.lib.db import NoteTextHash
+from backend.lib.func.sqs import handler_factory, batch_handler_factory, Params, Model, text_hash
+
+
+def prepare_sqs_event(*message_ids: str):
+    return {constants.records: [{constants.message_id: message_id, constants.body: message_id} for message_id in
+                                message_ids]}
+
+
+def prepare_sns_sqs_event(*note_ids: int):
+    return {constants.records: [{constants.message_id: str(note_id), constants.body: json.dumps(
+        {constants.message: json.dumps({constants.note_id: note_id, constants.origin: 'text'})})} for note_id in
+                                note_ids]}
+
+
+class Test(unittest.TestCase):
+
+    def test_handler_reports_only_failed_records(self):
+        processed = []
+
+        def process_record(record):
+            processed.append(record[constants.message_id])
+            if record[constants.body] in {'2', '4'}:
+                raise ValueError('bad record')
+
+        for max_workers in [1, 3]:
+            processed.clear()
+            result = handler_factory(process_record, max_workers=max_workers)(prepare_sqs_event('1', '2', '3', '4', '5'), None)
+
+            assert sorted(processed) == ['1', '2', '3', '4', '5']
+            assert result == {constants.batch_item_failures: [{constants.item_identifier: '2'},
+                                                              {constants.item_identifier: '4'}]}
+
+    def test_handler_processes_records_concurrently(self):
+        barrier = threading.Barrier(3, timeout=5)
+
+        #  would time out if the records were processed one by one
+        result = handler_factory(lambda _: barrier.wait(), max_workers=3)(prepare_sqs_event('1', '2', '3'), None)
+
+        assert result == {constants.batch_item_failures: []}
+
+    @patch('backend.lib.func.sqs.begin_session', MagicMock())
+    def test_batch_handler_calls_model_concurrently_and_writes_serially(self):
+        barrier = threading.Barrier(3, timeout=5)
+        written = []
+        writing = threading.Lock()
+
+        def call_generative(_, __, text, max_tokens=None):
+            barrier.wait()
+            if text == 'text 2':
+                raise ValueError('bedrock failed')
+            return [{constants.name: text}]
+
+        def on_response_from_model(_, note_id, data):
+            assert writing.acquire(blocking=False)
+            try:
+                if note_id == 3:
+                    raise ValueError('db failed')
+                written.append((note_id, data))
+            finally:
+                writing.release()
+
+        text_supplier = lambda _, note_id, __: None if note_id == 4 else f'text {note_id}'
+        handler = batch_handler_factory(Params('prompt', text_supplier, Model('model')), on_response_from_model,
+                                        max_concurrency=3)
+
+        with patch('backend.lib.func.sqs.call_generative', call_generative):
+            result = handler(prepare_sns_sqs_event(1, 2, 3, 4), None)
+
+        assert written == [(1, [{constants.name: 'text 1'}])]
+        assert result == {constants.batch_item_failures: [{constants.item_identifier: '2'},
+                                                          {constants.item_identifier: '3'}]}
+
+    @patch('backend.lib.func.sqs.begin_session', MagicMock())
+    def test_batch_handler_writes_responses_in_one_call(self):
+        batches = []
+
+        def on_responses_from_model(_, responses):
+            batches.append(responses)
+            return [3]
+
+        text_supplier = lambda _, note_id, __: f'text {note_id}'
+        handler = batch_handler_factory(Params('prompt', text_supplier, Model('model')),
+                                        on_responses_from_model=on_responses_from_model)
+
+        with patch('backend.lib.func.sqs.call_generative', lambda _, __, text, max_tokens=None: [text]):
+            result = handler(prepare_sns_sqs_event(1, 2, 3), None)
+
+        assert batches == [[(1, ['text 1']), (2, ['text 2']), (3, ['text 3'])]]
+        assert result == {constants.batch_item_failures: [{constants.item_identifier: '3'}]}
+
+        with patch('backend.lib.func.sqs.call_generative', MagicMock(return_value=['text'])):
+            result = batch_handler_factory(Params('prompt', text_supplier, Model('model')),
+                                           on_responses_from_model=MagicMock(side_effect=ValueError('bulk failed')))(
+                prepare_sns_sqs_event(1, 2), None)
+
+        assert result == {constants.batch_item_failures: [{constants.item_identifier: '1'},
+                                                          {constants.item_identifier: '2'}]}
+
+    def test_batch_handler_skips_text_it_already_processed(self):
+        engine = create_engine('sqlite://')
+        NoteTextHash.__table__.create(engine)
+        session_factory = sessionmaker(bind=engine)
+        calls = []
+        texts = {1: 'text 1', 2: 'text 2'}
+
+        def call_generative(_, __, text, max_tokens=None):
+            calls.append(text)
+            if text == 'broken':
+                raise ValueError('bedrock failed')
+            return [text]
+
+        def on_response_from_model(_, note_id, data):
+            if data == ['failing write']:
+                raise ValueError('db failed')
+
+        text_supplier = lambda _, note_id, __: texts[note_id]
+        handler = batch_handler_factory(Params('prompt', text_supplier, Model('model'), pipeline=constants.metric),
+                                        on_response_from_model)
+
+        with patch('backend.lib.func.sqs.begin_session', session_factory), \
+                patch('backend.lib.func.sqs.call_generative', call_generative):
+            #  the same note published twice in a batch, like an image note's img_desc and img_text
+            assert handler(prepare_sns_sqs_event(1, 1, 2), None) == {constants.batch_item_failures: []}
+            assert calls == ['text 1', 'text 2']
+
+            calls.clear()
+            handler(prepare_sns_sqs_event(1, 2), None)
+            assert calls == []
+
+            #  failures leave the previous hash, so the redelivered record is processed again
+            texts[1], texts[2] = 'broken', 'failing write'
+            result = handler(prepare_sns_sqs_event(1, 2), None)
+            assert result == {constants.batch_item_failures: [{constants.item_identifier: '1'},
+                                                              {constants.item_identifier: '2'}]}
+            calls.clear()
+            handler(prepare_sns_sqs_event(1, 2), None)
+            assert calls == ['broken', 'failing write']
+
+            texts[1] = 'changed'
+            calls.clear()
+            handler(prepare_sns_sqs_event(1), None)
+            assert calls == ['changed']
+
+        session = session_factory()
+        try:
+            assert {row.note_id: row.hash for row in session.query(NoteTextHash)} == {
+                1: text_hash(Params('prompt', None, Model('model')), 'changed'),
+                2: text_hash(Params('prompt', None, Model('model')), 'text 2')}
+        finally:
+            session.close()
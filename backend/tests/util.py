@@ -1,8 +1,14 @@
 import json
 import unittest
 from datetime import datetime, timezone
+from unittest.mock import patch, MagicMock
 
-from backend.lib.util import get_next_run_timestamp, call_generative, call_embedding
+from sqlalchemy.dialects import mysql
+
+from backend.lib import util
+from backend.lib.db import Metric, Task
+from backend.lib.util import get_next_run_timestamp, call_generative, call_embedding, get_bedrock_client, TokenBucket, \
+    get_next_run_timestamps, compile_cron, cron_expression_from_dict, upsert_by_name
 from backend.functions.text.metric.index import prompt as metric_prompt
 from backend.functions.text.link.index import prompt as link_prompt
 from backend.functions.text.task.index import prompt as task_prompt
@@ -62,6 +68,82 @@ class Test(unittest.TestCase):
         expected_run = int(datetime(2025, 10, 1, 12, 5, 0, tzinfo=timezone.utc).timestamp())
         assert next_run == expected_run
 
+    def test_compiled_cron_is_reused(self):
+        compile_cron.cache_clear()
+        base_time = int(datetime(2025, 10, 10, 10, 30, 0, tzinfo=timezone.utc).timestamp())
+
+        next_runs = get_next_run_timestamps('0 8 * * *', base_time, 3)
+        get_next_run_timestamp('0 8 * * *', base_time + 60)
+        get_next_run_timestamp('0 8  * * *', base_time + 120)
+
+        assert next_runs == [int(datetime(2025, 10, day, 8, 0, 0, tzinfo=timezone.utc).timestamp()) for day in
+                             [11, 12, 13]]
+        assert compile_cron.cache_info().misses == 1
+        assert compile_cron.cache_info().hits == 2
+
+    def test_cron_expression_from_dict_is_five_fields(self):
+        cron_expression = cron_expression_from_dict({'minute': '30', 'hour': '9', 'day_of_month': '*', 'month': '*',
+                                                     'day_of_week': '*'})
+        base_time = int(datetime(2025, 10, 10, 10, 30, 0, tzinfo=timezone.utc).timestamp())
+
+        assert cron_expression == '30 9 * * *'
+        assert get_next_run_timestamp(cron_expression, base_time) == int(
+            datetime(2025, 10, 11, 9, 30, 0, tzinfo=timezone.utc).timestamp())
+
+    @patch('backend.lib.util.boto3.client')
+    def test_bedrock_client_is_built_once(self, client_mock):
+        util.bedrock_client = None
+        try:
+            assert get_bedrock_client() is get_bedrock_client()
+            client_mock.assert_called_once()
+
+            config = client_mock.call_args.kwargs['config']
+            assert config.max_pool_connections == util.bedrock_max_pool_connections
+            assert config.tcp_keepalive
+            assert config.retries['mode'] == 'adaptive'
+        finally:
+            util.bedrock_client = None
+
+    def test_token_bucket_rejects_requests_it_can_never_fill(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=2, capacity=0.5)
+
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=2, capacity=2, sleep=lambda _: None).acquire(3)
+
+    def test_upsert_by_name_locks_only_entity_rows(self):
+        session = MagicMock()
+        session.scalars.return_value = []
+
+        for entity, name_column in [(Metric, Metric.name), (Task, Task.summary)]:
+            upsert_by_name(session, entity, name_column, 1, [{name_column.key: 'a'}])
+            locking_read = str(session.scalars.call_args.args[0].compile(dialect=mysql.dialect()))
+
+            assert 'LOCK IN SHARE MODE' in locking_read
+            assert 'JOIN' not in locking_read
+
+    def test_token_bucket_waits_for_refill(self):
+        now = [0.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        bucket = TokenBucket(rate=2, capacity=2, clock=lambda: now[0], sleep=sleep)
+
+        bucket.acquire()
+        bucket.acquire()
+        assert sleeps == []
+
+        bucket.acquire()
+        assert sleeps == [0.5]
+
+        now[0] += 10
+        bucket.acquire()
+        bucket.acquire()
+        assert sleeps == [0.5]
+
     def test_generative(self):
         generative_model = 'anthropic.claude-3-sonnet-20240229-v1:0'
         text = """What a productive Sunday! Woke up feeling fantastic, probably a 9 out of 10. Started the day with a 3.5 mile run, which took about 30 minutes. My average heart rate was around 145 bpm. Later, I did some budgeting and saw I spent $75.40 on groceries. I should probably try to spend less next week. For dinner, I had a huge, delicious salad. Found a cool recipe at https://recipes.com/salad. My final weight before bed was 160.2 pounds. Feeling very tired but accomplished."""
@@ -0,0 +1,143 @@
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+from shared import constants
+from backend.lib.vectors import LocalStore, OpenSearchStore, normalize
+
+
+def random_vectors(count: int, dimension: int, seed: int = 0) -> np.ndarray:
+    return normalize(np.random.default_rng(seed).standard_normal((count, dimension)))
+
+
+class Test(unittest.TestCase):
+
+    def test_query_returns_nearest_notes_best_first(self):
+        store = LocalStore(directory=None)
+        store.index(1, 10, [1.0, 0.0])
+        store.index(1, 11, [0.0, 1.0])
+        store.index(1, 12, [1.0, 1.0])
+
+        result = store.query(1, [1.0, 0.1], 2)
+
+        assert [note_id for note_id, _ in result] == [10, 12]
+        assert result[0][1] > result[1][1]
+        assert 0 <= result[1][1] <= 2
+
+    def test_reindexing_a_note_replaces_its_vector(self):
+        store = LocalStore(directory=None)
+        store.index(1, 10, [1.0, 0.0])
+        store.index(1, 11, [0.0, 1.0])
+        store.index(1, 10, [-1.0, 0.0])
+
+        assert [note_id for note_id, _ in store.query(1, [1.0, 0.0], 2)] == [11, 10]
+        assert len(store.query(1, [1.0, 0.0], 10)) == 2
+
+    def test_index_many_writes_each_partition_once(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = LocalStore(directory=directory)
+            with patch.object(store, '_save', wraps=store._save) as save:
+                assert store.index_many([(1, 10, [1.0, 0.0]), (2, 20, [0.0, 1.0]), (1, 11, [0.0, 1.0])]) == []
+
+            assert sorted(call.args[0] for call in save.call_args_list) == [1, 2]
+            assert [note_id for note_id, _ in LocalStore(directory=directory).query(1, [0.0, 1.0], 2)] == [11, 10]
+
+    def test_users_are_isolated(self):
+        store = LocalStore(directory=None)
+        store.index(1, 10, [1.0, 0.0])
+        store.index(2, 20, [1.0, 0.0])
+
+        assert store.query(1, [1.0, 0.0], 5) == [(10, 2.0)]
+        assert store.query(3, [1.0, 0.0], 5) == []
+
+    def test_partitions_are_persisted_and_reloaded(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = LocalStore(directory=directory)
+            store.index(1, 10, [1.0, 0.0])
+            store.index(1, 11, [0.0, 1.0])
+
+            reloaded = LocalStore(directory=directory)
+            assert [note_id for note_id, _ in reloaded.query(1, [0.0, 1.0], 1)] == [11]
+
+            #  an update to a memory mapped partition doesn't write through the read only mapping
+            reloaded.index(1, 11, [-1.0, 0.0])
+            reloaded.index(1, 12, [0.0, 1.0])
+            assert [note_id for note_id, _ in LocalStore(directory=directory).query(1, [0.0, 1.0], 1)] == [12]
+
+    def test_ivf_search_keeps_recall_of_brute_force(self):
+        vectors = random_vectors(2000, 16)
+        queries = random_vectors(20, 16, seed=1)
+        exact, approximate = LocalStore(directory=None), LocalStore(directory=None, ivf_min_size=1000, probes=12)
+        for note_id, vector in enumerate(vectors):
+            exact.index(1, note_id, vector)
+            approximate.index(1, note_id, vector)
+
+        hits = 0
+        for query in queries:
+            expected = {note_id for note_id, _ in exact.query(1, query, 10)}
+            hits += len(expected & {note_id for note_id, _ in approximate.query(1, query, 10)})
+
+        assert approximate._partitions[1].centroids is not None
+        assert hits / (10 * len(queries)) >= 0.9
+
+    def test_ivf_search_sees_notes_added_after_training(self):
+        store = LocalStore(directory=None, ivf_min_size=100, probes=1)
+        for note_id, vector in enumerate(random_vectors(100, 8)):
+            store.index(1, note_id, vector)
+        store.query(1, [1.0] * 8, 1)
+
+        store.index(1, 1000, [1.0] * 8)
+
+        assert store.query(1, [1.0] * 8, 1)[0][0] == 1000
+
+    def test_index_many_appends_a_batch_and_keeps_the_last_vector_of_a_note(self):
+        store = LocalStore(directory=None)
+        store.index(1, 10, [1.0, 0.0])
+
+        store.index_many([(1, 11, [0.0, 1.0]), (1, 10, [-1.0, 0.0]), (1, 12, [1.0, 0.0]), (1, 12, [0.0, -1.0])])
+
+        assert [note_id for note_id, _ in store.query(1, [0.0, -1.0], 3)] == [12, 10, 11]
+        with self.assertRaises(ValueError):
+            store.index_many([(1, 13, [1.0, 0.0, 0.0])])
+
+    def test_train_clusters_a_partition_before_the_first_query(self):
+        store = LocalStore(directory=None, ivf_min_size=100, probes=1)
+        store.index_many([(1, note_id, vector) for note_id, vector in enumerate(random_vectors(100, 8))])
+
+        store.train(1)
+        store.train(2)
+
+        assert store._partitions[1].centroids is not None
+        assert len(store.query(1, [1.0] * 8, 5)) == 5
+
+    def test_opensearch_store_delegates_to_client(self):
+        client = MagicMock()
+        client.indices.exists_alias.return_value = True
+        client.indices.get_alias.return_value = {'index_v1': {}}
+        client.bulk.return_value = {constants.errors: False}
+        client.search.return_value = {constants.hits: {constants.hits: [
+            {constants.source_field: {constants.note_id: 3}, constants.score_field: 1.8}]}}
+        store = OpenSearchStore(index='index', client_supplier=lambda: client, version='1')
+
+        store.index(7, 3, [0.1, 0.2])
+        assert client.bulk.call_args.kwargs['body'] == [
+            {constants.index: {constants.index_field: 'index', constants.id_field: 3}},
+            {constants.vector_field: [0.1, 0.2], constants.note_id: 3, constants.user_id: 7}]
+        assert store.query(7, [0.1, 0.2], 1) == [(3, 1.8)]
+
+    def test_opensearch_store_writes_to_the_migration_target_too(self):
+        client = MagicMock()
+        client.indices.exists_alias.return_value = True
+        client.indices.get_alias.return_value = {'index_v1': {}}
+        client.indices.exists.return_value = True
+        #  the old index rejects the new dimension, only the target's result counts
+        client.bulk.side_effect = [
+            {constants.errors: True, constants.items: [{constants.index: {constants.error: {}}}]},
+            {constants.errors: False}]
+        store = OpenSearchStore(index='index', client_supplier=lambda: client, version='2')
+
+        assert store.index_many([(7, 3, [0.1])]) == []
+        assert [call.kwargs['body'][0][constants.index][constants.index_field] for call in
+                client.bulk.call_args_list] == ['index', 'index_v2']
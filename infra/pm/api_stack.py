@@ -5,18 +5,20 @@ from aws_cdk import (
     Stack,
     aws_apigatewayv2 as api_gtw,
     aws_lambda as lmbd,
+    aws_ec2 as ec2,
+    aws_iam as iam,
     aws_apigatewayv2_authorizers as auth)
 
 from constructs import Construct
 from shared.variables import *
-from .input import Api, Common, ApiFunction
+from .input import Api, Common, ApiFunction, Text
 from .audio_stack import PmAudioStack
 from .cognito_stack import PmCognitoStack
 from .db_stack import PmDbStack
 from .function_factories import http_api_integration_cb_factory, create_function_role_factory, FunctionFactoryParams, \
     create_role_with_db_access_factory, allow_connection_function_factory
 from .image_stack import PmImageStack
-from .constants import true
+from .constants import true, bedrock_invoke_policy_statement
 from .util import create_function
 from .text_stack import PmTextStack
 from .vpc_stack import PmVpcStack
@@ -53,6 +55,8 @@ class PmApiStack(Stack):
                                                                                           {
                                                                                               text_processing_topic_arn: text_stack.text_processing_topic.topic_arn}))
 
+        self.search_api_function = self._search(db_stack, vpc_stack, text_stack)
+
         self.data_api_function = create_function(self, self._create_api_function_with_db_params(db_stack, vpc_stack,
                                                                                                 Api.data))
 
@@ -107,6 +111,27 @@ class PmApiStack(Stack):
 
         return create_function(self, params)
 
+    def _search(self, db_stack: PmDbStack, vpc_stack: PmVpcStack, text_stack: PmTextStack) -> lmbd.Function:
+        def on_role(role):
+            role.add_to_policy(bedrock_invoke_policy_statement)
+            #  knn queries are POST _search, which grant_read (GET/HEAD) doesn't cover
+            role.add_to_policy(iam.PolicyStatement(
+                actions=['es:ESHttpGet', 'es:ESHttpHead', 'es:ESHttpPost'],
+                resources=[f'{text_stack.embedding_domain.domain_arn}/*']
+            ))
+
+        params = self._create_api_function_with_db_params(db_stack, vpc_stack, Api.search, {
+            opensearch_endpoint: text_stack.embedding_domain.domain_endpoint,
+            opensearch_port: Common.opensearch_port,
+            opensearch_index: Text.opensearch_index,
+            embedding_model: Text.embedding_model,
+        })
+        params.role_supplier = create_role_with_db_access_factory(db_stack.db_proxy, db_stack.db_secret, on_role)
+        function = create_function(self, params)
+        text_stack.embedding_domain.connections.allow_from(function,
+                                                           port_range=ec2.Port.tcp(int(Common.opensearch_port)))
+        return function
+
     def _create_api_function_with_db_params(self, db_stack: PmDbStack, vpc_stack: PmVpcStack,
                                             function_params: ApiFunction,
                                             env_override: Dict[str, str] = None) -> FunctionFactoryParams:
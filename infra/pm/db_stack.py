@@ -81,7 +81,7 @@ class PmDbStack(Stack):
             },
             environment=env,
             role_supplier=create_role_with_db_access_factory(self.db_proxy, self.db_secret),
-            and_then=allow_connection_function_factory(self.db_proxy, custom_resource_trigger_cb_factory(self, {}, function_params )),
+            and_then=allow_connection_function_factory(self.db_proxy, custom_resource_trigger_cb_factory(self, {Common.schema_version: Db.schema_version}, function_params)),
             vpc=vpc_stack.vpc,
         ))
 
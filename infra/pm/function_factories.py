@@ -20,7 +20,7 @@ from aws_cdk import (
     aws_iam as iam)
 
 from shared.variables import *
-from .input import Function, ApiFunction, ScheduledFunction, CustomResourceTriggeredFunction
+from .input import Function, ApiFunction, ScheduledFunction, CustomResourceTriggeredFunction, QueueIntegration
 
 
 class S3EventParams:
@@ -90,14 +90,18 @@ def s3_integration_cb_factory(integration_params: Iterable[S3EventParams]) -> Ca
     return cb
 
 
-def sqs_integration_cb_factory(queues: Sequence[sqs.Queue]) -> Callable[[lmbd.Function], None]:
+def sqs_integration_cb_factory(queues: Sequence[sqs.Queue], integration: QueueIntegration) -> Callable[
+    [lmbd.Function], None]:
     def cb(func: lmbd.IFunction):
         if not queues:
             return
         for q in queues:
             q.grant_consume_messages(func)
             func.add_event_source(
-                lmes.SqsEventSource(q)
+                lmes.SqsEventSource(q,
+                                    batch_size=integration.batch_size,
+                                    max_batching_window=integration.max_batching_window,
+                                    report_batch_item_failures=True)
             )
 
     return cb
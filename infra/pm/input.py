@@ -37,11 +37,16 @@ class HttpIntegration:
 class QueueIntegration:
     name: str
     visibility_timeout: Duration
+    batch_size: int
+    max_batching_window: Duration
 
-    def __init__(self, queue_name: str, visibility_timeout: Duration, max_retries: int = 3,):
+    def __init__(self, queue_name: str, visibility_timeout: Duration, max_retries: int = 3, batch_size: int = 10,
+                 max_batching_window: Duration = None):
         self.name = queue_name
         self.visibility_timeout = visibility_timeout
         self.max_retries = max_retries
+        self.batch_size = batch_size
+        self.max_batching_window = max_batching_window
 
 
 class Schedule:
@@ -113,6 +118,7 @@ class Common:
     func_dir_arg = 'FUNC_DIR'
     backend_dir_arg = 'BACKEND_DIR'
     install_mysql_arg = 'INSTALL_MYSQL'
+    schema_version = 'SchemaVersion'
     lib_path = os.path.join(backend_dir, lib_dir)
     shared_path = shared_dir
     docker_path = root_dir
@@ -139,10 +145,12 @@ class Db:
     port = 3306
     secret = 'pm_db_secret'
     proxy_name = 'pm-db-proxy'
+    #  bump on any model change, the initializer then gets an Update event and migrates the existing db
+    schema_version = '7'
 
     initializer_function = CustomResourceTriggeredFunction(
         name='pm_db_initializer_func',
-        timeout=Duration.minutes(1),
+        timeout=Duration.minutes(15),
         memory_size=1024,
         code_path='schema',
         role_name='pm_db_initializer_func_role',
@@ -237,12 +245,19 @@ class Text:
     generative_model = Common.generative_model
     embedding_model = Common.embedding_model
     max_tokens = '1024'
+    combined_max_tokens = '3072'
+    combined_extraction_enabled = os.getenv(combined_extraction, str(False)).lower() == str(True).lower()
     domain = 'pm_text_embedding_domain'
     domain_data_nodes = 1
     domain_data_node_instance_type = 't3.small.search'
     domain_ebs_volume_size = 10
     opensearch_index = 'pm_note_text_embedding_opensearch_index'
     opensearch_index_refresh_interval = '30s'
+    opensearch_index_engine = 'lucene'
+    opensearch_index_ef_construction = '128'
+    opensearch_index_m = '16'
+    #  bump after changing embedding_model or embedding_vector_dimension, the re-embedding function moves the index over
+    embedding_index_version = '1'
     embedding_vector_dimension = 1536
 
     metrics_extraction = QueueFunction(
@@ -275,6 +290,16 @@ class Text:
                                      visibility_timeout=Duration.minutes(2))
     )
 
+    combined_extraction = QueueFunction(
+        name='pm_combined_extraction_func',
+        timeout=Duration.minutes(2),
+        memory_size=1024,
+        code_path='text/combined',
+        role_name='pm_combined_extraction_role',
+        integration=QueueIntegration(queue_name='pm_combined_extraction_queue',
+                                     visibility_timeout=Duration.minutes(4))
+    )
+
     embedding = QueueFunction(
         name='pm_embedding_func',
         timeout=Duration.minutes(3),
@@ -284,6 +309,14 @@ class Text:
         integration=QueueIntegration(queue_name='pm_embedding_queue',
                                      visibility_timeout=Duration.minutes(5))
     )
+    reembedding_function = ScheduledFunction(
+        name='pm_text_reembedding_func',
+        timeout=Duration.minutes(15),
+        memory_size=1024,
+        code_path='text/reembedding',
+        role_name='pm_text_reembedding_func_role',
+        schedule_params=Schedule(rule_name='pm_text_reembedding_rule',
+                                 schedule=events.Schedule.cron(minute='*/20')))
     embedding_index_creator_function = CustomResourceTriggeredFunction(
         name='pm_text_embedding_index_creator_func',
         timeout=Duration.minutes(1),
@@ -336,7 +369,7 @@ class Recurrent:
     stack_name = 'PmRecurrentStack'
     data_cleanup_function = ScheduledFunction(
         name='pm_db_data_cleanup_func',
-        timeout=Duration.minutes(1),
+        timeout=Duration.minutes(15),
         memory_size=1024,
         code_path='recurrent/data/purge',
         role_name='pm_db_data_cleanup_func_role',
@@ -346,7 +379,7 @@ class Recurrent:
 
     occurrence_cleanup_function = ScheduledFunction(
         name='pm_db_occurrence_cleanup_func',
-        timeout=Duration.minutes(1),
+        timeout=Duration.minutes(15),
         memory_size=1024,
         code_path='recurrent/occurrence/purge',
         role_name='pm_db_occurrence_cleanup_func_role',
@@ -372,6 +405,7 @@ class Recurrent:
         schedule_params=Schedule(rule_name='pm_db_occurrence_generation_rule',
                                  schedule=events.Schedule.cron(minute='*')))
 
+
 class Api:
     stack_name = 'PmApiStack'
     name = 'pm_api'
@@ -405,6 +439,19 @@ class Api:
             name='pm_note_api_function_integration_b'
         )]
     )
+
+    search = ApiFunction(
+        name='pm_search_api_function',
+        timeout=Duration.minutes(1),
+        memory_size=1024,
+        code_path='search',
+        role_name='pm_search_api_function_role',
+        integrations=[HttpIntegration(
+            url_path='/note/search',
+            methods=[api_gtw.HttpMethod.GET, api_gtw.HttpMethod.OPTIONS],
+            name='pm_search_api_function_integration'
+        )]
+    )
     # todo add this path param to path and delete
     data = ApiFunction(
         name='pm_data_api_function',
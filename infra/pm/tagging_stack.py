@@ -60,7 +60,7 @@ class PmTaggingStack(Stack):
 
             }, role_supplier=create_role_with_db_access_factory(db_stack.db_proxy, db_stack.db_secret, lambda role: role.add_to_policy(
                 bedrock_invoke_policy_statement)),
-                                       and_then=allow_connection_function_factory(db_stack.db_proxy, sqs_integration_cb_factory([queue])),
+                                       and_then=allow_connection_function_factory(db_stack.db_proxy, sqs_integration_cb_factory([queue], function_params.integration)),
                                        vpc=vpc_stack.vpc)
 
         return create_function(self, params)
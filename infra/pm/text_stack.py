@@ -12,11 +12,12 @@ from constructs import Construct
 
 from shared.variables import *
 from .bastion_stack import PmBastionStack
-from .input import Common, Text, QueueFunction, CustomResourceTriggeredFunction
+from .input import Common, Text, QueueFunction, CustomResourceTriggeredFunction, ScheduledFunction
 from .constants import true, bedrock_invoke_policy_statement
 from .db_stack import PmDbStack
 from .function_factories import FunctionFactoryParams, create_role_with_db_access_factory, sqs_integration_cb_factory, \
-    create_function_role_factory, custom_resource_trigger_cb_factory, allow_connection_function_factory
+    create_function_role_factory, custom_resource_trigger_cb_factory, allow_connection_function_factory, \
+    schedule_cb_factory
 from .tagging_stack import PmTaggingStack
 from .util import create_function, create_queue
 from .vpc_stack import PmVpcStack
@@ -33,32 +34,39 @@ class PmTextStack(Stack):
         self.text_processing_topic = sns.Topic(self, Text.topic_name, display_name=Text.topic_name,
                                        topic_name=Text.topic_name)
 
-        self.metrics_extraction_queue = create_queue(self, Text.metrics_extraction.integration.name,
-                                                     visibility_timeout=Text.metrics_extraction.integration.visibility_timeout,
-                                                     with_subscription_to=self.text_processing_topic, max_retires=Text.metrics_extraction.integration.max_retries)
+        if Text.combined_extraction_enabled:
+            self.combined_extraction_queue = create_queue(self, Text.combined_extraction.integration.name,
+                                                          visibility_timeout=Text.combined_extraction.integration.visibility_timeout,
+                                                          with_subscription_to=self.text_processing_topic, max_retires=Text.combined_extraction.integration.max_retries)
 
-        self.links_extraction_queue = create_queue(self, Text.links_extraction.integration.name,
-                                                   visibility_timeout=Text.links_extraction.integration.visibility_timeout,
-                                                   with_subscription_to=self.text_processing_topic, max_retires=Text.links_extraction.integration.max_retries)
+            self.combined_extraction_function = self._create_sqs_triggered_function(db_stack, self.combined_extraction_queue,
+                                                                                   vpc_stack, Text.combined_extraction,
+                                                                                   Text.combined_max_tokens)
+        else:
+            self.metrics_extraction_queue = create_queue(self, Text.metrics_extraction.integration.name,
+                                                         visibility_timeout=Text.metrics_extraction.integration.visibility_timeout,
+                                                         with_subscription_to=self.text_processing_topic, max_retires=Text.metrics_extraction.integration.max_retries)
 
-        self.tasks_extraction_queue = create_queue(self, Text.tasks_extraction.integration.name,
-                                                   visibility_timeout=Text.tasks_extraction.integration.visibility_timeout,
-                                                   with_subscription_to=self.text_processing_topic, max_retires=Text.tasks_extraction.integration.max_retries)
+            self.links_extraction_queue = create_queue(self, Text.links_extraction.integration.name,
+                                                       visibility_timeout=Text.links_extraction.integration.visibility_timeout,
+                                                       with_subscription_to=self.text_processing_topic, max_retires=Text.links_extraction.integration.max_retries)
 
-        self.embedding_queue = create_queue(self, Text.embedding.integration.name,
-                                                   visibility_timeout=Text.embedding.integration.visibility_timeout,
-                                                   with_subscription_to=self.text_processing_topic, max_retires=Text.embedding.integration.max_retries)
+            self.tasks_extraction_queue = create_queue(self, Text.tasks_extraction.integration.name,
+                                                       visibility_timeout=Text.tasks_extraction.integration.visibility_timeout,
+                                                       with_subscription_to=self.text_processing_topic, max_retires=Text.tasks_extraction.integration.max_retries)
 
-        self.metrics_extraction_function = self._create_sqs_triggered_function(db_stack, self.metrics_extraction_queue,
-                                                                            vpc_stack, Text.metrics_extraction)
-        
+            self.metrics_extraction_function = self._create_sqs_triggered_function(db_stack, self.metrics_extraction_queue,
+                                                                                vpc_stack, Text.metrics_extraction)
 
-        self.links_extraction_function = self._create_sqs_triggered_function(db_stack, self.links_extraction_queue,
-                                                                            vpc_stack, Text.links_extraction)
-        
+            self.links_extraction_function = self._create_sqs_triggered_function(db_stack, self.links_extraction_queue,
+                                                                                vpc_stack, Text.links_extraction)
 
-        self.tasks_extraction_function = self._create_sqs_triggered_function(db_stack, self.tasks_extraction_queue,
-                                                                            vpc_stack, Text.tasks_extraction)
+            self.tasks_extraction_function = self._create_sqs_triggered_function(db_stack, self.tasks_extraction_queue,
+                                                                                vpc_stack, Text.tasks_extraction)
+
+        self.embedding_queue = create_queue(self, Text.embedding.integration.name,
+                                                   visibility_timeout=Text.embedding.integration.visibility_timeout,
+                                                   with_subscription_to=self.text_processing_topic, max_retires=Text.embedding.integration.max_retries)
 
         self.embedding_domain = opensearch.Domain(self, Text.domain,
                                    version=opensearch.EngineVersion.OPENSEARCH_2_17,
@@ -80,6 +88,7 @@ class PmTextStack(Stack):
 
         self.embedding_function = self._create_embedding_function(self.embedding_queue, vpc_stack, Text.embedding)
         self.embedding_index_creation_function = self._create_initializer_function(vpc_stack, Text.embedding_index_creator_function)
+        self.reembedding_function = self._create_reembedding_function(db_stack, vpc_stack, Text.reembedding_function)
         self.embedding_domain.connections.allow_from(
             bastion_stack.instance,
             port_range=ec2.Port.tcp(int(Common.opensearch_port))
@@ -96,7 +105,7 @@ class PmTextStack(Stack):
                 self.embedding_domain.connections.allow_from(
                     func,
                     port_range=ec2.Port.tcp(int(Common.opensearch_port)))
-                sqs_integration_cb_factory([queue])(func)
+                sqs_integration_cb_factory([queue], function_params.integration)(func)
 
             params = FunctionFactoryParams(function_params=function_params,
                                            build_args={Common.func_dir_arg: function_params.code_path},
@@ -105,6 +114,7 @@ class PmTextStack(Stack):
                     opensearch_port: Common.opensearch_port,
                     opensearch_index: Text.opensearch_index,
                     embedding_model: Text.embedding_model,
+                    embedding_index_version: Text.embedding_index_version,
 
                 }, role_supplier=create_function_role_factory(on_role),
                                            and_then=and_then,
@@ -113,7 +123,7 @@ class PmTextStack(Stack):
             return create_function(self, params)
 
     def _create_sqs_triggered_function(self, db_stack: PmDbStack, queue: sqs.Queue, vpc_stack: PmVpcStack,
-                                           function_params: QueueFunction) -> lmbd.Function:
+                                           function_params: QueueFunction, max_tokens_override: str = None) -> lmbd.Function:
             params = FunctionFactoryParams(function_params=function_params,
                                            build_args={Common.func_dir_arg: function_params.code_path,
                                                        Common.install_mysql_arg: true}, environment={
@@ -121,16 +131,58 @@ class PmTextStack(Stack):
                     db_endpoint: db_stack.db_instance.db_instance_endpoint_address,
                     db_name: os.getenv(db_name),
                     db_port: db_stack.db_instance.db_instance_endpoint_port,
-                    max_tokens: Text.max_tokens,
+                    max_tokens: max_tokens_override if max_tokens_override else Text.max_tokens,
                     generative_model: Text.generative_model,
 
                 }, role_supplier=create_role_with_db_access_factory(db_stack.db_proxy, db_stack.db_secret, lambda role: role.add_to_policy(
                     bedrock_invoke_policy_statement)),
-                                           and_then=allow_connection_function_factory(db_stack.db_proxy, sqs_integration_cb_factory([queue])),
+                                           and_then=allow_connection_function_factory(db_stack.db_proxy, sqs_integration_cb_factory([queue], function_params.integration)),
                                            vpc=vpc_stack.vpc)
 
             return create_function(self, params)
 
+    def _create_reembedding_function(self, db_stack: PmDbStack, vpc_stack: PmVpcStack,
+                                     function_params: ScheduledFunction) -> lmbd.Function:
+        def on_role(role: iam.Role):
+            role.add_to_policy(bedrock_invoke_policy_statement)
+            role.add_to_policy(iam.PolicyStatement(
+                actions=['es:ESHttp*'],
+                resources=[f'{self.embedding_domain.domain_arn}/*']
+            ))
+
+        def and_then(function: lmbd.Function):
+            self.embedding_domain.connections.allow_from(
+                function,
+                port_range=ec2.Port.tcp(int(Common.opensearch_port)))
+            schedule_cb_factory(self, function_params)(function)
+
+        return create_function(self, FunctionFactoryParams(
+            function_params=function_params,
+            build_args={
+                Common.func_dir_arg: function_params.code_path,
+                Common.install_mysql_arg: true,
+            },
+            environment={
+                db_secret_arn: db_stack.db_secret.secret_full_arn,
+                db_endpoint: db_stack.db_instance.db_instance_endpoint_address,
+                db_name: os.getenv(db_name),
+                db_port: db_stack.db_instance.db_instance_endpoint_port,
+                opensearch_endpoint: self.embedding_domain.domain_endpoint,
+                opensearch_port: Common.opensearch_port,
+                opensearch_index: Text.opensearch_index,
+                opensearch_index_refresh_interval: Text.opensearch_index_refresh_interval,
+                opensearch_index_engine: Text.opensearch_index_engine,
+                opensearch_index_ef_construction: Text.opensearch_index_ef_construction,
+                opensearch_index_m: Text.opensearch_index_m,
+                embedding_index_version: Text.embedding_index_version,
+                embedding_vector_dimension: str(Text.embedding_vector_dimension),
+                embedding_model: Text.embedding_model,
+            },
+            role_supplier=create_role_with_db_access_factory(db_stack.db_proxy, db_stack.db_secret, on_role),
+            and_then=allow_connection_function_factory(db_stack.db_proxy, and_then),
+            vpc=vpc_stack.vpc,
+        ))
+
     def _create_initializer_function(self, vpc_stack: PmVpcStack,
                                      function_params: CustomResourceTriggeredFunction) -> lmbd.Function:
         def and_then(function: lmbd.Function):
@@ -144,6 +196,10 @@ class PmTextStack(Stack):
             opensearch_port: Common.opensearch_port,
             opensearch_index: Text.opensearch_index,
             opensearch_index_refresh_interval: Text.opensearch_index_refresh_interval,
+            opensearch_index_engine: Text.opensearch_index_engine,
+            opensearch_index_ef_construction: Text.opensearch_index_ef_construction,
+            opensearch_index_m: Text.opensearch_index_m,
+            embedding_index_version: Text.embedding_index_version,
             embedding_vector_dimension: str(Text.embedding_vector_dimension)
         }
         return create_function(self, FunctionFactoryParams(
@@ -17,6 +17,7 @@ metric = 'metric'
 schedule = 'schedule'
 recurrence_schedule = 'recurrence_schedule'
 tags = 'tags'
+tag_id = 'tag_id'
 target_value = 'target_value'
 name = 'name'
 value = 'value'
@@ -24,7 +25,12 @@ start = 'start'
 end = 'end'
 offset = 'offset'
 limit = 'limit'
+cursor = 'cursor'
+fields = 'fields'
+owner_id = 'owner_id'
+next_cursor_header = 'X-Next-Cursor'
 note_id = 'note_id'
+link_id = 'link_id'
 origin = 'origin'
 units = 'units'
 completed = 'completed'
@@ -43,6 +49,7 @@ task = 'task'
 url = 'url'
 user = 'user'
 params_delim = '|'
+field_path_delim = '.'
 like = '%'
 empty = ''
 link = 'link'
@@ -57,6 +64,7 @@ audio_key = 'audio_key'
 metrics = 'metrics'
 any_text_is_required = 'text|audio|image is required'
 internal_server_error = 'internal server error'
+invalid_cursor = 'invalid cursor'
 
 image_described = 'image_described'
 audio_transcribed = 'audio_transcribed'
@@ -80,6 +88,7 @@ transcribe = 'transcribe'
 records = 'Records'
 object = 'object'
 display_summary = 'display_summary'
+display_name = 'display_name'
 message = 'Message'
 media_file_uri = 'MediaFileUri'
 media_format = 'MediaFormat'
@@ -132,6 +141,25 @@ type = 'type'
 dimension = 'dimension'
 mappings = 'mappings'
 knn_vector = 'knn_vector'
+knn_score = 'knn_score'
+query = 'query'
+script_score = 'script_score'
+script = 'script'
+term = 'term'
+source = 'source'
+lang = 'lang'
+params = 'params'
+field = 'field'
+query_value = 'query_value'
+space_type = 'space_type'
+cosinesimil = 'cosinesimil'
+size = 'size'
+hits = 'hits'
+source_field = '_source'
+score_field = '_score'
+score = 'score'
+hybrid = 'hybrid'
+true = 'true'
 integer = 'integer'
 keyword = 'keyword'
 period_seconds = 'period_seconds'
@@ -153,7 +181,84 @@ resource_reason = 'Reason'
 cors_headers = {
     'Access-Control-Allow-Headers': 'Content-Type',
     'Access-Control-Allow-Origin': '*',
-    'Access-Control-Allow-Methods': 'OPTIONS,GET,POST,PATCH,DELETE'
+    'Access-Control-Allow-Methods': 'OPTIONS,GET,POST,PATCH,DELETE',
+    'Access-Control-Expose-Headers': next_cursor_header
 }
 default_region = 'us-east-1'
-default_max_tokens = 2048
\ No newline at end of file
+default_max_tokens = 2048
+default_db_pool_size = 2
+default_db_max_overflow = 3
+default_db_pool_recycle = 300
+default_db_pool_timeout = 30
+default_db_secret_ttl = 900
+default_db_secret_refresh_ahead = 60
+mysql_access_denied_error_code = 1045
+default_bedrock_max_pool_connections = 50
+default_bedrock_max_attempts = 5
+default_bedrock_read_timeout = 120
+adaptive = 'adaptive'
+default_sqs_max_workers = 4
+batch_item_failures = 'batchItemFailures'
+item_identifier = 'itemIdentifier'
+message_id = 'messageId'
+default_bedrock_requests_per_second = 0
+default_bedrock_burst = 5
+default_bedrock_max_concurrency = 8
+links = 'links'
+tasks = 'tasks'
+memory = 'memory'
+db = 'db'
+file = 'file'
+default_model_cache = 'memory'
+default_model_cache_ttl = 7 * 24 * 60 * 60
+default_model_cache_memory_max_entries = 1000
+default_model_cache_persistent_max_entries = 100000
+default_model_cache_dir = '/tmp/model_cache'
+default_recurrent_chunk_size = 500
+scheduled_time_reserve_millis = 10000
+default_recurrent_catch_up_max_runs = 100
+default_cron_cache_size = 256
+default_purge_batch_size = 1000
+default_purge_sleep_seconds = 0.1
+default_purge_retention_days = 92
+deleted = 'deleted'
+rows_per_second = 'rows_per_second'
+finished = 'finished'
+default_backfill_batch_size = 5000
+default_search_hybrid_weight = 0.7
+default_search_limit = 20
+opensearch = 'opensearch'
+local = 'local'
+default_vector_store = 'opensearch'
+default_vector_store_dir = '/tmp/vector_store'
+default_vector_store_ivf_min_size = 10000
+default_vector_store_ivf_probes = 8
+errors = 'errors'
+items = 'items'
+index_field = '_index'
+id_field = '_id'
+engine = 'engine'
+parameters = 'parameters'
+hnsw = 'hnsw'
+ef_construction = 'ef_construction'
+hnsw_m = 'm'
+default_opensearch_index_engine = 'lucene'
+default_opensearch_index_ef_construction = 128
+default_opensearch_index_m = 16
+default_opensearch_index_refresh_interval = '30s'
+add = 'add'
+alias = 'alias'
+actions = 'actions'
+remove_index = 'remove_index'
+disabled_refresh_interval = '-1'
+default_embedding_index_version = '1'
+default_reembedding_batch_size = 200
+default_reembedding_sleep_seconds = 0.5
+reembedded = 'reembedded'
+failed = 'failed'
+default_embedding_vector_dimension = 1536
+combined = 'combined'
+create = 'create'
+conflict_status = 409
+blocks_write = 'blocks.write'
+yellow = 'yellow'
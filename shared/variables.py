@@ -37,4 +37,41 @@ admin_secret_arn = 'ADMIN_SECRET_ARN'
 cognito_pool_id = 'COGNITO_POOL_ID'
 domain_name_mapping_key = 'DOMAIN_NAME_MAPPING_KEY'
 gemini_api_key = 'GEMINI_API_KEY'
-
+db_pool_size = 'DB_POOL_SIZE'
+db_max_overflow = 'DB_MAX_OVERFLOW'
+db_pool_recycle = 'DB_POOL_RECYCLE'
+db_pool_pre_ping = 'DB_POOL_PRE_PING'
+db_pool_timeout = 'DB_POOL_TIMEOUT'
+db_secret_ttl = 'DB_SECRET_TTL'
+db_secret_refresh_ahead = 'DB_SECRET_REFRESH_AHEAD'
+bedrock_max_pool_connections = 'BEDROCK_MAX_POOL_CONNECTIONS'
+bedrock_max_attempts = 'BEDROCK_MAX_ATTEMPTS'
+bedrock_read_timeout = 'BEDROCK_READ_TIMEOUT'
+sqs_max_workers = 'SQS_MAX_WORKERS'
+bedrock_requests_per_second = 'BEDROCK_REQUESTS_PER_SECOND'
+bedrock_burst = 'BEDROCK_BURST'
+bedrock_max_concurrency = 'BEDROCK_MAX_CONCURRENCY'
+combined_extraction = 'COMBINED_EXTRACTION'
+model_cache = 'MODEL_CACHE'
+model_cache_ttl = 'MODEL_CACHE_TTL'
+model_cache_memory_max_entries = 'MODEL_CACHE_MEMORY_MAX_ENTRIES'
+model_cache_persistent_max_entries = 'MODEL_CACHE_PERSISTENT_MAX_ENTRIES'
+model_cache_dir = 'MODEL_CACHE_DIR'
+recurrent_chunk_size = 'RECURRENT_CHUNK_SIZE'
+recurrent_catch_up_max_runs = 'RECURRENT_CATCH_UP_MAX_RUNS'
+cron_cache_size = 'CRON_CACHE_SIZE'
+purge_batch_size = 'PURGE_BATCH_SIZE'
+purge_sleep_seconds = 'PURGE_SLEEP_SECONDS'
+purge_retention_days = 'PURGE_RETENTION_DAYS'
+backfill_batch_size = 'BACKFILL_BATCH_SIZE'
+search_hybrid_weight = 'SEARCH_HYBRID_WEIGHT'
+vector_store = 'VECTOR_STORE'
+vector_store_dir = 'VECTOR_STORE_DIR'
+vector_store_ivf_min_size = 'VECTOR_STORE_IVF_MIN_SIZE'
+vector_store_ivf_probes = 'VECTOR_STORE_IVF_PROBES'
+opensearch_index_engine = 'OPENSEARCH_INDEX_ENGINE'
+opensearch_index_ef_construction = 'OPENSEARCH_INDEX_EF_CONSTRUCTION'
+opensearch_index_m = 'OPENSEARCH_INDEX_M'
+embedding_index_version = 'EMBEDDING_INDEX_VERSION'
+reembedding_batch_size = 'REEMBEDDING_BATCH_SIZE'
+reembedding_sleep_seconds = 'REEMBEDDING_SLEEP_SECONDS'